@@ -0,0 +1,38 @@
+pragma solidity 0.4.24;
+import "./EscrowFactory.sol";
+
+// An EscrowFactory deploying every escrow as an EIP-1167 minimal proxy which
+// delegates to a single Escrow implementation. A proxy costs a fraction of
+// the gas of deploying the full Escrow bytecode. The implementation can be
+// an Escrow or an EscrowCompact, which share the initialize function.
+contract CloneEscrowFactory is EscrowFactory {
+    address private implementation;
+
+    constructor(address _eip20, address _implementation) EscrowFactory(_eip20) public {
+        require(_implementation != address(0), "Implementation is an uninitialized address");
+        implementation = _implementation;
+    }
+
+    function getImplementation() public view returns (address) {
+        return implementation;
+    }
+
+    function newEscrow(address _eip20, address _canceler, uint _expiration) internal returns (address) {
+        address clone = createClone(implementation);
+        Escrow(clone).initialize(_eip20, _canceler, _expiration);
+        return clone;
+    }
+
+    // See https://eips.ethereum.org/EIPS/eip-1167
+    function createClone(address _target) internal returns (address result) {
+        bytes20 targetBytes = bytes20(_target);
+        assembly { // solhint-disable-line no-inline-assembly
+            let clone := mload(0x40)
+            mstore(clone, 0x3d602d80600a3d3981f3363d3d373d3d3d363d73000000000000000000000000)
+            mstore(add(clone, 0x14), targetBytes)
+            mstore(add(clone, 0x28), 0x5af43d82803e903d91602b57fd5bf30000000000000000000000000000000000)
+            result := create(0, clone, 0x37)
+        }
+        require(result != address(0), "Clone deployment failed");
+    }
+}
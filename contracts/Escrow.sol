@@ -29,10 +29,20 @@ contract Escrow {
 
     uint private expiration;
 
-    uint256[] private finalAmounts;
     bool private bulkPaid;
 
     constructor(address _eip20, address _canceler, uint _expiration) public {
+        init(_eip20, _canceler, _expiration);
+    }
+
+    // Initializes a minimal proxy clone of an Escrow implementation, which
+    // has no constructor of its own. It can be called only once.
+    function initialize(address _eip20, address _canceler, uint _expiration) public {
+        require(launcher == address(0), "Escrow already initialized");
+        init(_eip20, _canceler, _expiration);
+    }
+
+    function init(address _eip20, address _canceler, uint _expiration) internal {
         eip20 = _eip20;
         canceler = _canceler;
         status = EscrowStatuses.Launched;
@@ -205,10 +215,9 @@ contract Escrow {
         finalResultsUrl = _url;
         finalResultsHash = _hash;
 
-        (uint256 reputationOracleFee, uint256 recordingOracleFee) = finalizePayouts(_amounts);
+        (uint256[] memory finalAmounts, uint256 reputationOracleFee, uint256 recordingOracleFee) = finalizePayouts(_amounts);
         HMTokenInterface token = HMTokenInterface(eip20);
         if (token.transferBulk(_recipients, finalAmounts, _txId) == _recipients.length) {
-            delete finalAmounts;
             bulkPaid = token.transfer(reputationOracle, reputationOracleFee);
             bulkPaid = token.transfer(recordingOracle, recordingOracleFee);
         }
@@ -225,18 +234,21 @@ contract Escrow {
         return bulkPaid;
     }
 
-    function finalizePayouts(uint256[] _amounts) public returns (uint256, uint256) {
+    // Splits the payout amounts into the net amounts of the recipients and
+    // the fees of the oracles. Everything stays in memory. It used to be
+    // public and is no longer part of the ABI.
+    function finalizePayouts(uint256[] _amounts) internal view returns (uint256[] memory, uint256, uint256) {
+        uint256[] memory finalAmounts = new uint256[](_amounts.length);
         uint256 reputationOracleFee = 0;
         uint256 recordingOracleFee = 0;
         for (uint256 j; j < _amounts.length; j++) {
             uint256 singleReputationOracleFee = reputationOracleStake.mul(_amounts[j]).div(100);
             uint256 singleRecordingOracleFee = recordingOracleStake.mul(_amounts[j]).div(100);
-            uint256 amount = _amounts[j].sub(singleReputationOracleFee).sub(singleRecordingOracleFee);
+            finalAmounts[j] = _amounts[j].sub(singleReputationOracleFee).sub(singleRecordingOracleFee);
             reputationOracleFee = reputationOracleFee.add(singleReputationOracleFee);
             recordingOracleFee = recordingOracleFee.add(singleRecordingOracleFee);
-            finalAmounts.push(amount);
         }
-        return (reputationOracleFee, recordingOracleFee);
+        return (finalAmounts, reputationOracleFee, recordingOracleFee);
     }
 
     event Pending(string manifest, string hash);
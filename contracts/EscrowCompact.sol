@@ -0,0 +1,273 @@
+pragma solidity 0.4.24;
+import "./HMTokenInterface.sol";
+import "./SafeMath.sol";
+
+// An Escrow with the same interface apart from the results hashes, which are
+// stored as bytes20 SHA-1 digests instead of hex strings, and a storage
+// layout packing the fields written together into the same slots:
+// setup writes slot 0, 1 (recordingOracle), 5 and the manifest url,
+// storeResults only the intermediate url and slot 6, and bulkPayOut the final
+// url and slot 7.
+contract EscrowCompact {
+    using SafeMath for uint256;
+    event IntermediateStorage(string _url, bytes20 _hash);
+    enum EscrowStatuses { Launched, Pending, Partial, Paid, Complete, Cancelled }
+
+    uint256 private constant LAYOUT_VERSION = 2;
+
+    // slot 0
+    EscrowStatuses private status;
+    address private reputationOracle;
+    uint8 private reputationOracleStake;
+    uint8 private recordingOracleStake;
+    bool private bulkPaid;
+
+    // slot 1
+    address private recordingOracle;
+    uint64 private expiration;
+
+    // slot 2, 3 and 4
+    address private launcher;
+    address private canceler;
+    address private eip20;
+
+    // slot 5, 6 and 7
+    bytes20 private manifestHash;
+    bytes20 private intermediateResultsHash;
+    bytes20 private finalResultsHash;
+
+    string private manifestUrl;
+    string private intermediateResultsUrl;
+    string private finalResultsUrl;
+
+    constructor(address _eip20, address _canceler, uint _expiration) public {
+        init(_eip20, _canceler, _expiration);
+    }
+
+    // Initializes a minimal proxy clone of an EscrowCompact implementation,
+    // which has no constructor of its own. It can be called only once.
+    function initialize(address _eip20, address _canceler, uint _expiration) public {
+        require(launcher == address(0), "Escrow already initialized");
+        init(_eip20, _canceler, _expiration);
+    }
+
+    function init(address _eip20, address _canceler, uint _expiration) internal {
+        uint256 expiresAt = _expiration.add(block.timestamp); // solhint-disable-line not-rely-on-time
+        require(expiresAt == uint256(uint64(expiresAt)), "Expiration out of bounds");
+        eip20 = _eip20;
+        canceler = _canceler;
+        status = EscrowStatuses.Launched;
+        expiration = uint64(expiresAt);
+        launcher = msg.sender;
+    }
+
+    function getLayoutVersion() public pure returns (uint256) {
+        return LAYOUT_VERSION;
+    }
+
+    function getLauncher() public view returns (address) {
+        return launcher;
+    }
+
+    function getStatus() public view returns (EscrowStatuses) {
+        return status;
+    }
+
+    function getTokenAddress() public view returns (address) {
+        return eip20;
+    }
+
+    function getBalance() public view returns (uint256) {
+        return HMTokenInterface(eip20).balanceOf(address(this));
+    }
+
+    function getAddressBalance(address _address) public view returns (uint256) {
+        require(_address != address(0), "Token spender is an uninitialized address");
+        return HMTokenInterface(eip20).balanceOf(address(_address));
+    }
+
+    function getReputationOracle() public view returns (address) {
+        return reputationOracle;
+    }
+
+    function getRecordingOracle() public view returns (address) {
+        return recordingOracle;
+    }
+
+    function getManifestHash() public view returns (bytes20) {
+        return manifestHash;
+    }
+
+    function getManifestUrl() public view returns (string) {
+        return manifestUrl;
+    }
+
+    function getIntermediateResultsUrl() public view returns (string) {
+        return intermediateResultsUrl;
+    }
+
+    function getIntermediateResultsHash() public view returns (bytes20) {
+        return intermediateResultsHash;
+    }
+
+    function getFinalResultsUrl() public view returns (string) {
+        return finalResultsUrl;
+    }
+
+    function getFinalResultsHash() public view returns (bytes20) {
+        return finalResultsHash;
+    }
+
+    function getBulkPaid() public view returns (bool) {
+        return bulkPaid;
+    }
+
+    function setup(
+        address _reputationOracle,
+        address _recordingOracle,
+        uint256 _reputationOracleStake,
+        uint256 _recordingOracleStake,
+        string _url,
+        bytes20 _hash
+    ) public
+    {
+        require(expiration > block.timestamp, "Contract expired");  // solhint-disable-line not-rely-on-time
+        require(msg.sender == canceler, "Address calling not the canceler");
+        require(_reputationOracle != address(0), "Token spender is an uninitialized address");
+        require(_recordingOracle != address(0), "Token spender is an uninitialized address");
+        require(
+            _reputationOracleStake.add(_recordingOracleStake) >= 0 &&
+            _reputationOracleStake.add(_recordingOracleStake) <= 100,
+            "Stake out of bounds"
+        );
+        require(status == EscrowStatuses.Launched, "Escrow not in Launched status state");
+
+        reputationOracle = _reputationOracle;
+        recordingOracle = _recordingOracle;
+        reputationOracleStake = uint8(_reputationOracleStake);
+        recordingOracleStake = uint8(_recordingOracleStake);
+        bulkPaid = false;
+
+        manifestUrl = _url;
+        manifestHash = _hash;
+        status = EscrowStatuses.Pending;
+        emit Pending(_url, _hash);
+    }
+
+    function abort()  public {
+        require(msg.sender == canceler, "Address calling not the canceler");
+        require(status != EscrowStatuses.Partial, "Escrow in Partial status state");
+        require(status != EscrowStatuses.Complete, "Escrow in Complete status state");
+        require(status != EscrowStatuses.Paid, "Escrow in Paid status state");
+        selfdestruct(canceler);
+    }
+
+    function cancel() public returns (bool) {
+        require(msg.sender == canceler, "Address calling not the canceler");
+        require(status != EscrowStatuses.Complete, "Escrow in Complete status state");
+        require(status != EscrowStatuses.Paid, "Escrow in Paid status state");
+        uint256 balance = getBalance();
+        require(balance > 0, "EIP20 contract out of funds");
+
+        HMTokenInterface token = HMTokenInterface(eip20);
+        bool success = token.transfer(canceler, balance);
+        status = EscrowStatuses.Cancelled;
+
+        return success;
+    }
+
+    function complete() public {
+        require(expiration > block.timestamp, "Contract expired");  // solhint-disable-line not-rely-on-time
+        require(msg.sender == reputationOracle, "Address calling not the reputation oracle");
+
+        if (status == EscrowStatuses.Paid) {
+            status = EscrowStatuses.Complete;
+        }
+    }
+
+    function storeResults(string _url, bytes20 _hash) public {
+        require(expiration > block.timestamp, "Contract expired");  // solhint-disable-line not-rely-on-time
+        require(msg.sender == recordingOracle, "Address calling not the recording oracle");
+        require(
+            status == EscrowStatuses.Pending ||
+            status == EscrowStatuses.Partial,
+            "Escrow not in Pending or Partial status state"
+        );
+        intermediateResultsUrl = _url;
+        intermediateResultsHash = _hash;
+        emit IntermediateStorage(_url, _hash);
+    }
+
+    function bulkPayOut(
+        address[] _recipients,
+        uint256[] _amounts,
+        string _url,
+        bytes20 _hash,
+        uint256 _txId
+    ) public returns (bool)
+    {
+        require(expiration > block.timestamp, "Contract expired");  // solhint-disable-line not-rely-on-time
+        require(msg.sender == reputationOracle, "Address calling not the reputation oracle");
+        uint256 balance = getBalance();
+        require(balance > 0, "EIP20 contract out of funds");
+        require(status != EscrowStatuses.Launched, "Escrow in Launched status state");
+        require(status != EscrowStatuses.Paid, "Escrow in Paid status state");
+
+        uint256 aggregatedBulkAmount = 0;
+        for (uint256 i; i < _amounts.length; i++) {
+            aggregatedBulkAmount += _amounts[i];
+        }
+
+        // bulkPaid shares slot 0 with the status, so it is kept in memory and
+        // written once together with the new status.
+        bool paid = false;
+        if (balance < aggregatedBulkAmount) {
+            bulkPaid = paid;
+            return paid;
+        }
+
+        finalResultsUrl = _url;
+        finalResultsHash = _hash;
+
+        (uint256[] memory finalAmounts, uint256 reputationOracleFee, uint256 recordingOracleFee) = finalizePayouts(_amounts);
+        HMTokenInterface token = HMTokenInterface(eip20);
+        if (token.transferBulk(_recipients, finalAmounts, _txId) == _recipients.length) {
+            paid = token.transfer(reputationOracle, reputationOracleFee);
+            paid = token.transfer(recordingOracle, recordingOracleFee);
+        }
+
+        EscrowStatuses newStatus = status;
+        balance = getBalance();
+        if (paid) {
+            if (newStatus == EscrowStatuses.Pending) {
+                newStatus = EscrowStatuses.Partial;
+            }
+            if (balance == 0 && (newStatus == EscrowStatuses.Pending || newStatus == EscrowStatuses.Partial)) {
+                newStatus = EscrowStatuses.Paid;
+            }
+        }
+        bulkPaid = paid;
+        status = newStatus;
+        return paid;
+    }
+
+    // Splits the payout amounts into the net amounts of the recipients and
+    // the fees of the oracles. Everything stays in memory.
+    function finalizePayouts(uint256[] _amounts) internal view returns (uint256[] memory, uint256, uint256) {
+        uint256[] memory finalAmounts = new uint256[](_amounts.length);
+        uint256 reputationOracleFee = 0;
+        uint256 recordingOracleFee = 0;
+        uint256 reputationStake = reputationOracleStake;
+        uint256 recordingStake = recordingOracleStake;
+        for (uint256 j; j < _amounts.length; j++) {
+            uint256 singleReputationOracleFee = reputationStake.mul(_amounts[j]).div(100);
+            uint256 singleRecordingOracleFee = recordingStake.mul(_amounts[j]).div(100);
+            finalAmounts[j] = _amounts[j].sub(singleReputationOracleFee).sub(singleRecordingOracleFee);
+            reputationOracleFee = reputationOracleFee.add(singleReputationOracleFee);
+            recordingOracleFee = recordingOracleFee.add(singleRecordingOracleFee);
+        }
+        return (finalAmounts, reputationOracleFee, recordingOracleFee);
+    }
+
+    event Pending(string manifest, bytes20 hash);
+}
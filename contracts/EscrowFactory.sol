@@ -13,11 +13,18 @@ contract EscrowFactory {
     }
 
     function createEscrow() public returns (address) {
-        Escrow escrow = new Escrow(eip20, msg.sender, 8640000);
-        counter++;
-        escrowCounters[address(escrow)] = counter;
-        lastEscrow = address(escrow);
-        emit Launched(eip20, lastEscrow);
+        return deployEscrow();
+    }
+
+    // Deploys many escrows in one transaction, the caller chooses the count
+    // to fit its gas limit. Every escrow emits its own Launched event.
+    function createEscrows(uint256 _count) public returns (address[]) {
+        require(_count > 0, "Escrow count must be positive");
+        address[] memory escrows = new address[](_count);
+        for (uint256 i = 0; i < _count; i++) {
+            escrows[i] = deployEscrow();
+        }
+        return escrows;
     }
 
     function getCounter() public view returns (uint) {
@@ -45,4 +52,17 @@ contract EscrowFactory {
         uint escrowCounter = getEscrowCounter(_address);
         return escrowCounter > 0;
     }
+
+    function deployEscrow() internal returns (address) {
+        address escrow = newEscrow(eip20, msg.sender, 8640000);
+        counter++;
+        escrowCounters[escrow] = counter;
+        lastEscrow = escrow;
+        emit Launched(eip20, lastEscrow);
+        return lastEscrow;
+    }
+
+    function newEscrow(address _eip20, address _canceler, uint _expiration) internal returns (address) {
+        return address(new Escrow(_eip20, _canceler, _expiration));
+    }
 }
@@ -0,0 +1,135 @@
+pragma solidity 0.4.24;
+import "./SafeMath.sol";
+
+contract EscrowReader {
+    using SafeMath for uint256;
+
+    bytes4 private constant GET_STATUS = 0x4e69d560; // getStatus()
+    bytes4 private constant GET_BALANCE = 0x12065fe0; // getBalance()
+    bytes4 private constant GET_BULK_PAID = 0x9a98c5bf; // getBulkPaid()
+    bytes4 private constant GET_INTERMEDIATE_RESULTS_URL = 0xfbf55af5; // getIntermediateResultsUrl()
+    bytes4 private constant GET_FINAL_RESULTS_URL = 0xec21a291; // getFinalResultsUrl()
+
+    // Reads the status, balance and bulk paid flag of many escrows at once.
+    // Addresses which don't answer like an escrow are reported with
+    // exists set to false instead of failing the whole call.
+    function getStates(address[] _escrows) public view returns (
+        bool[] exists,
+        uint256[] statuses,
+        uint256[] balances,
+        bool[] bulkPaid
+    )
+    {
+        exists = new bool[](_escrows.length);
+        statuses = new uint256[](_escrows.length);
+        balances = new uint256[](_escrows.length);
+        bulkPaid = new bool[](_escrows.length);
+
+        for (uint256 i = 0; i < _escrows.length; i++) {
+            bool ok;
+            (ok, statuses[i]) = callUint(_escrows[i], GET_STATUS);
+            if (!ok) {
+                continue;
+            }
+            exists[i] = true;
+            (, balances[i]) = callUint(_escrows[i], GET_BALANCE);
+            uint256 paid;
+            (, paid) = callUint(_escrows[i], GET_BULK_PAID);
+            bulkPaid[i] = paid != 0;
+        }
+    }
+
+    // Reads the intermediate and final results urls of many escrows at once.
+    // Nested dynamic arrays can't be returned without the experimental ABI
+    // encoder, so the urls are concatenated and split by their lengths.
+    // A url which can't be read is reported as an empty string.
+    function getResultsUrls(address[] _escrows) public view returns (
+        bytes intermediateUrls,
+        uint256[] intermediateLengths,
+        bytes finalUrls,
+        uint256[] finalLengths
+    )
+    {
+        bytes[] memory intermediate = new bytes[](_escrows.length);
+        bytes[] memory results = new bytes[](_escrows.length);
+        for (uint256 i = 0; i < _escrows.length; i++) {
+            (, intermediate[i]) = callBytes(_escrows[i], GET_INTERMEDIATE_RESULTS_URL);
+            (, results[i]) = callBytes(_escrows[i], GET_FINAL_RESULTS_URL);
+        }
+        (intermediateUrls, intermediateLengths) = pack(intermediate);
+        (finalUrls, finalLengths) = pack(results);
+    }
+
+    function callUint(address _target, bytes4 _selector) internal view returns (bool ok, uint256 value) {
+        uint256 size;
+        assembly { size := extcodesize(_target) } // solhint-disable-line no-inline-assembly
+        if (size == 0) {
+            return (false, 0);
+        }
+        assembly { // solhint-disable-line no-inline-assembly
+            let ptr := mload(0x40)
+            mstore(ptr, _selector)
+            ok := staticcall(gas, _target, ptr, 4, ptr, 32)
+            if lt(returndatasize, 32) { ok := 0 }
+            switch ok
+            case 0 { value := 0 }
+            default { value := mload(ptr) }
+        }
+    }
+
+    // Calls a getter returning a string, the value is empty if the call fails
+    // or doesn't return a well-formed string.
+    function callBytes(address _target, bytes4 _selector) internal view returns (bool ok, bytes memory value) {
+        uint256 size;
+        assembly { size := extcodesize(_target) } // solhint-disable-line no-inline-assembly
+        if (size == 0) {
+            return (false, value);
+        }
+        assembly { // solhint-disable-line no-inline-assembly
+            let ptr := mload(0x40)
+            mstore(ptr, _selector)
+            ok := staticcall(gas, _target, ptr, 4, 0, 0)
+            let returned := returndatasize
+            // The offset of the string, then its length and its data.
+            if lt(returned, 64) { ok := 0 }
+            if ok {
+                returndatacopy(ptr, 0, returned)
+                let offset := mload(ptr)
+                if gt(offset, sub(returned, 32)) { ok := 0 }
+                if ok {
+                    if gt(mload(add(ptr, offset)), sub(returned, add(offset, 32))) { ok := 0 }
+                }
+                if ok {
+                    value := add(ptr, offset)
+                    mstore(0x40, add(ptr, and(add(returned, 31), not(31))))
+                }
+            }
+        }
+    }
+
+    function pack(bytes[] memory _parts) internal pure returns (bytes memory packed, uint256[] memory lengths) {
+        lengths = new uint256[](_parts.length);
+        uint256 total = 0;
+        for (uint256 i = 0; i < _parts.length; i++) {
+            lengths[i] = _parts[i].length;
+            total = total.add(lengths[i]);
+        }
+
+        // One spare word lets the copy below move whole words past the end.
+        packed = new bytes(total + 32);
+        uint256 offset = 0;
+        for (uint256 j = 0; j < _parts.length; j++) {
+            bytes memory part = _parts[j];
+            assembly { // solhint-disable-line no-inline-assembly
+                let dest := add(add(packed, 32), offset)
+                let src := add(part, 32)
+                let end := add(src, mload(part))
+                for { } lt(src, end) { src := add(src, 32) dest := add(dest, 32) } {
+                    mstore(dest, mload(src))
+                }
+            }
+            offset += lengths[j];
+        }
+        assembly { mstore(packed, total) } // solhint-disable-line no-inline-assembly
+    }
+}
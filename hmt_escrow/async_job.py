@@ -0,0 +1,727 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+import os
+
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from eth_abi import encode_abi
+from eth_account import Account
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract import Contract
+from web3.datastructures import AttributeDict
+from web3.middleware.pythonic import receipt_formatter
+
+from hmt_escrow.eth_bridge import (
+    CONTRACT_FOLDER, ESCROW_LAYOUT_COMPACT, ESCROW_LAYOUT_LEGACY, HMTOKEN_ADDR,
+    HMT_ETH_POOL_SIZE, HMT_ETH_TIMEOUT, GAS_ESTIMATES, GAS_PRICES,
+    _ESCROW_LAYOUTS, decode_call, decode_hash, encode_call, encode_hash,
+    get_contract_interface, get_escrow, get_factory, get_hmtoken, get_w3,
+    is_revert)
+from hmt_escrow.gas import GAS_ESTIMATE, Urgency
+from hmt_escrow.job import GAS_LIMIT, Status
+from hmt_escrow.receipts import (RECEIPT_BATCH_SIZE, RECEIPT_POLL_MAX,
+                                 RECEIPT_POLL_MIN, RECEIPT_TIMEOUT)
+from hmt_escrow.blobs import key_fingerprint
+from hmt_escrow.storage import (BLOBS, IPFS_HOST, IPFS_POOL_SIZE, IPFS_PORT,
+                                IPFS_TIMEOUT, PAYLOADS, PublicKeys,
+                                _decrypt_payload, encrypt_msg)
+from basemodels import Manifest
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # type: ignore
+
+LOG = logging.getLogger("hmt_escrow.async_job")
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise ImportError(
+            "aiohttp is required for the asyncio API: pip install hmt-escrow[async]"
+        )
+
+
+class AsyncEthClient:
+    """An asyncio JSON-RPC client of an ethereum node. Requests share one
+    aiohttp session with a pool of keep-alive connections, nonces are
+    allocated locally per gas payer and the receipts of all pending
+    transactions are polled by a single task in JSON-RPC batches.
+
+    Attributes:
+        endpoint (str): the url of the ethereum node.
+
+    """
+
+    def __init__(self,
+                 endpoint: Optional[str] = None,
+                 pool_size: int = HMT_ETH_POOL_SIZE,
+                 timeout: float = HMT_ETH_TIMEOUT):
+        _require_aiohttp()
+        self.endpoint = endpoint if endpoint else os.getenv(
+            "HMT_ETH_SERVER", 'http://localhost:8545')
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._request_id = 0
+        self._nonce_locks: Dict[str, asyncio.Lock] = {}
+        self._next_nonce: Dict[str, int] = {}
+        self._receipts: Dict[HexBytes, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Future] = None
+        self._chain_id: Optional[int] = None
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size),
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+        return self._session
+
+    async def close(self):
+        if self._poller:
+            self._poller.cancel()
+        if self._session:
+            await self._session.close()
+
+    def _rpc(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        self._request_id += 1
+        return {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": self._request_id
+        }
+
+    async def request(self, method: str, params: List[Any]) -> Any:
+        """Sends a single JSON-RPC request.
+
+        Raises:
+            ValueError: if the node responds with an error.
+
+        """
+        async with self._get_session().post(
+                self.endpoint, json=self._rpc(method, params)) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if "error" in body:
+            raise ValueError(body["error"])
+        return body["result"]
+
+    async def batch_request(
+            self, calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+        """Sends many JSON-RPC requests in a single HTTP round trip.
+
+        Returns:
+            List[Dict[str, Any]]: returns the raw responses in call order.
+
+        """
+        payload = [self._rpc(method, params) for method, params in calls]
+        async with self._get_session().post(
+                self.endpoint, json=payload) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if not isinstance(body, list):
+            raise ValueError(body.get("error", body))
+        by_id = {r.get("id"): r for r in body}
+        return [
+            by_id.get(rpc["id"], {"error": "No response"}) for rpc in payload
+        ]
+
+    async def call(self,
+                   contract: Contract,
+                   fn_name: str,
+                   *args,
+                   gas_payer: Optional[str] = None,
+                   gas: Optional[int] = None) -> Any:
+        """Calls a view function of a contract with eth_call.
+
+        Returns:
+            Any: returns the decoded output of the function.
+
+        """
+        txn = encode_call(contract, fn_name, *args)
+        txn['gas'] = hex(gas or GAS_LIMIT)
+        if gas_payer:
+            txn['from'] = gas_payer
+        return_data = await self.request("eth_call", [txn, "latest"])
+        return decode_call(contract, fn_name, return_data, *args)
+
+    async def get_code(self, address: str) -> HexBytes:
+        return HexBytes(await self.request("eth_getCode", [address, "latest"]))
+
+    async def get_escrow(self, escrow_addr: str) -> Contract:
+        """The asyncio counterpart of hmt_escrow.eth_bridge.get_escrow, which
+        detects the layout of the escrow without blocking the loop and
+        shares the layouts cached by hmt_escrow.eth_bridge.escrow_layout.
+
+        Returns:
+            Contract: returns the Escrow solidity contract.
+
+        Raises:
+            ValueError: if the node fails the call for another reason than a
+            revert.
+
+        """
+        cached = _ESCROW_LAYOUTS.get(escrow_addr)
+        if cached:
+            return get_escrow(escrow_addr, cached)
+
+        escrow = get_escrow(escrow_addr, ESCROW_LAYOUT_COMPACT)
+        try:
+            return_data = HexBytes(await self.request(
+                "eth_call",
+                [encode_call(escrow, "getLayoutVersion"), "latest"]))
+        except ValueError as e:
+            if not is_revert(e):
+                raise e
+            return_data = HexBytes(b"")
+        layout: int
+        if return_data:
+            layout = decode_call(escrow, "getLayoutVersion", return_data)
+        else:
+            # The original Escrow reverts on the unknown selector.
+            layout = ESCROW_LAYOUT_LEGACY
+        _ESCROW_LAYOUTS[escrow_addr] = layout
+        return get_escrow(escrow_addr, layout)
+
+    async def chain_id(self) -> int:
+        """Returns the chain id transactions are signed for, asking the node
+        only once per client."""
+        if self._chain_id is None:
+            self._chain_id = int(await self.request("net_version", []))
+        return self._chain_id
+
+    async def _allocate_nonce(self, address: str) -> int:
+        lock = self._nonce_locks.setdefault(address, asyncio.Lock())
+        async with lock:
+            nonce = self._next_nonce.get(address)
+            if nonce is None:
+                nonce = int(
+                    await self.request("eth_getTransactionCount",
+                                       [address, "pending"]), 16)
+            self._next_nonce[address] = nonce + 1
+            return nonce
+
+    async def send_transaction(self,
+                               data: str,
+                               gas_payer: str,
+                               gas_payer_priv: str,
+                               gas: Optional[int] = None,
+                               to: Optional[str] = None,
+                               gas_price: Optional[int] = None,
+                               urgency: Urgency = Urgency.NORMAL) -> HexBytes:
+        """Signs and sends a transaction, deploying a contract if "to" is None.
+        Its gas price is gas_price, or the price GAS_PRICES gives the urgency,
+        the same as for the transactions of hmt_escrow.eth_bridge.
+
+        Returns:
+            HexBytes: returns the transaction hash.
+
+        """
+        if not gas_price:
+            # The strategy may ask the node, keep the loop running meanwhile.
+            gas_price = await asyncio.get_event_loop().run_in_executor(
+                None, GAS_PRICES.price, urgency)
+        chain_id = await self.chain_id()
+        nonce = await self._allocate_nonce(gas_payer)
+        txn = {
+            'data': data,
+            'gas': gas or GAS_LIMIT,
+            'gasPrice': gas_price,
+            'nonce': nonce,
+            'chainId': chain_id
+        }
+        if to:
+            txn['to'] = to
+        signed_txn = Account.signTransaction(txn, gas_payer_priv)
+        try:
+            return HexBytes(await self.request(
+                "eth_sendRawTransaction", [signed_txn.rawTransaction.hex()]))
+        except Exception as e:
+            # The nonce may or may not have been consumed, ask the node again.
+            self._next_nonce.pop(gas_payer, None)
+            raise e
+
+    async def transact(self, contract: Contract, fn_name: str, *args,
+                       **credentials) -> AttributeDict:
+        """Sends a transaction to a contract function and waits for its receipt.
+
+        Args:
+            contract (Contract): the contract being called.
+            fn_name (str): the name of the contract function.
+            *args: all the arguments the function takes.
+            **credentials: gas_payer, gas_payer_priv and the optional gas,
+                gas_price and urgency. Without gas, the transaction is sent
+                with the estimate of GAS_ESTIMATES, capped by GAS_LIMIT.
+
+        Returns:
+            AttributeDict: returns the transaction receipt.
+
+        """
+        call = encode_call(contract, fn_name, *args)
+        gas = credentials.get("gas")
+        if gas is None and GAS_ESTIMATE:
+            gas = await asyncio.get_event_loop().run_in_executor(
+                None, GAS_ESTIMATES.estimate, get_w3(),
+                getattr(contract.functions, fn_name), args,
+                credentials["gas_payer"], GAS_LIMIT)
+        txn_hash = await self.send_transaction(
+            call['data'],
+            credentials["gas_payer"],
+            credentials["gas_payer_priv"],
+            gas,
+            to=call['to'],
+            gas_price=credentials.get("gas_price"),
+            urgency=credentials.get("urgency", Urgency.NORMAL))
+        return await self.wait_for_receipt(txn_hash)
+
+    async def wait_for_receipt(self,
+                               txn_hash: bytes,
+                               timeout: float = RECEIPT_TIMEOUT
+                               ) -> AttributeDict:
+        """Waits for a transaction receipt collected by the batched poller.
+
+        Raises:
+            TimeoutError: if waiting for the transaction receipt times out.
+
+        """
+        txn_hash = HexBytes(txn_hash)
+        future = self._receipts.get(txn_hash)
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            self._receipts[txn_hash] = future
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_receipts())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._receipts.pop(txn_hash, None)
+            raise TimeoutError("Transaction {} is not in the chain".format(
+                txn_hash.hex()))
+
+    async def _poll_receipts(self):
+        interval = RECEIPT_POLL_MIN
+        while self._receipts:
+            progressed = False
+            pending = list(self._receipts.items())
+            for i in range(0, len(pending), RECEIPT_BATCH_SIZE):
+                chunk = pending[i:i + RECEIPT_BATCH_SIZE]
+                try:
+                    responses = await self.batch_request(
+                        [("eth_getTransactionReceipt", [txn_hash.hex()])
+                         for txn_hash, _ in chunk])
+                except Exception as e:
+                    LOG.warning(
+                        "Polling receipts failed because of: {}".format(e))
+                    break
+                for (txn_hash, future), response in zip(chunk, responses):
+                    raw_receipt = response.get("result")
+                    if raw_receipt and raw_receipt.get("blockNumber"):
+                        self._receipts.pop(txn_hash, None)
+                        if not future.done():
+                            future.set_result(
+                                AttributeDict.recursive(
+                                    receipt_formatter(raw_receipt)))
+                        progressed = True
+            interval = RECEIPT_POLL_MIN if progressed else min(
+                interval * 2, RECEIPT_POLL_MAX)
+            await asyncio.sleep(interval)
+
+
+class AsyncIPFSClient:
+    """An asyncio client of the IPFS HTTP API sharing an aiohttp session with a
+    pool of keep-alive connections. Payloads use the same format as
+    hmt_escrow.storage, and encryption runs in the default executor so large
+    payloads don't block the event loop.
+
+    """
+
+    def __init__(self,
+                 host: str = IPFS_HOST,
+                 port: int = IPFS_PORT,
+                 pool_size: int = IPFS_POOL_SIZE,
+                 timeout: float = IPFS_TIMEOUT):
+        _require_aiohttp()
+        self.base_url = "http://{}:{}/api/v0".format(host, port)
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size),
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+        return self._session
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+
+    async def upload(self, msg: Dict,
+                     public_key: PublicKeys) -> Tuple[str, str]:
+        """Encrypt and upload a message like hmt_escrow.storage.upload, for
+        one or more public keys.
+
+        Returns:
+            Tuple[str, str]: returns the hash of the message and its IPFS key.
+
+        """
+        loop = asyncio.get_event_loop()
+        hash_, ciphertext = await loop.run_in_executor(None, encrypt_msg, msg,
+                                                       public_key)
+        form = aiohttp.FormData()
+        form.add_field("file", ciphertext, filename="bytes")
+        async with self._get_session().post(
+                self.base_url + "/add", data=form) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        await loop.run_in_executor(None, BLOBS.put, body["Hash"], ciphertext)
+        return hash_, body["Hash"]
+
+    async def download(self, key: str, private_key: bytes) -> Dict:
+        """Download and decrypt a message like hmt_escrow.storage.download,
+        sharing its caches.
+
+        Returns:
+            Dict: returns the decrypted message.
+
+        """
+        fingerprint = key_fingerprint(private_key)
+        msg = PAYLOADS.get(key, fingerprint)
+        if msg is not None:
+            return json.loads(msg)
+
+        loop = asyncio.get_event_loop()
+        ciphertext = await loop.run_in_executor(None, BLOBS.get, key)
+        if ciphertext is None:
+            LOG.debug("Downloading key: {}".format(key))
+            async with self._get_session().post(
+                    self.base_url + "/cat", params={"arg": key}) as response:
+                response.raise_for_status()
+                ciphertext = await response.read()
+            await loop.run_in_executor(None, BLOBS.put, key, ciphertext)
+        msg = await self._decrypt(private_key, ciphertext)
+        PAYLOADS.put(key, fingerprint, msg)
+        return json.loads(msg)
+
+    async def _decrypt(self, private_key: bytes, ciphertext: bytes) -> str:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, _decrypt_payload, private_key,
+                                          ciphertext)
+
+
+class AsyncJob:
+    """The asyncio counterpart of hmt_escrow.job.Job. It goes through the same
+    lifecycle, but every network call is a coroutine on a shared
+    AsyncEthClient and AsyncIPFSClient, so many jobs can progress
+    concurrently on one event loop.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> async def lifecycle():
+    ...     job = AsyncJob(credentials, manifest)
+    ...     launched = await job.launch(rep_oracle_pub_key)
+    ...     setup = await job.setup()
+    ...     payouts = [("0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809", Decimal('100.0'))]
+    ...     paid = await job.bulk_payout(payouts, {}, rep_oracle_pub_key)
+    ...     completed = await job.complete()
+    ...     return launched, setup, paid, completed, await job.status()
+    >>> asyncio.get_event_loop().run_until_complete(lifecycle())
+    (True, True, True, True, <Status.Complete: 5>)
+
+    Attributes:
+        serialized_manifest (Dict[str, Any]): a dict representation of the Manifest model.
+        factory_addr (Optional[str]): the address of the factory creating Job's escrow.
+        job_contract (Contract): the escrow contract of the Job.
+        gas_payer (str): an ethereum address paying for the gas costs.
+        gas_payer_priv (str): the private key of the gas_payer.
+        amount (Decimal): an amount to be stored in the escrow contract.
+        manifest_url (str): the location of the serialized manifest in IPFS.
+        manifest_hash (str): SHA-1 hashed version of the serialized manifest.
+
+    """
+
+    def __init__(self,
+                 credentials: Dict[str, Any],
+                 escrow_manifest: Optional[Manifest] = None,
+                 factory_addr: Optional[str] = None,
+                 eth: Optional[AsyncEthClient] = None,
+                 ipfs: Optional[AsyncIPFSClient] = None):
+        """Initializes an AsyncJob from a Manifest. Unlike Job no network call is
+        made here: a new factory is deployed by launch() if no factory address
+        is given. Existing jobs are accessed with AsyncJob.access().
+
+        Args:
+            credentials (Dict[str, Any]): an ethereum address and its private key.
+            escrow_manifest (Optional[Manifest]): an instance of the Manifest class.
+            factory_addr (Optional[str]): an ethereum address of the factory.
+            eth (Optional[AsyncEthClient]): the client shared by many jobs.
+            ipfs (Optional[AsyncIPFSClient]): the client shared by many jobs.
+
+        Raises:
+            ValueError: if the credentials are not valid.
+
+        """
+        gas_payer = Web3.toChecksumAddress(credentials["gas_payer"])
+        calculated_addr = Account.privateKeyToAccount(
+            credentials["gas_payer_priv"]).address
+        if gas_payer != calculated_addr:
+            raise ValueError(
+                "Given private key doesn't match the ethereum address.")
+
+        self.gas_payer = gas_payer
+        self.gas_payer_priv = credentials["gas_payer_priv"]
+        self.factory_addr = factory_addr
+        self.eth = eth or _default_eth()
+        self.ipfs = ipfs or _default_ipfs()
+        if escrow_manifest:
+            self._init_job(escrow_manifest)
+
+    @classmethod
+    async def access(cls,
+                     credentials: Dict[str, Any],
+                     factory_addr: str,
+                     escrow_addr: str,
+                     eth: Optional[AsyncEthClient] = None,
+                     ipfs: Optional[AsyncIPFSClient] = None) -> "AsyncJob":
+        """Access an already launched job, downloading its manifest with the
+        "rep_oracle_priv_key" of the credentials.
+
+        Returns:
+            AsyncJob: returns the accessed job.
+
+        Raises:
+            ValueError: if the factory doesn't contain the escrow.
+
+        """
+        job = cls(credentials, factory_addr=factory_addr, eth=eth, ipfs=ipfs)
+        factory_contract = get_factory(factory_addr)
+        if not await job.eth.call(
+                factory_contract,
+                "hasEscrow",
+                escrow_addr,
+                gas_payer=job.gas_payer):
+            raise ValueError(
+                "Given factory address doesn't contain the given escrow address."
+            )
+        job.job_contract = await job.eth.get_escrow(escrow_addr)
+        manifest_url: str
+        manifest_hash: Any
+        manifest_url, manifest_hash = await asyncio.gather(
+            job._call("getManifestUrl"), job._call("getManifestHash"))
+        job.manifest_url = manifest_url
+        job.manifest_hash = decode_hash(manifest_hash)
+        manifest_dict = await job.manifest(credentials["rep_oracle_priv_key"])
+        job._init_job(Manifest(manifest_dict))
+        return job
+
+    def _init_job(self, manifest: Manifest):
+        serialized_manifest = dict(manifest.serialize())
+        per_job_cost = Decimal(serialized_manifest['task_bid_price'])
+        number_of_answers = int(serialized_manifest['job_total_tasks'])
+        self.serialized_manifest = serialized_manifest
+        self.amount = Decimal(per_job_cost * number_of_answers)
+
+    @property
+    def _credentials(self) -> Dict[str, str]:
+        return {
+            "gas_payer": self.gas_payer,
+            "gas_payer_priv": self.gas_payer_priv
+        }
+
+    async def _call(self, fn_name: str, *args,
+                    gas: Optional[int] = None) -> Any:
+        return await self.eth.call(
+            self.job_contract,
+            fn_name,
+            *args,
+            gas_payer=self.gas_payer,
+            gas=gas or GAS_LIMIT)
+
+    async def _deploy_factory(self, gas: Optional[int]) -> str:
+        contract_interface = get_contract_interface(
+            '{}/EscrowFactory.sol:EscrowFactory'.format(CONTRACT_FOLDER))
+        data = '0x' + contract_interface['bin'] + encode_abi(
+            ['address'], [HMTOKEN_ADDR]).hex()
+        txn_hash = await self.eth.send_transaction(data, self.gas_payer,
+                                                   self.gas_payer_priv, gas)
+        txn_receipt = await self.eth.wait_for_receipt(txn_hash)
+        return txn_receipt['contractAddress']
+
+    async def launch(self, pub_key: bytes, gas: Optional[int] = None) -> bool:
+        """Launches an escrow contract to the network and uploads the manifest
+        to IPFS with the public key of the Reputation Oracle. The escrow is
+        taken from the Launched event of the createEscrow receipt, so
+        concurrent launches on the same factory don't mix up their escrows.
+
+        Args:
+            pub_key (bytes): the public key of the Reputation Oracle.
+
+        Returns:
+            bool: returns True if the escrow is deployed and empty.
+
+        """
+        if hasattr(self, "job_contract"):
+            raise AttributeError("The escrow has been already deployed.")
+
+        if not self.factory_addr:
+            self.factory_addr = await self._deploy_factory(gas)
+        factory_contract = get_factory(self.factory_addr)
+
+        upload = asyncio.ensure_future(
+            self.ipfs.upload(self.serialized_manifest, pub_key))
+        txn_receipt = await self.eth.transact(
+            factory_contract, "createEscrow", gas=gas, **self._credentials)
+        events = factory_contract.events.Launched().processReceipt(txn_receipt)
+        job_addr = events[0]['args']['escrow']
+        LOG.info("Job's escrow contract deployed to:{}".format(job_addr))
+        self.job_contract = await self.eth.get_escrow(job_addr)
+
+        (self.manifest_hash, self.manifest_url) = await upload
+        status, balance = await asyncio.gather(self.status(), self.balance())
+        return status == Status.Launched and balance == 0
+
+    async def setup(self, gas: Optional[int] = None) -> bool:
+        """Funds the escrow contract with HMT and stores the manifest data to it.
+
+        Returns:
+            bool: returns True if Job is in Pending state.
+
+        """
+        oracle_stake = int(
+            Decimal(self.serialized_manifest["oracle_stake"]) * 100)
+        reputation_oracle = str(
+            self.serialized_manifest["reputation_oracle_addr"])
+        recording_oracle = str(
+            self.serialized_manifest["recording_oracle_addr"])
+        hmt_amount = int(self.amount * 10**18)
+
+        await self.eth.transact(
+            get_hmtoken(),
+            "transfer",
+            self.job_contract.address,
+            hmt_amount,
+            gas=gas,
+            **self._credentials)
+        await self.eth.transact(
+            self.job_contract,
+            "setup",
+            reputation_oracle,
+            recording_oracle,
+            oracle_stake,
+            oracle_stake,
+            self.manifest_url,
+            encode_hash(self.job_contract, self.manifest_hash),
+            gas=gas,
+            **self._credentials)
+        status, balance = await asyncio.gather(self.status(), self.balance())
+        return status == Status.Pending and balance == hmt_amount
+
+    async def bulk_payout(self,
+                          payouts: List[Tuple[str, Decimal]],
+                          results: Dict,
+                          pub_key: bytes,
+                          gas: Optional[int] = None) -> bool:
+        """Pays multiple ethereum addresses and stores the final results.
+
+        Returns:
+            bool: returns True if paying to ethereum addresses and oracles succeeds.
+
+        """
+        (hash_, url) = await self.ipfs.upload(results, pub_key)
+        eth_addrs = [eth_addr for eth_addr, amount in payouts]
+        hmt_amounts = [int(amount * 10**18) for eth_addr, amount in payouts]
+        await self.eth.transact(
+            self.job_contract,
+            "bulkPayOut",
+            eth_addrs,
+            hmt_amounts,
+            url,
+            encode_hash(self.job_contract, hash_),
+            1,
+            gas=gas,
+            **self._credentials)
+        return await self._call("getBulkPaid") == True
+
+    async def store_intermediate_results(self,
+                                         results: Dict,
+                                         pub_key: bytes,
+                                         gas: Optional[int] = None) -> bool:
+        """Recording Oracle stores intermediate results with Reputation Oracle's
+        public key to IPFS and updates the contract's state.
+
+        Returns:
+            returns True if contract's state is updated and IPFS upload succeeds.
+
+        """
+        (hash_, url) = await self.ipfs.upload(results, pub_key)
+        await self.eth.transact(
+            self.job_contract,
+            "storeResults",
+            url,
+            encode_hash(self.job_contract, hash_),
+            gas=gas,
+            **self._credentials)
+        return True
+
+    async def complete(self, gas: Optional[int] = None) -> bool:
+        """Completes the Job if it has been paid.
+
+        Returns:
+            bool: returns True if the contract has been completed.
+
+        """
+        await self.eth.transact(
+            self.job_contract, "complete", gas=gas, **self._credentials)
+        return await self.status() == Status.Complete
+
+    async def status(self, gas: Optional[int] = None) -> Enum:
+        """Returns the status of the Job."""
+        return Status(await self._call("getStatus", gas=gas) + 1)
+
+    async def balance(self, gas: Optional[int] = None) -> int:
+        """Retrieve the balance of a Job in HMT."""
+        return await self._call("getBalance", gas=gas)
+
+    async def manifest(self, priv_key: bytes) -> Dict:
+        """Retrieves the initial manifest used to setup a Job."""
+        return await self.ipfs.download(self.manifest_url, priv_key)
+
+    async def final_results(self, priv_key: bytes,
+                            gas: Optional[int] = None) -> Dict:
+        """Retrieves the final results stored by the Reputation Oracle."""
+        final_results_url = await self._call("getFinalResultsUrl", gas=gas)
+        return await self.ipfs.download(final_results_url, priv_key)
+
+
+_DEFAULT_ETH: Optional[AsyncEthClient] = None
+_DEFAULT_IPFS: Optional[AsyncIPFSClient] = None
+
+
+def _default_eth() -> AsyncEthClient:
+    global _DEFAULT_ETH
+    if _DEFAULT_ETH is None:
+        _DEFAULT_ETH = AsyncEthClient()
+    return _DEFAULT_ETH
+
+
+def _default_ipfs() -> AsyncIPFSClient:
+    global _DEFAULT_IPFS
+    if _DEFAULT_IPFS is None:
+        _DEFAULT_IPFS = AsyncIPFSClient()
+    return _DEFAULT_IPFS
+
+
+if __name__ == "__main__":
+    import doctest
+    from test_manifest import manifest
+    doctest.testmod()
@@ -0,0 +1,477 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+LOG = logging.getLogger("hmt_escrow.blobs")
+
+# IPFS keys are immutable content hashes, so the ciphertext read for a key
+# never changes and can be kept on disk for as long as there is room. The
+# directory is private to the user, as its objects are served without asking
+# IPFS again.
+IPFS_CACHE_DIR = os.getenv(
+    "IPFS_CACHE_DIR",
+    os.path.join(
+        os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "hmt-escrow", "ipfs"))
+IPFS_CACHE_SIZE = int(os.getenv("IPFS_CACHE_SIZE", 256 * 1024 * 1024))
+
+# Bytes of decrypted payloads kept in memory. Disabled by default, as it
+# keeps plaintext around for the life of the process.
+IPFS_PAYLOAD_CACHE_SIZE = int(os.getenv("IPFS_PAYLOAD_CACHE_SIZE", 0))
+
+# Eviction frees space down to this fraction of the size, so that a full
+# cache isn't scanned again on every write.
+IPFS_CACHE_LOW_WATER = 0.9
+
+# Temporary files older than this are left behind by a crashed writer.
+STALE_TMP_AGE = 3600
+
+# go-ipfs adds a file as a balanced DAG of 256 KiB chunks with up to 174
+# links per node, and its CIDv0 key is the base58 SHA-256 multihash of the
+# root node.
+IPFS_CHUNK_SIZE = 256 * 1024
+IPFS_MAX_LINKS = 174
+
+_UNIXFS_FILE = 2
+_BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_KEY_RE = re.compile(r"^Qm[1-9A-HJ-NP-Za-km-z]{44}$")
+_TMP_PREFIX = ".tmp-"
+
+
+def key_fingerprint(private_key: Union[str, bytes]) -> str:
+    """Fingerprints a private key so that payloads decrypted with it can be
+    told apart without keeping the key itself around.
+
+    >>> key_fingerprint("28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5") == key_fingerprint(b"28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5")
+    True
+
+    Args:
+        private_key (Union[str, bytes]): the hex private key.
+
+    Returns:
+        str: returns the hex SHA-256 fingerprint of the key.
+
+    """
+    if isinstance(private_key, str):
+        private_key = private_key.encode('utf-8')
+    return hashlib.sha256(private_key).hexdigest()
+
+
+def ipfs_key(src: BinaryIO) -> str:
+    """Computes the CIDv0 key IPFS gives a file added with the default
+    settings of go-ipfs, reading it chunk by chunk.
+
+    >>> ipfs_key(io.BytesIO(b"hello world\\n"))
+    'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+    >>> ipfs_key(io.BytesIO(b""))
+    'QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH'
+
+    Args:
+        src (BinaryIO): the file-like object to hash.
+
+    Returns:
+        str: returns the IPFS key of the file.
+
+    """
+    nodes: List[Tuple[bytes, int, int]] = []
+    while True:
+        chunk = _read_full(src, IPFS_CHUNK_SIZE)
+        if chunk or not nodes:
+            data = _varint_field(1, _UNIXFS_FILE)
+            if chunk:
+                data += _bytes_field(2, chunk)
+            data += _varint_field(3, len(chunk))
+            nodes.append(_dag_node(data, [], len(chunk)))
+        if len(chunk) < IPFS_CHUNK_SIZE:
+            break
+
+    while len(nodes) > 1:
+        parents = []
+        for i in range(0, len(nodes), IPFS_MAX_LINKS):
+            children = nodes[i:i + IPFS_MAX_LINKS]
+            file_size = sum(size for _, _, size in children)
+            data = _varint_field(1, _UNIXFS_FILE) + _varint_field(3, file_size)
+            data += b"".join(_varint_field(4, size) for _, _, size in children)
+            parents.append(_dag_node(data, children, file_size))
+        nodes = parents
+    return _base58(nodes[0][0])
+
+
+def _dag_node(data: bytes, links: List[Tuple[bytes, int, int]],
+              file_size: int) -> Tuple[bytes, int, int]:
+    """Encodes a dag-pb node and returns its multihash, its cumulative size
+    and the size of the file data below it."""
+    encoded = b"".join(
+        _bytes_field(
+            2,
+            _bytes_field(1, multihash) + _bytes_field(2, b"") +
+            _varint_field(3, size)) for multihash, size, _ in links)
+    encoded += _bytes_field(1, data)
+    multihash = b"\x12\x20" + hashlib.sha256(encoded).digest()
+    return (multihash, len(encoded) + sum(size for _, size, _ in links),
+            file_size)
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _varint_field(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def _bytes_field(field: int, value: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(value)) + value
+
+
+def _base58(data: bytes) -> str:
+    value = int.from_bytes(data, 'big')
+    encoded = ""
+    while value:
+        value, digit = divmod(value, 58)
+        encoded = _BASE58[digit] + encoded
+    return _BASE58[0] * (len(data) - len(data.lstrip(b"\0"))) + encoded
+
+
+def _read_full(src: BinaryIO, size: int) -> bytes:
+    data = src.read(size)
+    while data and len(data) < size:
+        more = src.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+class BlobCache:
+    """A bounded on-disk cache of IPFS objects keyed by their IPFS hash.
+
+    Every object is one file, written to a temporary file and renamed into
+    place, so concurrent processes sharing the directory only ever see
+    complete objects. The modification time of a file is its last use, and
+    when the files grow past max_bytes the least recently used ones are
+    removed. Each process tracks the size of the directory from its own
+    writes and rescans it when evicting, so writes of other processes are
+    accounted for at the latest then.
+
+    Objects are checked against their key whenever they are read, and the
+    directory is only used if no other user can access it.
+
+    >>> a, b, c = [ipfs_key(io.BytesIO(data)) for data in (b"12345", b"67890", b"abcde")]
+    >>> cache = BlobCache(tempfile.mkdtemp(), max_bytes=12)
+    >>> cache.put(a, b"12345")
+    >>> cache.put(b, b"67890")
+    >>> time.sleep(0.01)
+    >>> cache.get(a)
+    b'12345'
+
+    b is now the least recently used object and makes room for c.
+    >>> cache.put(c, b"abcde")
+    >>> (cache.get(a), cache.get(b), cache.get(c))
+    (b'12345', None, b'abcde')
+    >>> (cache.hits, cache.misses)
+    (3, 1)
+
+    An object which doesn't match its key is dropped.
+    >>> cache.put(a, b"54321")
+    >>> cache.get(a) is None
+    True
+
+    Keys which aren't CIDv0 IPFS hashes are never cached.
+    >>> cache.put("../QmD", b"x")
+    >>> cache.get("../QmD") is None
+    True
+
+    """
+
+    def __init__(self,
+                 directory: str = IPFS_CACHE_DIR,
+                 max_bytes: int = IPFS_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self._private: Optional[bool] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self._private_directory()
+
+    def path(self, key: str) -> Optional[str]:
+        """Returns the path an object is cached at, or None if the key can't
+        be cached.
+
+        Args:
+            key (str): the IPFS hash of the object.
+
+        Returns:
+            Optional[str]: returns the path of the object.
+
+        """
+        if not _KEY_RE.match(key) or not self.enabled:
+            return None
+        return os.path.join(self.directory, key[-2:], key)
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Opens a cached object for reading and marks it as recently used.
+        An object whose content doesn't match the key is removed.
+
+        Args:
+            key (str): the IPFS hash of the object.
+
+        Returns:
+            Optional[BinaryIO]: returns the open file, or None on a miss.
+
+        """
+        path = self.path(key)
+        if not path:
+            return None
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            valid = ipfs_key(f) == key
+            f.seek(0)
+        except OSError:
+            valid = False
+        if not valid:
+            f.close()
+            LOG.warning("Dropping cached {} not matching its key".format(key))
+            self.remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Reads a cached object.
+
+        Args:
+            key (str): the IPFS hash of the object.
+
+        Returns:
+            Optional[bytes]: returns the object, or None on a miss.
+
+        """
+        f = self.open(key)
+        if not f:
+            return None
+        with f:
+            return f.read()
+
+    def put(self, key: str, data: bytes):
+        """Stores an object.
+
+        Args:
+            key (str): the IPFS hash of the object.
+            data (bytes): the object.
+
+        """
+        with self.writer(key) as f:
+            if f:
+                f.write(data)
+
+    def remove(self, key: str):
+        """Removes a cached object, e.g. one which failed to decrypt.
+
+        Args:
+            key (str): the IPFS hash of the object.
+
+        """
+        path = self.path(key)
+        if path:
+            _remove(path)
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[Optional[BinaryIO]]:
+        """Opens a temporary file the object is written to. It replaces the
+        cached object when the block exits cleanly, and is discarded when it
+        raises. Failing to write the cache is logged and never raised.
+
+        Args:
+            key (str): the IPFS hash of the object.
+
+        Yields:
+            Optional[BinaryIO]: yields the file to write to, or None if the
+            key can't be cached.
+
+        """
+        path = self.path(key)
+        if not path:
+            yield None
+            return
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=_TMP_PREFIX, dir=os.path.dirname(path))
+            f = os.fdopen(fd, 'wb')
+        except OSError as e:
+            LOG.warning("Caching {} failed: {}".format(key, e))
+            yield None
+            return
+
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            _remove(tmp_path)
+            raise
+        try:
+            size = f.tell()
+            f.close()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            LOG.warning("Caching {} failed: {}".format(key, e))
+            _remove(tmp_path)
+            return
+        self._added(size)
+
+    def _private_directory(self) -> bool:
+        if self._private is None:
+            try:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                stat = os.stat(self.directory)
+                self._private = (stat.st_uid == os.getuid()
+                                 and not stat.st_mode & 0o077)
+            except OSError as e:
+                LOG.warning("Creating the IPFS cache {} failed: {}".format(
+                    self.directory, e))
+                self._private = False
+            else:
+                if not self._private:
+                    LOG.warning(
+                        "Not caching IPFS objects in {}, other users can "
+                        "access it".format(self.directory))
+        return self._private
+
+    def _added(self, size: int):
+        with self._lock:
+            if self._size is None:
+                total = sum(s for _, _, s in self._scan())
+            else:
+                total = self._size + size
+            self._size = total
+            if total > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        entries: List[Tuple[float, str, int]] = []
+        now = time.time()
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                files = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.startswith(_TMP_PREFIX):
+                    if now - stat.st_mtime > STALE_TMP_AGE:
+                        _remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._scan())
+        size = sum(s for _, _, s in entries)
+        target = self.max_bytes * IPFS_CACHE_LOW_WATER
+        for _, path, entry_size in entries:
+            if size <= target:
+                break
+            _remove(path)
+            size -= entry_size
+        self._size = size
+
+
+class PayloadCache:
+    """A bounded in-memory LRU cache of decrypted payloads keyed by the IPFS
+    hash and the fingerprint of the private key they were decrypted with, so
+    a payload is only ever returned to a caller holding the right key.
+
+    >>> cache = PayloadCache(max_bytes=8)
+    >>> cache.put("QmA", "k1", "1234")
+    >>> cache.put("QmB", "k1", "5678")
+    >>> (cache.get("QmA", "k1"), cache.get("QmA", "k2"))
+    ('1234', None)
+    >>> cache.put("QmC", "k1", "9")
+    >>> cache.get("QmB", "k1") is None
+    True
+
+    """
+
+    def __init__(self, max_bytes: int = IPFS_PAYLOAD_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, fingerprint: str) -> Optional[str]:
+        with self._lock:
+            payload = self._entries.get((key, fingerprint))
+            if payload is not None:
+                self._entries.move_to_end((key, fingerprint))
+            return payload
+
+    def put(self, key: str, fingerprint: str, payload: str):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((key, fingerprint), None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[(key, fingerprint)] = payload
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from hmt_escrow.eth_bridge import get_w3
+
+LOG = logging.getLogger("hmt_escrow.cache")
+
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", 4096))
+
+# Seconds the latest block number is trusted before asking the node again.
+STATE_CACHE_BLOCK_TTL = float(os.getenv("STATE_CACHE_BLOCK_TTL", 1))
+
+
+class StateCache:
+    """A bounded LRU cache of contract reads keyed by the escrow address, the
+    contract method and the block number. Reads are executed against that
+    exact block, so a cached value is never stale for the block it is stored
+    under. Entries of older blocks are dropped as soon as a new block is seen,
+    and the entries of an escrow are dropped when one of our own transactions
+    to it is mined.
+
+    The latest block number itself is cached for block_ttl seconds so that
+    a burst of reads costs a single eth_blockNumber.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> cache = StateCache(block_ttl=60)
+    >>> job = Job(credentials, manifest, cache=cache)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> job.status()
+    <Status.Launched: 1>
+    >>> cache.hits > 0
+    True
+
+    Our own transaction invalidates the cached status.
+    >>> job.setup()
+    True
+    >>> job.status()
+    <Status.Pending: 2>
+
+    The cache doesn't grow past its size.
+    >>> cache = StateCache(max_size=2, block_ttl=60)
+    >>> [cache.get("0x0", method, lambda block: method) for method in ("a", "b", "c")]
+    ['a', 'b', 'c']
+    >>> len(cache)
+    2
+
+    """
+
+    def __init__(self,
+                 max_size: int = STATE_CACHE_SIZE,
+                 block_ttl: float = STATE_CACHE_BLOCK_TTL):
+        self.max_size = max_size
+        self.block_ttl = block_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._block_number: Optional[int] = None
+        self._block_read_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def block_number(self) -> int:
+        """Returns the latest block number, read from the node at most once
+        every block_ttl seconds.
+
+        Returns:
+            int: returns the latest known block number.
+
+        """
+        with self._lock:
+            if (self._block_number is not None and
+                    time.monotonic() - self._block_read_at < self.block_ttl):
+                return self._block_number
+        block_number = get_w3().eth.blockNumber
+        self.observe(block_number)
+        return block_number
+
+    def observe(self, block_number: int):
+        """Records that a block has been mined, e.g. from a transaction
+        receipt, and drops the entries of older blocks.
+
+        Args:
+            block_number (int): the number of a mined block.
+
+        """
+        with self._lock:
+            self._block_read_at = time.monotonic()
+            if self._block_number is not None and block_number <= self._block_number:
+                return
+            self._block_number = block_number
+            stale = [key for key in self._entries if key[2] < block_number]
+            for key in stale:
+                del self._entries[key]
+
+    def get(self, address: str, method: str,
+            loader: Callable[[int], Any]) -> Any:
+        """Returns the result of a contract read at the latest block, calling
+        the loader only if it isn't cached yet.
+
+        Args:
+            address (str): the address of the contract being read.
+            method (str): the name of the contract method.
+            loader (Callable[[int], Any]): reads the value at a block number.
+
+        Returns:
+            Any: returns the value of the read at the latest block.
+
+        """
+        block_number = self.block_number()
+        key: Tuple[str, str, int] = (address, method, block_number)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = loader(block_number)
+        with self._lock:
+            if self._block_number is None or block_number >= self._block_number:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, address: str, block_number: Optional[int] = None):
+        """Drops the cached reads of a contract, e.g. after one of our own
+        transactions to it has been mined.
+
+        Args:
+            address (str): the address of the contract.
+            block_number (Optional[int]): the block the transaction was mined
+            in, so that later reads don't happen at an older block.
+
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == address]
+            for key in stale:
+                del self._entries[key]
+        if block_number is not None:
+            self.observe(block_number)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._block_number = None
+
+
+if __name__ == "__main__":
+    import doctest
+    from test_manifest import manifest
+    from job import Job
+    doctest.testmod()
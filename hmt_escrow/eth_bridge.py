@@ -1,17 +1,33 @@
+import hashlib
+import json
 import logging
 import os
+import tempfile
+import threading
 import time
+import requests
 
-from solc import compile_files
+from eth_abi import decode_abi
+from hexbytes import HexBytes
+from requests.adapters import HTTPAdapter
 from web3 import Web3, HTTPProvider, EthereumTesterProvider
 from web3.contract import Contract
+from web3.exceptions import BadFunctionCallOutput
 from web3.middleware import geth_poa_middleware
+from web3.utils.abi import get_abi_output_types, map_abi_data
+from web3.utils.contracts import find_matching_fn_abi
+from web3.utils.normalizers import BASE_RETURN_NORMALIZERS
+from hmt_escrow.gas import GAS_ESTIMATE, GasEstimator, Urgency, gas_price_strategy
 from hmt_escrow.kvstore_abi import abi as kvstore_abi
+from hmt_escrow.nonce import NonceManager, is_known_transaction, is_nonce_error
+from hmt_escrow.receipts import RECEIPT_GRACE, RECEIPT_TIMEOUT, PendingTransaction, ReceiptPoller
 from typing import Dict, List, Tuple, Optional, Any
 
 AttributeDict = Dict[str, Any]
 
 GAS_LIMIT = int(os.getenv("GAS_LIMIT", 4712388))
+HMT_ETH_POOL_SIZE = int(os.getenv("HMT_ETH_POOL_SIZE", 10))
+HMT_ETH_TIMEOUT = float(os.getenv("HMT_ETH_TIMEOUT", 10))
 
 LOG = logging.getLogger("hmt_escrow.eth_bridge")
 HMTOKEN_ADDR = Web3.toChecksumAddress(
@@ -19,13 +35,40 @@ HMTOKEN_ADDR = Web3.toChecksumAddress(
 
 CONTRACT_FOLDER = os.path.join(
     os.path.dirname(os.path.dirname(__file__)), 'contracts')
-CONTRACTS = compile_files([
-    "{}/Escrow.sol".format(CONTRACT_FOLDER),
-    "{}/EscrowFactory.sol".format(CONTRACT_FOLDER),
-    "{}/HMToken.sol".format(CONTRACT_FOLDER),
-    "{}/HMTokenInterface.sol".format(CONTRACT_FOLDER),
-    "{}/SafeMath.sol".format(CONTRACT_FOLDER)
-])
+CONTRACT_SOURCES = [
+    "CloneEscrowFactory.sol", "Escrow.sol", "EscrowCompact.sol",
+    "EscrowFactory.sol", "EscrowReader.sol", "HMToken.sol",
+    "HMTokenInterface.sol", "SafeMath.sol"
+]
+
+# Compiled ABI and bytecode of CONTRACT_SOURCES are shipped as a JSON artifact
+# so that importing this module doesn't require solc. The artifact records the
+# hash of the sources it was compiled from and is rebuilt when they change.
+ARTIFACTS_VERSION = 1
+ARTIFACTS_FILE = os.getenv(
+    "HMT_ARTIFACTS_FILE",
+    os.path.join(os.path.dirname(__file__), 'artifacts', 'contracts.json'))
+
+_CONTRACTS: Optional[Dict[str, Dict[str, Any]]] = None
+_CONTRACTS_LOCK = threading.Lock()
+
+# Factories deployed by deploy_factory create minimal proxy clones of a single
+# Escrow implementation instead of full Escrow contracts when enabled.
+CLONE_ESCROWS = os.getenv("HMT_CLONE_ESCROWS", "false").lower() == "true"
+ESCROW_IMPLEMENTATION_ADDR = os.getenv("ESCROW_IMPLEMENTATION_ADDR")
+
+# Storage layouts of escrow contracts. EscrowCompact stores the SHA-1 hashes
+# as bytes20 and packs its fields into fewer slots, it reports its layout
+# through getLayoutVersion, which the original Escrow doesn't have.
+ESCROW_LAYOUT_LEGACY = 1
+ESCROW_LAYOUT_COMPACT = 2
+COMPACT_ESCROWS = os.getenv("HMT_COMPACT_ESCROWS", "false").lower() == "true"
+
+_ESCROW_LAYOUTS: Dict[str, int] = {}
+
+# Substrings of node errors meaning an eth_call reverted, as opposed to the
+# node failing to run it.
+REVERT_ERRORS = ("revert", "invalid opcode")
 
 # See more details about the eth-kvstore here: https://github.com/hCaptcha/eth-kvstore
 KVSTORE_CONTRACT = Web3.toChecksumAddress(
@@ -33,23 +76,139 @@ KVSTORE_CONTRACT = Web3.toChecksumAddress(
               "0xbcF8274FAb0cbeD0099B2cAFe862035a6217Bf44"))
 
 
+class PooledHTTPProvider(HTTPProvider):
+    """An HTTPProvider sending its JSON-RPC requests through its own requests
+    session, which keeps a pool of keep-alive connections to the node.
+
+    Attributes:
+        session (requests.Session): the session shared by all requests.
+
+    """
+
+    def __init__(self,
+                 endpoint_uri: str,
+                 pool_size: int = HMT_ETH_POOL_SIZE,
+                 timeout: float = HMT_ETH_TIMEOUT):
+        super().__init__(endpoint_uri, request_kwargs={'timeout': timeout})
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, request_data: bytes) -> bytes:
+        response = self.session.post(
+            self.endpoint_uri, data=request_data, **self.get_request_kwargs())
+        response.raise_for_status()
+        return response.content
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s",
+                          self.endpoint_uri, method)
+        request_data = self.encode_rpc_request(method, params)
+        response = self.decode_rpc_response(self._post(request_data))
+        return response
+
+    def make_batch_request(
+            self, calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+        """Sends many JSON-RPC requests in a single HTTP round trip.
+
+        Args:
+            calls (List[Tuple[str, List[Any]]]): the method and params of every
+            request.
+
+        Returns:
+            List[Dict[str, Any]]: returns the raw JSON-RPC responses in the
+            order of the calls. Results are not formatted by the middlewares.
+
+        """
+        self.logger.debug("Making batch request HTTP. URI: %s, Requests: %s",
+                          self.endpoint_uri, len(calls))
+        request_data = json.dumps([{
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": i
+        } for i, (method, params) in enumerate(calls)]).encode('utf-8')
+        responses = json.loads(self._post(request_data).decode('utf-8'))
+        if not isinstance(responses, list):
+            raise ValueError(responses.get("error", responses))
+
+        by_id = {response.get("id"): response for response in responses}
+        return [
+            by_id.get(i, {"error": "No response to request {}".format(i)})
+            for i in range(len(calls))
+        ]
+
+
+_W3_REGISTRY: Dict[str, Web3] = {}
+_W3_LOCK = threading.Lock()
+
+NONCES = NonceManager()
+
+
+def batch_request(calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """Sends many JSON-RPC requests to the node, batched into one HTTP round
+    trip when the provider supports it.
+
+    >>> responses = batch_request([("eth_blockNumber", []), ("net_version", [])])
+    >>> len(responses)
+    2
+
+    Args:
+        calls (List[Tuple[str, List[Any]]]): the method and params of every
+        request.
+
+    Returns:
+        List[Dict[str, Any]]: returns the raw JSON-RPC responses in the order
+        of the calls.
+
+    """
+    provider = get_w3().provider
+    if isinstance(provider, PooledHTTPProvider):
+        return provider.make_batch_request(calls)
+    return [provider.make_request(method, params) for method, params in calls]
+
+
+RECEIPTS = ReceiptPoller(batch_request)
+
+GAS_ESTIMATES = GasEstimator()
+
+GAS_PRICES = gas_price_strategy(batch_request)
+
+
 def get_w3() -> Web3:
     """Set up the web3 provider for serving transactions to the ethereum network.
 
+    A single Web3 instance is shared per endpoint by the whole process, so
+    repeated calls reuse the same pooled HTTP connections.
+
     >>> w3 = get_w3()
     >>> type(w3)
     <class 'web3.main.Web3'>
+    >>> get_w3() is w3
+    True
 
     Returns:
         Web3: returns the web3 provider.
 
     """
     endpoint = os.getenv("HMT_ETH_SERVER", 'http://localhost:8545')
-    if not endpoint:
-        LOG.error("Using EthereumTesterProvider as we have no HMT_ETH_SERVER")
-    provider = HTTPProvider(endpoint) if endpoint else EthereumTesterProvider
-    w3 = Web3(provider)
-    w3.middleware_stack.inject(geth_poa_middleware, layer=0)
+    w3 = _W3_REGISTRY.get(endpoint)
+    if w3:
+        return w3
+
+    with _W3_LOCK:
+        w3 = _W3_REGISTRY.get(endpoint)
+        if not w3:
+            if not endpoint:
+                LOG.error(
+                    "Using EthereumTesterProvider as we have no HMT_ETH_SERVER"
+                )
+            provider = PooledHTTPProvider(
+                endpoint) if endpoint else EthereumTesterProvider
+            w3 = Web3(provider)
+            w3.middleware_stack.inject(geth_poa_middleware, layer=0)
+            _W3_REGISTRY[endpoint] = w3
     return w3
 
 
@@ -92,28 +251,338 @@ def handle_transaction(txn_func, *args, **kwargs) -> AttributeDict:
     Raises:
         TimeoutError: if waiting for the transaction receipt times out.
     """
-    gas_payer = kwargs["gas_payer"]
+    return submit_transaction(txn_func, *args,
+                              **kwargs).result(timeout=RECEIPT_GRACE)
+
+
+def submit_transaction(txn_func, *args, **kwargs) -> PendingTransaction:
+    """Sends a transaction and returns right away with a handle resolving to
+    its receipt. Receipts of all submitted transactions are collected by one
+    background poller, so many transactions can be in flight without a
+    blocked thread each.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> job = Job(credentials=credentials, escrow_manifest=manifest)
+    >>> txn_func = get_hmtoken().functions.transfer
+    >>> txn_info = {
+    ... "gas_payer": job.gas_payer,
+    ... "gas_payer_priv": job.gas_payer_priv,
+    ... "gas": 4712388
+    ... }
+    >>> pending = submit_transaction(txn_func, job.gas_payer, 1, **txn_info)
+    >>> pending.result().status
+    1
+
+    Args:
+        txn_func: the transaction function to be handled.
+        *args: all the arguments the function takes.
+        **kwargs: the transaction data used to complete the transaction.
+        Optionally "confirmations" and "timeout" to wait for the receipt,
+        the timeout defaults to RECEIPT_TIMEOUT.
+
+    Returns:
+        PendingTransaction: returns a handle resolving to the receipt. If the
+        transaction gets stuck, the poller replaces it with the same nonce and
+        a higher gas price, and the receipt is the one of the broadcast which
+        was mined.
+
+    """
+    txn_hash, txn_dict = _send_transaction(txn_func, *args, **kwargs)
     gas_payer_priv = kwargs["gas_payer_priv"]
-    gas = kwargs["gas"]
 
-    w3 = get_w3()
-    nonce = w3.eth.getTransactionCount(gas_payer)
+    def replace(gas_price: int) -> bytes:
+        return _send_signed(dict(txn_dict, gasPrice=gas_price), gas_payer_priv)
 
-    txn_dict = txn_func(*args).buildTransaction({
-        'from': gas_payer,
-        'gas': gas,
-        'nonce': nonce
-    })
+    return RECEIPTS.watch(
+        txn_hash,
+        confirmations=kwargs.get("confirmations"),
+        timeout=kwargs.get("timeout", RECEIPT_TIMEOUT),
+        gas_price=txn_dict['gasPrice'],
+        replace=replace)
+
+
+def send_transaction(txn_func, *args, **kwargs) -> bytes:
+    """Locally signs, builds and sends a transaction without waiting for it to
+    be mined. The nonce comes from the local NonceManager, so many transactions
+    of the same gas payer can be sent back-to-back and their receipts
+    collected later with wait_for_receipt.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> job = Job(credentials=credentials, escrow_manifest=manifest)
+    >>> hmtoken_contract = get_hmtoken()
+    >>> txn_func = hmtoken_contract.functions.transfer
+    >>> txn_info = {
+    ... "gas_payer": job.gas_payer,
+    ... "gas_payer_priv": job.gas_payer_priv,
+    ... "gas": 4712388
+    ... }
+    >>> txn_hashes = [send_transaction(txn_func, job.gas_payer, 1, **txn_info) for _ in range(3)]
+    >>> [wait_for_receipt(txn_hash).status for txn_hash in txn_hashes]
+    [1, 1, 1]
+
+    A transaction is sent with its "gas" as given. Without one, it is sent
+    with the gas estimate of its call from GAS_ESTIMATES capped by GAS_LIMIT,
+    or with GAS_LIMIT if GAS_ESTIMATE is disabled. Its gas price is the
+    optional "gas_price", or the price GAS_PRICES gives its optional
+    "urgency".
 
+    Args:
+        txn_func: the transaction function to be handled.
+        *args: all the arguments the function takes.
+        **kwargs: the transaction data used to complete the transaction.
+
+    Returns:
+        bytes: returns the transaction hash.
+
+    """
+    return _send_transaction(txn_func, *args, **kwargs)[0]
+
+
+def _send_transaction(txn_func, *args,
+                      **kwargs) -> Tuple[bytes, Dict[str, Any]]:
+    gas_payer = kwargs["gas_payer"]
+    gas_payer_priv = kwargs["gas_payer_priv"]
+    gas = kwargs.get("gas")
+    gas_price = kwargs.get("gas_price") or GAS_PRICES.price(
+        kwargs.get("urgency", Urgency.NORMAL))
+
+    w3 = get_w3()
+    if gas is None:
+        # The caller's gas is never lowered, only a missing one is estimated.
+        gas = GAS_ESTIMATES.estimate(w3, txn_func, args, gas_payer,
+                                     GAS_LIMIT) if GAS_ESTIMATE else GAS_LIMIT
+    resync_on_nonce_error = True
+    while True:
+        nonce = NONCES.allocate(w3, gas_payer)
+        try:
+            txn_dict = txn_func(*args).buildTransaction({
+                'from': gas_payer,
+                'gas': gas,
+                'gasPrice': gas_price,
+                'nonce': nonce
+            })
+            return _send_signed(txn_dict, gas_payer_priv), txn_dict
+        except ValueError as e:
+            NONCES.release(gas_payer, nonce)
+            if not (resync_on_nonce_error and is_nonce_error(e)):
+                raise e
+            LOG.info("Nonce {} of {} rejected, resyncing: {}".format(
+                nonce, gas_payer, e))
+            NONCES.resync(gas_payer)
+            resync_on_nonce_error = False
+        except Exception as e:
+            NONCES.release(gas_payer, nonce)
+            raise e
+
+
+def _send_signed(txn_dict: Dict[str, Any], gas_payer_priv: str) -> bytes:
+    w3 = get_w3()
     signed_txn = w3.eth.account.signTransaction(
         txn_dict, private_key=gas_payer_priv)
-    txn_hash = w3.eth.sendRawTransaction(signed_txn.rawTransaction)
-
     try:
-        txn_receipt = w3.eth.waitForTransactionReceipt(txn_hash, timeout=240)
-    except TimeoutError as e:
+        return w3.eth.sendRawTransaction(signed_txn.rawTransaction)
+    except ValueError as e:
+        if is_known_transaction(e):
+            return signed_txn.hash
         raise e
-    return txn_receipt
+
+
+def wait_for_receipt(txn_hash: bytes,
+                     timeout: float = RECEIPT_TIMEOUT) -> AttributeDict:
+    """Waits for a sent transaction to be mined.
+
+    Args:
+        txn_hash (bytes): the hash of the sent transaction.
+        timeout (float): seconds to wait for the transaction receipt,
+        RECEIPT_TIMEOUT by default.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeoutError: if waiting for the transaction receipt times out.
+
+    """
+    return RECEIPTS.watch(
+        txn_hash, timeout=timeout).result(timeout=RECEIPT_GRACE)
+
+
+def encode_call(contract: Contract, fn_name: str, *args) -> Dict[str, str]:
+    """Encode a call to a contract function as the "to" and "data" fields of a
+    transaction, e.g. to send it as a raw eth_call.
+
+    >>> escrow = get_escrow("0x1413862C2B7054CDbfdc181B83962CB0FC11fD92")
+    >>> encode_call(escrow, "getStatus")["data"]
+    '0x4e69d560'
+
+    Args:
+        contract (Contract): the contract being called.
+        fn_name (str): the name of the contract function.
+        *args: all the arguments the function takes.
+
+    Returns:
+        Dict[str, str]: returns the "to" and "data" fields of the call.
+
+    """
+    return {
+        'to': contract.address,
+        'data': contract.encodeABI(fn_name=fn_name, args=list(args))
+    }
+
+
+def decode_call(contract: Contract, fn_name: str, return_data: bytes,
+                *args) -> Any:
+    """Decode the data returned by a call to a contract function the same way
+    ContractFunction.call() does.
+
+    Args:
+        contract (Contract): the contract which was called.
+        fn_name (str): the name of the contract function.
+        return_data (bytes): the raw data returned by eth_call.
+        *args: all the arguments the function was called with.
+
+    Returns:
+        Any: returns the single output of the function or a list of outputs.
+
+    """
+    fn_abi = find_matching_fn_abi(contract.abi, fn_name, args, {})
+    output_types = get_abi_output_types(fn_abi)
+    output_data = decode_abi(output_types, HexBytes(return_data))
+    normalized_data = map_abi_data(BASE_RETURN_NORMALIZERS, output_types,
+                                   output_data)
+    if len(normalized_data) == 1:
+        return normalized_data[0]
+    return normalized_data
+
+
+def _sources_hash() -> Optional[str]:
+    """Hash the solidity sources the contract artifacts are compiled from.
+
+    Returns:
+        Optional[str]: returns the SHA-256 hex digest of all sources or None
+        if the sources are not available, e.g. in an installed package.
+
+    """
+    sha256 = hashlib.sha256()
+    for source in CONTRACT_SOURCES:
+        path = os.path.join(CONTRACT_FOLDER, source)
+        if not os.path.isfile(path):
+            return None
+        sha256.update(source.encode('utf-8'))
+        with open(path, 'rb') as f:
+            sha256.update(f.read())
+    return sha256.hexdigest()
+
+
+def _load_artifacts(
+        source_hash: Optional[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Load the compiled contracts from ARTIFACTS_FILE.
+
+    Args:
+        source_hash (Optional[str]): the hash of the current sources. None
+        skips the staleness check.
+
+    Returns:
+        Optional[Dict[str, Dict[str, Any]]]: returns the contract interfaces
+        keyed by "<source>:<contract>" or None if the artifact is missing,
+        of another format version or compiled from different sources.
+
+    """
+    try:
+        with open(ARTIFACTS_FILE) as f:
+            artifacts = json.load(f)
+    except (OSError, ValueError) as e:
+        LOG.debug("Unable to read contract artifacts: {}".format(e))
+        return None
+
+    if artifacts.get("version") != ARTIFACTS_VERSION:
+        return None
+    if source_hash and artifacts.get("source_hash") != source_hash:
+        LOG.info("Contract sources changed, contract artifacts are stale.")
+        return None
+    return artifacts["contracts"]
+
+
+def _compile_artifacts(
+        source_hash: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Compile the contract sources with solc and store them to ARTIFACTS_FILE.
+
+    Args:
+        source_hash (Optional[str]): the hash of the sources being compiled.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: returns the contract interfaces keyed by
+        "<source>:<contract>".
+
+    """
+    from solc import compile_files
+
+    if not source_hash:
+        raise FileNotFoundError(
+            "No contract artifacts found at {} and no sources to compile at {}"
+            .format(ARTIFACTS_FILE, CONTRACT_FOLDER))
+
+    compiled = compile_files(
+        [os.path.join(CONTRACT_FOLDER, source) for source in CONTRACT_SOURCES])
+    contracts = {
+        os.path.relpath(entrypoint, CONTRACT_FOLDER): {
+            'abi': interface['abi'],
+            'bin': interface['bin'],
+            'bin-runtime': interface['bin-runtime']
+        }
+        for entrypoint, interface in compiled.items()
+    }
+    artifacts = {
+        "version": ARTIFACTS_VERSION,
+        "source_hash": source_hash,
+        "contracts": contracts
+    }
+
+    # Write atomically as several workers may compile at the same time.
+    try:
+        artifacts_dir = os.path.dirname(ARTIFACTS_FILE)
+        os.makedirs(artifacts_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=artifacts_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(artifacts, f, sort_keys=True)
+        os.replace(tmp_path, ARTIFACTS_FILE)
+    except OSError as e:
+        LOG.warning("Unable to store contract artifacts: {}".format(e))
+    return contracts
+
+
+def get_contracts() -> Dict[str, Dict[str, Any]]:
+    """Retrieve the compiled contracts, loading them on first use.
+
+    The shipped artifact is used unless the sources it was compiled from
+    changed, in which case the contracts are compiled with solc and the
+    artifact is refreshed.
+
+    >>> contracts = get_contracts()
+    >>> 'abi' in contracts['Escrow.sol:Escrow']
+    True
+
+    Returns:
+        Dict[str, Dict[str, Any]]: returns the contract interfaces keyed by
+        "<source>:<contract>".
+
+    """
+    global _CONTRACTS
+    if _CONTRACTS is None:
+        with _CONTRACTS_LOCK:
+            if _CONTRACTS is None:
+                source_hash = _sources_hash()
+                contracts = _load_artifacts(source_hash)
+                if contracts is None:
+                    contracts = _compile_artifacts(source_hash)
+                _CONTRACTS = contracts
+    return _CONTRACTS
 
 
 def get_contract_interface(contract_entrypoint):
@@ -126,8 +595,10 @@ def get_contract_interface(contract_entrypoint):
         returns the contract interface containing the contract abi.
 
     """
-    compiled_sol = CONTRACTS
-    contract_interface = compiled_sol[contract_entrypoint]
+    entrypoint = contract_entrypoint
+    if entrypoint.startswith(CONTRACT_FOLDER):
+        entrypoint = os.path.relpath(entrypoint, CONTRACT_FOLDER)
+    contract_interface = get_contracts()[entrypoint]
     return contract_interface
 
 
@@ -149,7 +620,7 @@ def get_hmtoken(hmtoken_addr=HMTOKEN_ADDR) -> Contract:
     return contract
 
 
-def get_escrow(escrow_addr: str) -> Contract:
+def get_escrow(escrow_addr: str, layout: Optional[int] = None) -> Contract:
     """Retrieve the Escrow contract from a given address.
 
     >>> credentials = {
@@ -167,6 +638,8 @@ def get_escrow(escrow_addr: str) -> Contract:
 
     Args:
         escrow_addr (str): an ethereum address of the escrow contract.
+        layout (Optional[int]): the storage layout of the escrow, detected
+        with escrow_layout if None.
 
     Returns:
         Contract: returns the Escrow solidity contract.
@@ -174,14 +647,150 @@ def get_escrow(escrow_addr: str) -> Contract:
     """
 
     w3 = get_w3()
-    contract_interface = get_contract_interface(
-        '{}/Escrow.sol:Escrow'.format(CONTRACT_FOLDER))
+    if layout is None:
+        layout = escrow_layout(escrow_addr)
+    if layout == ESCROW_LAYOUT_COMPACT:
+        entrypoint = 'EscrowCompact.sol:EscrowCompact'
+    else:
+        entrypoint = 'Escrow.sol:Escrow'
+    contract_interface = get_contract_interface('{}/{}'.format(
+        CONTRACT_FOLDER, entrypoint))
     escrow = w3.eth.contract(
         address=escrow_addr, abi=contract_interface['abi'])
     return escrow
 
 
-def get_factory(factory_addr: Optional[str]) -> Contract:
+def is_revert(error: Exception) -> bool:
+    """Checks whether a node error means the call itself reverted.
+
+    >>> is_revert(ValueError({'code': -32000, 'message': 'VM Exception while processing transaction: revert'}))
+    True
+    >>> is_revert(ValueError({'code': -32000, 'message': 'header not found'}))
+    False
+
+    Args:
+        error (Exception): the error raised when calling a contract.
+
+    Returns:
+        bool: returns True if the call reverted.
+
+    """
+    message = str(error).lower()
+    return any(e in message for e in REVERT_ERRORS)
+
+
+def escrow_layout(escrow_addr: str) -> int:
+    """Detects the storage layout of an escrow contract. The layout of an
+    address never changes, so it is read from the network only once. Only a
+    revert or a call without return data means the original Escrow, any
+    other error is raised and the address is detected again next time.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job = Job(credentials, manifest)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> escrow_layout(job.job_contract.address)
+    1
+    >>> factory_addr = deploy_factory(compact=True, **credentials)
+    >>> job = Job(credentials, manifest, factory_addr)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> escrow_layout(job.job_contract.address)
+    2
+
+    Args:
+        escrow_addr (str): an ethereum address of the escrow contract.
+
+    Returns:
+        int: returns ESCROW_LAYOUT_COMPACT for an EscrowCompact and
+        ESCROW_LAYOUT_LEGACY otherwise.
+
+    Raises:
+        ValueError: if the node fails the call for another reason than a
+        revert.
+
+    """
+    cached = _ESCROW_LAYOUTS.get(escrow_addr)
+    if cached:
+        return cached
+
+    escrow = get_escrow(escrow_addr, ESCROW_LAYOUT_COMPACT)
+    layout: int
+    try:
+        layout = escrow.functions.getLayoutVersion().call()
+    except BadFunctionCallOutput:
+        # There is no code at the address, or the original Escrow reverted
+        # on the unknown selector without any return data.
+        layout = ESCROW_LAYOUT_LEGACY
+    except ValueError as e:
+        # Other errors may be transient, caching the legacy layout would
+        # misdecode a compact escrow for the rest of the process.
+        if not is_revert(e):
+            raise e
+        layout = ESCROW_LAYOUT_LEGACY
+    _ESCROW_LAYOUTS[escrow_addr] = layout
+    return layout
+
+
+def is_compact(escrow_contract: Contract) -> bool:
+    """Whether an escrow contract stores its hashes as bytes20.
+
+    Args:
+        escrow_contract (Contract): an escrow contract from get_escrow.
+
+    Returns:
+        bool: returns True for an EscrowCompact.
+
+    """
+    return any(
+        abi.get("name") == "getLayoutVersion" for abi in escrow_contract.abi)
+
+
+def encode_hash(escrow_contract: Contract, hash_: str) -> Any:
+    """Converts a hex SHA-1 hash to the hash argument of an escrow contract.
+
+    Args:
+        escrow_contract (Contract): an escrow contract from get_escrow.
+        hash_ (str): the hex SHA-1 hash returned by upload.
+
+    Returns:
+        Any: returns the digest bytes for an EscrowCompact and the hex
+        string otherwise.
+
+    """
+    if is_compact(escrow_contract):
+        return bytes.fromhex(hash_)
+    return hash_
+
+
+def decode_hash(value: Any) -> str:
+    """Converts a hash read from an escrow contract to a hex SHA-1 hash.
+
+    >>> decode_hash(bytes.fromhex("ab" * 20)) == "ab" * 20
+    True
+    >>> decode_hash(bytes(20))
+    ''
+    >>> decode_hash("fakehash")
+    'fakehash'
+
+    Args:
+        value (Any): the bytes20 of an EscrowCompact or the string of an
+        Escrow.
+
+    Returns:
+        str: returns the hex hash, empty if it hasn't been stored yet.
+
+    """
+    if isinstance(value, bytes):
+        return value.hex() if any(value) else ""
+    return value
+
+
+def get_factory(factory_addr: Optional[str], clones: bool = False) -> Contract:
     """Retrieve the EscrowFactory contract from a given address.
 
     >>> credentials = {
@@ -194,24 +803,96 @@ def get_factory(factory_addr: Optional[str]) -> Contract:
 
     Args:
         factory_addr (str): the ethereum address of the Escrow contract.
+        clones (bool): whether it is a CloneEscrowFactory. Both factories
+        share the EscrowFactory interface, the CloneEscrowFactory adds
+        getImplementation.
 
     Returns:
         Contract: returns the EscrowFactory solidity contract.
 
     """
     w3 = get_w3()
-    contract_interface = get_contract_interface(
-        '{}/EscrowFactory.sol:EscrowFactory'.format(CONTRACT_FOLDER))
+    entrypoint = 'CloneEscrowFactory.sol:CloneEscrowFactory' if clones else 'EscrowFactory.sol:EscrowFactory'
+    contract_interface = get_contract_interface('{}/{}'.format(
+        CONTRACT_FOLDER, entrypoint))
     escrow_factory = w3.eth.contract(
         address=factory_addr, abi=contract_interface['abi'])
     return escrow_factory
 
 
-def deploy_factory(gas: int = GAS_LIMIT, **credentials) -> str:
+def deploy_escrow_implementation(gas: int = GAS_LIMIT,
+                                 compact: bool = False,
+                                 **credentials) -> str:
+    """Deploy the Escrow contract which CloneEscrowFactory clones delegate to.
+    Its canceler is the zero address and it expires right away, so nobody can
+    set it up or destroy it, and it can't be initialized again.
+
+    Args:
+        gas (int): maximum amount of gas the caller is ready to pay.
+        compact (bool): deploy an EscrowCompact instead of an Escrow.
+
+    Returns:
+        str: returns the contract address of the implementation.
+
+    """
+    w3 = get_w3()
+    entrypoint = 'EscrowCompact.sol:EscrowCompact' if compact else 'Escrow.sol:Escrow'
+    contract_interface = get_contract_interface('{}/{}'.format(
+        CONTRACT_FOLDER, entrypoint))
+    escrow = w3.eth.contract(
+        abi=contract_interface['abi'], bytecode=contract_interface['bin'])
+
+    txn_func = escrow.constructor
+    func_args = [HMTOKEN_ADDR, "0x" + "0" * 40, 0]
+    txn_info = {
+        "gas_payer": credentials["gas_payer"],
+        "gas_payer_priv": credentials["gas_payer_priv"],
+        "gas": gas
+    }
+    txn_receipt = handle_transaction(txn_func, *func_args, **txn_info)
+    return txn_receipt['contractAddress']
+
+
+def deploy_factory(gas: int = GAS_LIMIT,
+                   clones: bool = CLONE_ESCROWS,
+                   implementation: Optional[str] = ESCROW_IMPLEMENTATION_ADDR,
+                   compact: bool = COMPACT_ESCROWS,
+                   **credentials) -> str:
     """Deploy an EscrowFactory solidity contract to the ethereum network.
 
+    A CloneEscrowFactory creates every escrow as a minimal proxy of a single
+    Escrow implementation, which costs far less gas than deploying the full
+    Escrow contract. Compact escrows are always cloned from an EscrowCompact
+    implementation.
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> factory_addr = deploy_factory(clones=True, **credentials)
+    >>> job = Job(credentials, manifest, factory_addr)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> job.setup()
+    True
+
+    Compact escrows take and return the same hex hashes.
+    >>> factory_addr = deploy_factory(compact=True, **credentials)
+    >>> job = Job(credentials, manifest, factory_addr)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> job.setup()
+    True
+    >>> job.snapshot().manifest_hash == job.manifest_hash
+    True
+
     Args:
         gas (int): maximum amount of gas the caller is ready to pay.
+        clones (bool): deploy a CloneEscrowFactory instead of an EscrowFactory.
+        implementation (Optional[str]): the Escrow implementation of a
+        CloneEscrowFactory, a new one is deployed if not given.
+        compact (bool): deploy a CloneEscrowFactory of EscrowCompact escrows,
+        whose setup, storeResults and bulkPayOut use less gas.
 
     Returns
         str: returns the contract address of the newly deployed factory.
@@ -221,13 +902,22 @@ def deploy_factory(gas: int = GAS_LIMIT, **credentials) -> str:
     gas_payer_priv = credentials["gas_payer_priv"]
 
     w3 = get_w3()
-    contract_interface = get_contract_interface(
-        '{}/EscrowFactory.sol:EscrowFactory'.format(CONTRACT_FOLDER))
+    if clones or compact:
+        if not implementation:
+            implementation = deploy_escrow_implementation(
+                gas, compact, **credentials)
+        contract_interface = get_contract_interface(
+            '{}/CloneEscrowFactory.sol:CloneEscrowFactory'.format(
+                CONTRACT_FOLDER))
+        func_args = [HMTOKEN_ADDR, Web3.toChecksumAddress(implementation)]
+    else:
+        contract_interface = get_contract_interface(
+            '{}/EscrowFactory.sol:EscrowFactory'.format(CONTRACT_FOLDER))
+        func_args = [HMTOKEN_ADDR]
     factory = w3.eth.contract(
         abi=contract_interface['abi'], bytecode=contract_interface['bin'])
 
     txn_func = factory.constructor
-    func_args = [HMTOKEN_ADDR]
     txn_info = {
         "gas_payer": gas_payer,
         "gas_payer_priv": gas_payer_priv,
@@ -0,0 +1,577 @@
+import logging
+import os
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from web3 import Web3
+from web3.utils.contracts import encode_abi
+
+LOG = logging.getLogger("hmt_escrow.gas")
+
+GAS_LIMIT = int(os.getenv("GAS_LIMIT", 4712388))
+
+# Transactions sent without gas are sent with their estimated gas when
+# enabled, capped by GAS_LIMIT, instead of always using GAS_LIMIT.
+GAS_ESTIMATE = os.getenv("GAS_ESTIMATE", "true").lower() == "true"
+
+# Comma separated functions whose gas depends on the contract state more than
+# on their calldata size, e.g. bulkPayOut and the token transfers pay new
+# recipients ~20k gas and existing ones ~5k, approve costs more for a new
+# allowance. They are estimated for every transaction, never cached.
+GAS_ESTIMATE_UNCACHED = [
+    fn_name for fn_name in os.getenv(
+        "GAS_ESTIMATE_UNCACHED",
+        "bulkPayOut,transfer,transferFrom,transferBulk,approve").split(",")
+    if fn_name
+]
+
+# Factor applied on top of an estimate, as the state may change between the
+# estimate and the transaction being mined.
+GAS_ESTIMATE_MARGIN = float(os.getenv("GAS_ESTIMATE_MARGIN", 1.25))
+
+# Seconds to wait for eth_estimateGas before falling back to learned values.
+GAS_ESTIMATE_TIMEOUT = float(os.getenv("GAS_ESTIMATE_TIMEOUT", 2))
+
+# Seconds a cached estimate is used before the node is asked again.
+GAS_ESTIMATE_TTL = float(os.getenv("GAS_ESTIMATE_TTL", 600))
+
+GAS_ESTIMATE_CACHE_SIZE = int(os.getenv("GAS_ESTIMATE_CACHE_SIZE", 1024))
+GAS_ESTIMATE_WORKERS = int(os.getenv("GAS_ESTIMATE_WORKERS", 4))
+
+_ESTIMATE_EXECUTOR = ThreadPoolExecutor(max_workers=GAS_ESTIMATE_WORKERS)
+
+# "percentile" prices transactions from the gas prices paid in recent blocks,
+# "fixed" always uses GAS_PRICE_GWEI. When set, GAS_PRICE_GWEI is also the
+# price of the percentile strategy until its first refresh, instead of the
+# node's eth_gasPrice.
+GAS_PRICE_STRATEGY = os.getenv("GAS_PRICE_STRATEGY", "percentile")
+GAS_PRICE_GWEI = float(os.getenv("GAS_PRICE_GWEI", 0))
+
+# Gas prices never exceed this, whatever recent blocks paid.
+GAS_PRICE_MAX_GWEI: float = float(os.getenv("GAS_PRICE_MAX_GWEI", 500))
+
+# Recent blocks sampled by the percentile strategy, and seconds their prices
+# are used before they are refreshed in the background. Nodes supporting
+# eth_feeHistory report the percentiles, others send the full blocks.
+GAS_PRICE_BLOCKS = int(os.getenv("GAS_PRICE_BLOCKS", 10))
+GAS_PRICE_TTL = float(os.getenv("GAS_PRICE_TTL", 15))
+
+GWEI: int = 10**9
+
+
+class Urgency(Enum):
+    """How quickly a transaction should be mined."""
+    LOW = 1
+    NORMAL = 2
+    HIGH = 3
+
+
+# Percentile of the gas prices paid in recent blocks used for every urgency.
+GAS_PRICE_PERCENTILES = {
+    Urgency.LOW: int(os.getenv("GAS_PRICE_PERCENTILE_LOW", 30)),
+    Urgency.NORMAL: int(os.getenv("GAS_PRICE_PERCENTILE_NORMAL", 60)),
+    Urgency.HIGH: int(os.getenv("GAS_PRICE_PERCENTILE_HIGH", 90)),
+}
+
+
+def percentile(prices: List[int], percent: float) -> int:
+    """Returns the nearest-rank percentile of sorted gas prices.
+
+    >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 60)
+    6
+    >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 100)
+    10
+    >>> percentile([7], 30)
+    7
+
+    Args:
+        prices (List[int]): the gas prices in ascending order.
+        percent (float): the percentile between 0 and 100.
+
+    Returns:
+        int: returns the gas price at the percentile.
+
+    """
+    rank = max(1, -(-len(prices) * percent // 100))
+    return prices[int(rank) - 1]
+
+
+def size_bucket(data_size: int) -> int:
+    """Groups calldata sizes into power of two buckets, so that calls whose
+    dynamic arguments are of a similar size share an estimate.
+
+    >>> [size_bucket(size) for size in (4, 68, 100, 3300, 4000)]
+    [3, 7, 7, 12, 12]
+
+    Args:
+        data_size (int): the size of the calldata in bytes.
+
+    Returns:
+        int: returns the bucket of the size.
+
+    """
+    return data_size.bit_length()
+
+
+class GasEstimator:
+    """Estimates the gas of contract transactions and caches the estimates
+    per contract bytecode, function and calldata size bucket. Escrows sharing
+    the same bytecode share their estimates, so the node is asked only once
+    per kind of call and size.
+
+    Cached estimates are scaled up linearly with the calldata size within a
+    bucket and only ever grow, as the first call of a function on a fresh
+    escrow writes new storage slots and costs the most. If the node doesn't
+    answer in time, the largest learned estimate of the function is used,
+    and the estimate still running in the background is learned for the
+    next transaction.
+
+    The cache key ignores the contract state, so a cached estimate is only
+    safe for functions costing the same or less on later calls. Functions
+    whose gas depends on the state, like the token transfers to new or
+    existing holders, must be in uncached. They are asked to the node every
+    time, and fall back to the caller's gas instead of a learned estimate
+    when the node doesn't answer in time.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job = Job(credentials, manifest)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> estimator = GasEstimator()
+    >>> txn_func = job.job_contract.functions.complete
+    >>> gas = estimator.estimate(get_w3(), txn_func, [], job.gas_payer)
+    >>> 21000 < gas < GAS_LIMIT
+    True
+
+    The second estimate of the same call comes from the cache.
+    >>> estimator.estimate(get_w3(), txn_func, [], job.gas_payer) == gas
+    True
+    >>> (estimator.hits, estimator.misses)
+    (1, 1)
+
+    Functions in uncached are estimated for every transaction.
+    >>> estimator = GasEstimator(uncached=["complete"])
+    >>> gas = estimator.estimate(get_w3(), txn_func, [], job.gas_payer)
+    >>> gas = estimator.estimate(get_w3(), txn_func, [], job.gas_payer)
+    >>> (estimator.hits, estimator.misses)
+    (0, 2)
+
+    """
+
+    def __init__(self,
+                 margin: float = GAS_ESTIMATE_MARGIN,
+                 timeout: float = GAS_ESTIMATE_TIMEOUT,
+                 ttl: float = GAS_ESTIMATE_TTL,
+                 max_size: int = GAS_ESTIMATE_CACHE_SIZE,
+                 uncached: List[str] = GAS_ESTIMATE_UNCACHED):
+        self.margin = margin
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_size = max_size
+        self.uncached = set(uncached)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._code_hashes: OrderedDict = OrderedDict()
+        # (code hash, function, bucket) -> (gas, calldata size, learned at)
+        self._estimates: OrderedDict = OrderedDict()
+
+    def estimate(self,
+                 w3: Web3,
+                 txn_func: Any,
+                 args: Any,
+                 gas_payer: str,
+                 gas: int = GAS_LIMIT) -> int:
+        """Returns the gas limit to send a contract transaction with.
+
+        Args:
+            w3 (Web3): the web3 instance used to talk to the node.
+            txn_func: the contract function of the transaction.
+            args: all the arguments the function takes.
+            gas_payer (str): the ethereum address sending the transaction.
+            gas (int): maximum amount of gas the caller is ready to pay.
+
+        Returns:
+            int: returns the estimate with its safety margin, capped by gas.
+            Returns gas itself for contract deployments and for calls the
+            node expects to fail, so they fail on chain the same way as
+            without the estimate.
+
+        """
+        contract_fn = txn_func(*args)
+        if not getattr(contract_fn, "address", None):
+            return gas
+        data_size = len(
+            Web3.toBytes(
+                hexstr=encode_abi(w3, contract_fn.abi, contract_fn.arguments,
+                                  contract_fn.selector)))
+
+        use_cache = contract_fn.fn_name not in self.uncached
+        if use_cache:
+            with self._lock:
+                code_hash = self._code_hashes.get(contract_fn.address)
+            estimate = self._lookup(code_hash, contract_fn.fn_name, data_size)
+            if estimate is not None:
+                return min(gas, estimate)
+
+        future = _ESTIMATE_EXECUTOR.submit(self._estimate, w3, contract_fn,
+                                           gas_payer, gas, data_size,
+                                           use_cache)
+        try:
+            estimate = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            learned = self.learned(contract_fn.address, contract_fn.fn_name,
+                                   data_size) if use_cache else None
+            LOG.info("Estimating {} timed out, using {} gas.".format(
+                contract_fn.fn_name, learned or gas))
+            return min(gas, learned or gas)
+        except ValueError as e:
+            LOG.info("Estimating {} failed, using {} gas: {}".format(
+                contract_fn.fn_name, gas, e))
+            return gas
+        return min(gas, estimate)
+
+    def learned(self, address: str, fn_name: str,
+                data_size: int) -> Optional[int]:
+        """Returns the largest estimate learned for a function of the bytecode
+        at an address in any size bucket, scaled to a calldata size.
+
+        Args:
+            address (str): the address of the contract.
+            fn_name (str): the name of the contract function.
+            data_size (int): the size of the calldata in bytes.
+
+        Returns:
+            Optional[int]: returns the gas with its safety margin, None if
+            nothing has been learned yet.
+
+        """
+        with self._lock:
+            code_hash = self._code_hashes.get(address)
+            learned = [
+                self._scale(gas, size, data_size)
+                for (code, fn, _), (gas, size, _) in self._estimates.items()
+                if code == code_hash and fn == fn_name
+            ]
+        return max(learned) if learned else None
+
+    def clear(self):
+        with self._lock:
+            self._code_hashes.clear()
+            self._estimates.clear()
+
+    def _scale(self, gas: int, size: int, data_size: int) -> int:
+        return int(gas * max(1.0, data_size / size) * self.margin)
+
+    def _lookup(self, code_hash: Optional[bytes], fn_name: str,
+                data_size: int) -> Optional[int]:
+        if code_hash is None:
+            return None
+        with self._lock:
+            entry = self._estimates.get((code_hash, fn_name,
+                                         size_bucket(data_size)))
+            if not entry or time.monotonic() - entry[2] > self.ttl:
+                return None
+            self.hits += 1
+        gas, size, _ = entry
+        return self._scale(gas, size, data_size)
+
+    def _code_hash(self, w3: Web3, address: str) -> bytes:
+        with self._lock:
+            code_hash = self._code_hashes.get(address)
+        if code_hash is None:
+            code_hash = Web3.sha3(w3.eth.getCode(address))
+            with self._lock:
+                self._code_hashes[address] = code_hash
+                while len(self._code_hashes) > self.max_size:
+                    self._code_hashes.popitem(last=False)
+        return code_hash
+
+    def _estimate(self, w3: Web3, contract_fn: Any, gas_payer: str, gas: int,
+                  data_size: int, use_cache: bool) -> int:
+        if not use_cache:
+            with self._lock:
+                self.misses += 1
+            gas_used = contract_fn.estimateGas({'from': gas_payer, 'gas': gas})
+            return int(gas_used * self.margin)
+
+        # Another escrow with the same bytecode may have been estimated.
+        code_hash = self._code_hash(w3, contract_fn.address)
+        cached = self._lookup(code_hash, contract_fn.fn_name, data_size)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        gas_used = contract_fn.estimateGas({'from': gas_payer, 'gas': gas})
+        key = (code_hash, contract_fn.fn_name, size_bucket(data_size))
+        with self._lock:
+            entry = self._estimates.get(key)
+            if entry and (self._scale(entry[0], entry[1], data_size) >
+                          self._scale(gas_used, data_size, data_size)):
+                gas_used, data_size = entry[0], entry[1]
+            self._estimates[key] = (gas_used, data_size, time.monotonic())
+            self._estimates.move_to_end(key)
+            while len(self._estimates) > self.max_size:
+                self._estimates.popitem(last=False)
+        return self._scale(gas_used, data_size, data_size)
+
+
+class GasPriceStrategy(ABC):
+    """Decides the gas price of transactions. Strategies are called on the
+    hot path of every transaction and must not block on the node there.
+    """
+
+    @abstractmethod
+    def price(self, urgency: Urgency = Urgency.NORMAL) -> int:
+        """Returns the gas price of a transaction in wei.
+
+        Args:
+            urgency (Urgency): how quickly the transaction should be mined.
+
+        Returns:
+            int: returns the gas price in wei.
+
+        """
+
+
+class FixedGasPrice(GasPriceStrategy):
+    """Prices every transaction the same, whatever its urgency.
+
+    >>> FixedGasPrice(2 * GWEI).price(Urgency.HIGH)
+    2000000000
+
+    """
+
+    def __init__(self, gas_price: int):
+        self.gas_price = gas_price
+
+    def price(self, urgency: Urgency = Urgency.NORMAL) -> int:
+        return self.gas_price
+
+
+class PercentileGasPrice(GasPriceStrategy):
+    """Prices transactions at a percentile of the gas prices paid in recent
+    blocks, a higher one for more urgent transactions. The prices are cached
+    and refreshed in a background thread once they are older than ttl
+    seconds. Nodes supporting eth_feeHistory return the percentiles of the
+    priority fees, which are added to the next base fee. With other nodes the
+    blocks are fetched with their transactions, only the ones mined since
+    the last refresh. The node's eth_gasPrice is used while the sampled
+    blocks have no transactions or only free ones.
+
+    Until the first refresh succeeds, transactions are priced by the fallback
+    strategy, or the node's eth_gasPrice without one. That eth_gasPrice is
+    cached for ttl seconds as well, so pricing never waits for the recent
+    blocks nor fails because they couldn't be fetched.
+
+    >>> prices = PercentileGasPrice(batch_request)
+    >>> low, high = prices.price(Urgency.LOW), prices.price(Urgency.HIGH)
+    >>> 0 < low <= high
+    True
+
+    >>> def unreachable(calls):
+    ...     raise ConnectionError("The node is unreachable")
+    >>> PercentileGasPrice(unreachable, fallback=FixedGasPrice(GWEI)).price()
+    1000000000
+
+    """
+
+    def __init__(self,
+                 batch: Callable[[List[Tuple[str, List[Any]]]], List[
+                     Dict[str, Any]]],
+                 blocks: int = GAS_PRICE_BLOCKS,
+                 ttl: float = GAS_PRICE_TTL,
+                 percentiles: Optional[Dict[Urgency, int]] = None,
+                 max_price: int = int(GAS_PRICE_MAX_GWEI * GWEI),
+                 fallback: Optional[GasPriceStrategy] = None):
+        self.batch = batch
+        self.blocks = blocks
+        self.ttl = ttl
+        self.percentiles = dict(percentiles or GAS_PRICE_PERCENTILES)
+        self.max_price = max_price
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._block_prices: OrderedDict = OrderedDict()
+        self._prices: List[int] = []
+        # Urgency -> price, when the node supports eth_feeHistory.
+        self._fee_prices: Dict[Urgency, int] = {}
+        self._fee_history = True
+        self._node_price: Optional[int] = None
+        self._node_price_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        # A failed refresh is retried only after ttl seconds as well.
+        self._attempted_at: Optional[float] = None
+        self._refreshing = False
+
+    def price(self, urgency: Urgency = Urgency.NORMAL) -> int:
+        with self._lock:
+            attempted_at = self._attempted_at
+            stale = not self._refreshing and (
+                attempted_at is None
+                or time.monotonic() - attempted_at > self.ttl)
+            if stale:
+                self._refreshing = True
+                self._attempted_at = time.monotonic()
+        if stale:
+            threading.Thread(
+                target=self._refresh_in_background, daemon=True).start()
+
+        with self._lock:
+            gas_price = 0
+            if self._fee_prices:
+                gas_price = self._fee_prices[urgency]
+            elif self._prices:
+                gas_price = percentile(self._prices, self.percentiles[urgency])
+            if not gas_price:
+                gas_price = self._node_price or 0
+        if not gas_price:
+            # Nothing fetched yet.
+            gas_price = self._fallback_price(urgency)
+        return min(gas_price, self.max_price)
+
+    def refresh(self):
+        """Fetches the gas price percentiles of recent blocks and the node's
+        gas price, in one batch request with eth_feeHistory, else in two.
+
+        Raises:
+            ValueError: if the node fails any of the requests.
+
+        """
+        calls: List[Tuple[str, List[Any]]] = [("eth_blockNumber", []),
+                                              ("eth_gasPrice", [])]
+        percents = sorted(set(self.percentiles.values()))
+        if self._fee_history:
+            calls.append(("eth_feeHistory",
+                          [hex(self.blocks), "latest", percents]))
+        head, node_price, *fee_history = self.batch(calls)
+        for response in (head, node_price):
+            if "error" in response:
+                raise ValueError(response["error"])
+
+        history = fee_history[0].get("result") if fee_history else None
+        if history and history.get("baseFeePerGas"):
+            # The last base fee is the one of the next block.
+            base_fee = int(history["baseFeePerGas"][-1], 16)
+            fee_prices = {}
+            for urgency, percent in self.percentiles.items():
+                index = percents.index(percent)
+                tips = sorted(
+                    int(rewards[index], 16)
+                    for rewards in history.get("reward", []) if rewards)
+                fee_prices[urgency] = base_fee + (percentile(tips, 50)
+                                                  if tips else 0)
+            with self._lock:
+                self._fee_prices = fee_prices
+                self._set_node_price(int(node_price["result"], 16))
+                self._refreshed_at = time.monotonic()
+            return
+        if fee_history:
+            LOG.info(
+                "eth_feeHistory failed, sampling blocks instead: {}".format(
+                    fee_history[0].get("error", history)))
+            self._fee_history = False
+
+        head_number = int(head["result"], 16)
+        with self._lock:
+            last_number = next(reversed(self._block_prices), -1)
+        numbers = range(
+            max(last_number + 1, head_number - self.blocks + 1, 0),
+            head_number + 1)
+        responses = self.batch([("eth_getBlockByNumber", [hex(n), True])
+                                for n in numbers]) if numbers else []
+
+        with self._lock:
+            for number, response in zip(numbers, responses):
+                block = response.get("result")
+                if not block:
+                    continue
+                self._block_prices[number] = [
+                    int(txn["gasPrice"], 16) for txn in block["transactions"]
+                ]
+            while len(self._block_prices) > self.blocks:
+                self._block_prices.popitem(last=False)
+            self._prices = sorted(
+                gas_price for block_prices in self._block_prices.values()
+                for gas_price in block_prices)
+            self._fee_prices = {}
+            self._set_node_price(int(node_price["result"], 16))
+            self._refreshed_at = time.monotonic()
+
+    def _set_node_price(self, node_price: int):
+        self._node_price = node_price
+        self._node_price_at = time.monotonic()
+
+    def _fallback_price(self, urgency: Urgency) -> int:
+        if self.fallback:
+            return self.fallback.price(urgency)
+        with self._lock:
+            node_price_at = self._node_price_at
+            if (node_price_at is not None
+                    and time.monotonic() - node_price_at <= self.ttl):
+                return self._node_price or 0
+        response, = self.batch([("eth_gasPrice", [])])
+        if "error" in response:
+            raise ValueError(response["error"])
+        with self._lock:
+            self._set_node_price(int(response["result"], 16))
+            return self._node_price or 0
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            LOG.warning("Refreshing gas prices failed: {}".format(e))
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+def gas_price_strategy(
+        batch: Callable[[List[Tuple[str, List[Any]]]], List[Dict[str, Any]]],
+        name: str = GAS_PRICE_STRATEGY) -> GasPriceStrategy:
+    """Creates the gas price strategy configured by GAS_PRICE_STRATEGY.
+
+    >>> type(gas_price_strategy(batch_request, "percentile"))
+    <class '__main__.PercentileGasPrice'>
+
+    Args:
+        batch (Callable): sends a batch of JSON-RPC requests to the node.
+        name (str): "percentile" or "fixed".
+
+    Returns:
+        GasPriceStrategy: returns the strategy.
+
+    Raises:
+        ValueError: if the strategy is unknown.
+
+    """
+    if name == "fixed":
+        if not GAS_PRICE_GWEI:
+            raise ValueError(
+                "The fixed gas price strategy needs GAS_PRICE_GWEI")
+        return FixedGasPrice(int(GAS_PRICE_GWEI * GWEI))
+    if name == "percentile":
+        fallback: Optional[GasPriceStrategy] = None
+        if GAS_PRICE_GWEI:
+            fallback = FixedGasPrice(int(GAS_PRICE_GWEI * GWEI))
+        return PercentileGasPrice(batch, fallback=fallback)
+    raise ValueError("Unknown gas price strategy: {}".format(name))
+
+
+if __name__ == "__main__":
+    import doctest
+    from test_manifest import manifest
+    from job import Job
+    from hmt_escrow.eth_bridge import get_w3, batch_request
+    doctest.testmod()
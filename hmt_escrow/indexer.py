@@ -0,0 +1,376 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from enum import Enum
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.utils.events import get_event_data
+
+from hmt_escrow.eth_bridge import get_w3, get_contract_interface, decode_hash, CONTRACT_FOLDER
+from hmt_escrow.job import Status
+
+LOG = logging.getLogger("hmt_escrow.indexer")
+
+INDEXER_DB = os.getenv("HMT_INDEXER_DB", "hmt_escrow_index.sqlite3")
+
+# Blocks scanned per eth_getLogs, halved whenever the node refuses a range.
+INDEXER_PAGE_SIZE = int(os.getenv("INDEXER_PAGE_SIZE", 5000))
+
+# Blocks behind the head which are not indexed yet, to stay clear of reorgs.
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", 0))
+
+# Escrow addresses filtered by one eth_getLogs, as nodes limit the request size.
+INDEXER_ADDRESS_BATCH = int(os.getenv("INDEXER_ADDRESS_BATCH", 1000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS factories (
+    address TEXT PRIMARY KEY,
+    last_block INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS escrows (
+    address TEXT PRIMARY KEY,
+    factory TEXT NOT NULL,
+    eip20 TEXT NOT NULL,
+    launched_block INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    manifest_url TEXT,
+    manifest_hash TEXT,
+    intermediate_url TEXT,
+    intermediate_hash TEXT,
+    updated_block INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS escrows_factory_status ON escrows (factory, status);
+"""
+
+
+class IndexedEscrow(NamedTuple):
+    """An escrow contract as known to the EscrowIndexer.
+
+    Attributes:
+        address (str): the address of the escrow contract.
+        factory (str): the address of the factory which launched it.
+        eip20 (str): the address of the token the escrow holds.
+        launched_block (int): the block the escrow was launched in.
+        status (Enum): the last known status of the escrow.
+        manifest_url (Optional[str]): the location of the manifest in IPFS.
+        manifest_hash (Optional[str]): SHA-1 hash of the serialized manifest.
+        intermediate_url (Optional[str]): the location of the intermediate results.
+        intermediate_hash (Optional[str]): SHA-1 hash of the intermediate results.
+        updated_block (int): the block of the last indexed change.
+
+    """
+    address: str
+    factory: str
+    eip20: str
+    launched_block: int
+    status: Enum
+    manifest_url: Optional[str]
+    manifest_hash: Optional[str]
+    intermediate_url: Optional[str]
+    intermediate_hash: Optional[str]
+    updated_block: int
+
+
+def _event_abi(contract_entrypoint: str, name: str) -> Dict[str, Any]:
+    contract_interface = get_contract_interface('{}/{}'.format(
+        CONTRACT_FOLDER, contract_entrypoint))
+    return next(abi for abi in contract_interface['abi']
+                if abi.get("type") == "event" and abi["name"] == name)
+
+
+class EscrowIndexer:
+    """Indexes the Launched events of escrow factories and the Pending and
+    IntermediateStorage events of their escrows into a SQLite database.
+    Logs are fetched in pages of block ranges and every page is committed
+    together with the last indexed block of its factory, so an interrupted
+    sync resumes where it stopped. Escrow events are requested only for the
+    addresses of the factory's escrows.
+
+    Only Launched and Pending are emitted as events, later statuses can be
+    read from the chain with refresh_statuses.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job = Job(credentials, manifest)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> launched_job = Job(credentials, manifest, job.factory_contract.address)
+    >>> launched_job.launch(rep_oracle_pub_key)
+    True
+    >>> job.setup()
+    True
+
+    >>> indexer = EscrowIndexer(":memory:")
+    >>> indexer.add_factory(job.factory_contract.address)
+    >>> indexer.sync() >= 3
+    True
+    >>> indexer.escrows(job.factory_contract.address, Status.Pending) == [job.job_contract.address]
+    True
+    >>> indexer.escrows(job.factory_contract.address, Status.Launched) == [launched_job.job_contract.address]
+    True
+    >>> indexer.escrow(job.job_contract.address).manifest_hash == job.manifest_hash
+    True
+
+    Syncing again only scans the new blocks.
+    >>> indexer.sync()
+    0
+
+    """
+
+    def __init__(self,
+                 db_path: str = INDEXER_DB,
+                 page_size: int = INDEXER_PAGE_SIZE,
+                 confirmations: int = INDEXER_CONFIRMATIONS):
+        self.page_size = page_size
+        self.confirmations = confirmations
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+        self._launched_abi = _event_abi("EscrowFactory.sol:EscrowFactory",
+                                        "Launched")
+        self._escrow_abis = {
+            Web3.toHex(event_abi_to_log_topic(abi)): abi
+            for entrypoint in ("Escrow.sol:Escrow",
+                               "EscrowCompact.sol:EscrowCompact")
+            for abi in (_event_abi(entrypoint, "Pending"),
+                        _event_abi(entrypoint, "IntermediateStorage"))
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add_factory(self, factory_addr: str, from_block: int = 0):
+        """Starts indexing the escrows of a factory.
+
+        Args:
+            factory_addr (str): the ethereum address of the factory.
+            from_block (int): the block the factory was deployed in, indexing
+            starts from there.
+
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO factories (address, last_block) VALUES (?, ?)",
+                (Web3.toChecksumAddress(factory_addr), from_block - 1))
+
+    def sync(self, to_block: Optional[int] = None) -> int:
+        """Indexes the logs of all factories up to a block.
+
+        Args:
+            to_block (Optional[int]): the last block to index, defaults to
+            the latest block minus the confirmations.
+
+        Returns:
+            int: returns the number of indexed events.
+
+        """
+        if to_block is None:
+            to_block = get_w3().eth.blockNumber - self.confirmations
+
+        with self._lock:
+            factories = self._db.execute(
+                "SELECT address, last_block FROM factories").fetchall()
+
+        indexed = 0
+        for factory_addr, last_block in factories:
+            from_block = last_block + 1
+            page_size = self.page_size
+            while from_block <= to_block:
+                page_end = min(from_block + page_size - 1, to_block)
+                try:
+                    indexed += self._index_range(factory_addr, from_block,
+                                                 page_end)
+                except ValueError as e:
+                    if page_size == 1:
+                        raise e
+                    page_size = max(1, page_size // 2)
+                    LOG.info("Fetching logs of {} blocks failed, retrying "
+                             "with {}: {}".format(page_end - from_block + 1,
+                                                  page_size, e))
+                    continue
+                from_block = page_end + 1
+        return indexed
+
+    def _index_range(self, factory_addr: str, from_block: int,
+                     to_block: int) -> int:
+        w3 = get_w3()
+        launched_logs = w3.eth.getLogs({
+            'fromBlock':
+            from_block,
+            'toBlock':
+            to_block,
+            'address':
+            factory_addr,
+            'topics': [Web3.toHex(event_abi_to_log_topic(self._launched_abi))]
+        })
+        launched = [(get_event_data(self._launched_abi, log), log)
+                    for log in launched_logs]
+
+        # Only the escrows of this factory are queried, the ones indexed
+        # before and the ones launched in this range.
+        with self._lock:
+            escrow_addrs = [
+                row[0] for row in self._db.execute(
+                    "SELECT address FROM escrows WHERE factory = ?", (
+                        factory_addr, ))
+            ]
+        escrow_addrs += [event.args.escrow for event, _ in launched]
+        escrow_logs: List[Dict[str, Any]] = []
+        for start in range(0, len(escrow_addrs), INDEXER_ADDRESS_BATCH):
+            batch = escrow_addrs[start:start + INDEXER_ADDRESS_BATCH]
+            escrow_logs += w3.eth.getLogs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': batch,
+                'topics': [list(self._escrow_abis)]
+            })
+
+        indexed = 0
+        with self._lock, self._db:
+            for event, log in launched:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO escrows (address, factory, eip20, "
+                    "launched_block, status, updated_block) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (event.args.escrow, factory_addr, event.args.eip20,
+                     log['blockNumber'], Status.Launched.name,
+                     log['blockNumber']))
+                indexed += 1
+
+            for log in sorted(
+                    escrow_logs,
+                    key=lambda log: (log['blockNumber'], log['logIndex'])):
+                event = get_event_data(
+                    self._escrow_abis[Web3.toHex(log['topics'][0])], log)
+                if event.event == "Pending":
+                    cursor = self._db.execute(
+                        "UPDATE escrows SET status = ?, manifest_url = ?, "
+                        "manifest_hash = ?, updated_block = ? "
+                        "WHERE address = ? AND factory = ? AND status = ?",
+                        (Status.Pending.name, event.args.manifest,
+                         decode_hash(event.args.hash), log['blockNumber'],
+                         event.address, factory_addr, Status.Launched.name))
+                else:
+                    cursor = self._db.execute(
+                        "UPDATE escrows SET intermediate_url = ?, "
+                        "intermediate_hash = ?, updated_block = ? "
+                        "WHERE address = ? AND factory = ?",
+                        (event.args._url, decode_hash(event.args._hash),
+                         log['blockNumber'], event.address, factory_addr))
+                indexed += cursor.rowcount
+
+            self._db.execute(
+                "UPDATE factories SET last_block = ? WHERE address = ?",
+                (to_block, factory_addr))
+        return indexed
+
+    def escrows(self,
+                factory_addr: Optional[str] = None,
+                status: Optional[Enum] = None) -> List[str]:
+        """Looks up the addresses of indexed escrows.
+
+        Args:
+            factory_addr (Optional[str]): only escrows of this factory.
+            status (Optional[Enum]): only escrows in this status.
+
+        Returns:
+            List[str]: returns the escrow addresses in the order they were
+            launched.
+
+        """
+        query = "SELECT address FROM escrows WHERE 1"
+        params: List[Any] = []
+        if factory_addr:
+            query += " AND factory = ?"
+            params.append(Web3.toChecksumAddress(factory_addr))
+        if status:
+            query += " AND status = ?"
+            params.append(status.name)
+        query += " ORDER BY launched_block, rowid"
+        with self._lock:
+            return [row[0] for row in self._db.execute(query, params)]
+
+    def escrow(self, escrow_addr: str) -> Optional[IndexedEscrow]:
+        """Looks up an indexed escrow.
+
+        Args:
+            escrow_addr (str): the ethereum address of the escrow.
+
+        Returns:
+            Optional[IndexedEscrow]: returns the escrow, None if it isn't
+            indexed.
+
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT address, factory, eip20, launched_block, status, "
+                "manifest_url, manifest_hash, intermediate_url, "
+                "intermediate_hash, updated_block FROM escrows "
+                "WHERE address = ?",
+                (Web3.toChecksumAddress(escrow_addr), )).fetchone()
+        if not row:
+            return None
+        return IndexedEscrow(
+            address=row[0],
+            factory=row[1],
+            eip20=row[2],
+            launched_block=row[3],
+            status=Status[row[4]],
+            manifest_url=row[5],
+            manifest_hash=row[6],
+            intermediate_url=row[7],
+            intermediate_hash=row[8],
+            updated_block=row[9])
+
+    def refresh_statuses(self, reader_addr: Optional[str] = None) -> int:
+        """Reads the current status of all escrows which haven't reached a
+        final status yet through the EscrowReader, as Partial, Paid, Complete
+        and Cancelled have no events.
+
+        Args:
+            reader_addr (Optional[str]): the ethereum address of the reader.
+
+        Returns:
+            int: returns the number of escrows whose status changed.
+
+        """
+        from hmt_escrow.reader import read_escrows
+
+        final = (Status.Complete.name, Status.Cancelled.name)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT address, status FROM escrows WHERE status NOT IN (?, ?)",
+                final).fetchall()
+        if not rows:
+            return 0
+
+        block_number = get_w3().eth.blockNumber
+        summaries = read_escrows([address for address, _ in rows], reader_addr)
+        changed = 0
+        with self._lock, self._db:
+            for (address, status), summary in zip(rows, summaries):
+                # Aborted escrows are destroyed and read as missing.
+                new_status = summary.status or Status.Cancelled
+                if new_status.name != status:
+                    self._db.execute(
+                        "UPDATE escrows SET status = ?, updated_block = ? "
+                        "WHERE address = ?",
+                        (new_status.name, block_number, address))
+                    changed += 1
+        return changed
+
+
+if __name__ == "__main__":
+    import doctest
+    from test_manifest import manifest
+    from job import Job
+    doctest.testmod()
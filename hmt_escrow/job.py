@@ -5,19 +5,40 @@ import logging
 
 from decimal import Decimal
 from enum import Enum
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, NamedTuple, Tuple, Optional
 
 from web3 import Web3
 from web3.contract import Contract
 from eth_keys import keys
 from eth_utils import decode_hex
 
-from hmt_escrow.eth_bridge import get_hmtoken, get_contract_interface, get_escrow, get_factory, deploy_factory, get_w3, handle_transaction
-from hmt_escrow.storage import download, upload
+from hmt_escrow.eth_bridge import CONTRACT_FOLDER, get_hmtoken, get_contract_interface, get_escrow, get_factory, deploy_factory, get_w3, handle_transaction, submit_transaction, batch_request, encode_call, decode_call, encode_hash, decode_hash, GAS_PRICES
+from hmt_escrow.storage import download, upload, upload_many
+from hmt_escrow.cache import StateCache
+from hmt_escrow.gas import GasPriceStrategy, Urgency
 from basemodels import Manifest
 
 GAS_LIMIT = int(os.getenv("GAS_LIMIT", 4712388))
 
+# HMToken.transferBulk accepts less than BULK_MAX_COUNT (100) recipients.
+BULK_MAX_RECIPIENTS = 99
+
+# Margin on top of the estimated gas of a payout chunk, as chunks are sized
+# from a sample and the state may change before they are mined.
+PAYOUT_GAS_HEADROOM = 1.2
+
+# Urgency of the transactions of every kind of Job call. Launching escrows
+# can wait for cheaper blocks, paying workers and cancelling should not.
+URGENCIES = {
+    "launch": Urgency.LOW,
+    "setup": Urgency.NORMAL,
+    "results": Urgency.NORMAL,
+    "payout": Urgency.HIGH,
+    "complete": Urgency.NORMAL,
+    "cancel": Urgency.HIGH,
+    "abort": Urgency.HIGH,
+}
+
 LOG = logging.getLogger("hmt_escrow.job")
 Status = Enum('Status', 'Launched Pending Partial Paid Complete Cancelled')
 
@@ -115,10 +136,12 @@ def manifest_hash(escrow_contract: Contract,
         str: returns the manifest hash of Job's escrow contract.
 
     """
-    return escrow_contract.functions.getManifestHash().call({
-        'from': gas_payer,
-        'gas': gas
-    })
+    return decode_hash(escrow_contract.functions.getManifestHash().call({
+        'from':
+        gas_payer,
+        'gas':
+        gas
+    }))
 
 
 def intermediate_url(escrow_contract: Contract,
@@ -157,12 +180,13 @@ def intermediate_hash(escrow_contract: Contract,
         str: returns the intermediate results hash of Job's escrow contract.
 
     """
-    return escrow_contract.functions.getIntermediateResultsHash().call({
-        'from':
-        gas_payer,
-        'gas':
-        gas
-    })
+    return decode_hash(
+        escrow_contract.functions.getIntermediateResultsHash().call({
+            'from':
+            gas_payer,
+            'gas':
+            gas
+        }))
 
 
 def launcher(escrow_contract: Contract, gas_payer: str,
@@ -184,6 +208,299 @@ def launcher(escrow_contract: Contract, gas_payer: str,
     })
 
 
+def launched_escrows(factory_contract: Contract,
+                     txn_receipt: Dict[str, Any]) -> List[str]:
+    """Returns the addresses of the escrows launched by a createEscrow or
+    createEscrows transaction from the Launched events in its receipt.
+
+    Args:
+        factory_contract (Contract): the factory which launched the escrows.
+        txn_receipt (Dict[str, Any]): the receipt of the transaction.
+
+    Returns:
+        List[str]: returns the addresses in the order they were launched.
+
+    """
+    return [
+        event.args.escrow for event in factory_contract.events.Launched().
+        processReceipt(txn_receipt)
+        if event.address == factory_contract.address
+    ]
+
+
+def launched_escrow(factory_contract: Contract,
+                    txn_receipt: Dict[str, Any]) -> str:
+    """Returns the address of the escrow launched by a createEscrow transaction
+    from the Launched event in its receipt. Unlike the factory's last escrow,
+    this stays correct when several escrows are launched in the same block.
+
+    Args:
+        factory_contract (Contract): the factory which launched the escrow.
+        txn_receipt (Dict[str, Any]): the receipt of the createEscrow transaction.
+
+    Returns:
+        str: returns the address of the launched escrow contract.
+
+    Raises:
+        ValueError: if the receipt has no Launched event of the factory.
+
+    """
+    escrows = launched_escrows(factory_contract, txn_receipt)
+    if not escrows:
+        raise ValueError("No escrow was launched by transaction {}".format(
+            Web3.toHex(txn_receipt["transactionHash"])))
+    return escrows[0]
+
+
+def escrows_per_transaction(factory_contract: Contract,
+                            gas_payer: str,
+                            gas: int = GAS_LIMIT) -> int:
+    """Estimates how many escrows a single createEscrows transaction can deploy
+    within a gas limit, from the gas of deploying one and two escrows.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> factory_contract = get_factory(deploy_factory(**credentials))
+    >>> count = escrows_per_transaction(factory_contract, credentials["gas_payer"])
+    >>> count >= 1 and count < escrows_per_transaction(factory_contract, credentials["gas_payer"], 4 * GAS_LIMIT)
+    True
+
+    Args:
+        factory_contract (Contract): the factory deploying the escrows.
+        gas_payer (str): an ethereum address paying for the gas costs.
+        gas (int): the gas limit of a single transaction.
+
+    Returns:
+        int: returns the number of escrows per transaction, at least one.
+
+    """
+    txn_func = factory_contract.functions.createEscrows
+    single = txn_func(1).estimateGas({'from': gas_payer})
+    try:
+        per_escrow = txn_func(2).estimateGas({'from': gas_payer}) - single
+    except ValueError:
+        # Two escrows don't fit into a block.
+        return 1
+    return max(1, 1 + (gas - single) // per_escrow)
+
+
+def _submit_escrow_batches(factory_contract: Contract, count: int, gas: int,
+                           **credentials) -> List[Tuple[int, Any]]:
+    """Sends the createEscrows transactions deploying count escrows, without
+    waiting for them to be mined.
+
+    Returns:
+        List[Tuple[int, Any]]: returns the number of escrows of every
+        transaction and its PendingTransaction, or the exception raised when
+        sending it.
+
+    """
+    batch_size = escrows_per_transaction(factory_contract,
+                                         credentials["gas_payer"], gas)
+    txn_info = {
+        "gas_payer": credentials["gas_payer"],
+        "gas_payer_priv": credentials["gas_payer_priv"],
+        "gas": gas,
+        "urgency": URGENCIES["launch"]
+    }
+    batches: List[Tuple[int, Any]] = []
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        pending: Any
+        try:
+            pending = submit_transaction(
+                factory_contract.functions.createEscrows, size, **txn_info)
+        except Exception as e:
+            pending = e
+        batches.append((size, pending))
+    return batches
+
+
+def _batch_escrows(factory_contract: Contract, size: int,
+                   pending: Any) -> List[str]:
+    if isinstance(pending, Exception):
+        raise pending
+    escrows = launched_escrows(factory_contract, pending.result())
+    if len(escrows) != size:
+        raise ValueError("Expected {} escrows to be launched, got {}".format(
+            size, len(escrows)))
+    return escrows
+
+
+def create_escrows(factory_addr: str,
+                   count: int,
+                   gas: int = GAS_LIMIT,
+                   **credentials) -> List[str]:
+    """Deploys many escrows with as few transactions as the gas limit allows,
+    sent back-to-back, and returns their addresses from the Launched events.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> factory_addr = deploy_factory(**credentials)
+    >>> escrows = create_escrows(factory_addr, 5, **credentials)
+    >>> len(set(escrows))
+    5
+    >>> get_factory(factory_addr).functions.getLastEscrow().call() == escrows[-1]
+    True
+
+    Args:
+        factory_addr (str): an ethereum address of the escrow factory contract.
+        count (int): the number of escrows to deploy.
+        gas (int): the gas limit of every transaction.
+        **credentials: an unpacked dict of an ethereum address and its private key.
+
+    Returns:
+        List[str]: returns the addresses of the new escrows.
+
+    Raises:
+        TimeoutError: if waiting for a transaction times out.
+        ValueError: if a transaction didn't launch its escrows.
+
+    """
+    factory_contract = get_factory(Web3.toChecksumAddress(factory_addr))
+    escrows: List[str] = []
+    for size, pending in _submit_escrow_batches(factory_contract, count, gas,
+                                                **credentials):
+        escrows += _batch_escrows(factory_contract, size, pending)
+    return escrows
+
+
+class PayoutChunk(NamedTuple):
+    """The outcome of one bulkPayOut transaction of a chunked payout.
+
+    Attributes:
+        tx_id (int): the _txId the chunk was paid with.
+        payouts (List[Tuple[str, Decimal]]): the addresses and amounts paid.
+        txn_hash (Optional[str]): the hash of the transaction, which is the
+        hash of its replacement if that one was mined, None if it couldn't be
+        sent.
+        gas_used (Optional[int]): the gas used by the mined transaction.
+        success (bool): whether every recipient and the oracles were paid.
+        error (Optional[Exception]): why the chunk failed, if it raised.
+        sent (bool): whether the chunk was sent. Chunks after a failed one
+        are not, and can be retried with the same tx_id.
+
+    """
+    tx_id: int
+    payouts: List[Tuple[str, Decimal]]
+    txn_hash: Optional[str]
+    gas_used: Optional[int]
+    success: bool
+    error: Optional[Exception]
+    sent: bool
+
+
+class EscrowState(NamedTuple):
+    """An immutable snapshot of an escrow contract's state.
+
+    Attributes:
+        address (str): the address of the escrow contract.
+        block_number (int): the latest block when the snapshot was taken.
+        status (Enum): the status of the escrow.
+        balance (int): the balance of the escrow in HMT.
+        manifest_url (str): the location of the manifest in IPFS.
+        manifest_hash (str): SHA-1 hash of the serialized manifest.
+        intermediate_url (str): the location of the intermediate results.
+        intermediate_hash (str): SHA-1 hash of the intermediate results.
+        final_results_url (str): the location of the final results.
+        launcher (str): the address which launched the escrow.
+        bulk_paid (bool): whether the last bulk payout succeeded.
+
+    """
+    address: str
+    block_number: int
+    status: Enum
+    balance: int
+    manifest_url: str
+    manifest_hash: str
+    intermediate_url: str
+    intermediate_hash: str
+    final_results_url: str
+    launcher: str
+    bulk_paid: bool
+
+
+# The EscrowState fields read by snapshot() and the Escrow getters they map to.
+SNAPSHOT_CALLS = [
+    ("status", "getStatus"),
+    ("balance", "getBalance"),
+    ("manifest_url", "getManifestUrl"),
+    ("manifest_hash", "getManifestHash"),
+    ("intermediate_url", "getIntermediateResultsUrl"),
+    ("intermediate_hash", "getIntermediateResultsHash"),
+    ("final_results_url", "getFinalResultsUrl"),
+    ("launcher", "getLauncher"),
+    ("bulk_paid", "getBulkPaid"),
+]
+
+
+def snapshot(escrow_addr: str,
+             gas_payer: Optional[str] = None,
+             gas: int = GAS_LIMIT) -> EscrowState:
+    """Reads the whole state of an escrow contract with a single JSON-RPC batch
+    request instead of one round trip per getter.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job = Job(credentials, manifest)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> job.setup()
+    True
+    >>> state = snapshot(job.job_contract.address)
+    >>> state.status
+    <Status.Pending: 2>
+    >>> state.manifest_hash == job.manifest_hash
+    True
+    >>> state.balance
+    100000000000000000000
+
+    Args:
+        escrow_addr (str): an ethereum address of the escrow contract.
+        gas_payer (Optional[str]): an ethereum address calling the contract.
+        gas (int): maximum amount of gas the caller is ready to pay.
+
+    Returns:
+        EscrowState: returns the state of the escrow contract.
+
+    Raises:
+        ValueError: if the node fails any of the calls.
+
+    """
+    escrow_contract = get_escrow(escrow_addr)
+    calls: List[Tuple[str, List[Any]]] = [("eth_blockNumber", [])]
+    for _, fn_name in SNAPSHOT_CALLS:
+        txn = encode_call(escrow_contract, fn_name)
+        txn['gas'] = hex(gas)
+        if gas_payer:
+            txn['from'] = gas_payer
+        calls.append(("eth_call", [txn, "latest"]))
+
+    responses = batch_request(calls)
+    for response in responses:
+        if "error" in response:
+            raise ValueError(response["error"])
+
+    state = {
+        field: decode_call(escrow_contract, fn_name, response["result"])
+        for (field, fn_name), response in zip(SNAPSHOT_CALLS, responses[1:])
+    }
+    state["status"] = Status(state["status"] + 1)
+    state["manifest_hash"] = decode_hash(state["manifest_hash"])
+    state["intermediate_hash"] = decode_hash(state["intermediate_hash"])
+    return EscrowState(
+        address=escrow_contract.address,
+        block_number=int(responses[0]["result"], 16),
+        **state)
+
+
 class Job:
     """A class used to represent a given Job launched on the HUMAN network.
     A Job  can be created from a manifest or by accessing an existing escrow contract
@@ -204,6 +521,11 @@ class Job:
         amount (Decimal): an amount to be stored in the escrow contract.
         manifest_url (str): the location of the serialized manifest in IPFS.
         manifest_hash (str): SHA-1 hashed version of the serialized manifest.
+        cache (Optional[StateCache]): caches contract reads per block if given.
+        gas_prices (Optional[GasPriceStrategy]): prices the Job's transactions,
+        defaults to the strategy configured by GAS_PRICE_STRATEGY.
+        urgencies (Dict[str, Urgency]): the urgency of every kind of the Job's
+        transactions, see URGENCIES.
 
     """
 
@@ -211,7 +533,9 @@ class Job:
                  credentials: Dict[str, str],
                  escrow_manifest: Manifest = None,
                  factory_addr: str = None,
-                 escrow_addr: str = None):
+                 escrow_addr: str = None,
+                 cache: Optional[StateCache] = None,
+                 gas_prices: Optional[GasPriceStrategy] = None):
         """Initializes a Job instance with values from a Manifest class and
         checks that the provided credentials are valid. An optional factory
         address is used to initialize the factory of the Job. Alternatively
@@ -279,6 +603,10 @@ class Job:
             manifest (Manifest): an instance of the Manifest class.
             credentials (Dict[str, str]): an ethereum address and its private key.
             factory_addr (str): an ethereum address of the factory.
+            escrow_addr (str): an ethereum address of an existing escrow.
+            cache (Optional[StateCache]): an optional cache of contract reads.
+            gas_prices (Optional[GasPriceStrategy]): an optional gas price
+            strategy for the Job's transactions.
 
         Raises:
             ValueError: if the credentials are not valid.
@@ -291,6 +619,9 @@ class Job:
 
         self.gas_payer = Web3.toChecksumAddress(credentials["gas_payer"])
         self.gas_payer_priv = credentials["gas_payer_priv"]
+        self.cache = cache
+        self.gas_prices = gas_prices
+        self.urgencies = dict(URGENCIES)
 
         # Initialize a new Job.
         if not escrow_addr and escrow_manifest:
@@ -339,8 +670,7 @@ class Job:
             raise AttributeError("The escrow has been already deployed.")
 
         # Use factory to deploy a new escrow contract.
-        self._create_escrow()
-        job_addr = self._last_escrow_addr()
+        job_addr = self._create_escrow()
         LOG.info("Job's escrow contract deployed to:{}".format(job_addr))
         self.job_contract = get_escrow(job_addr)
 
@@ -350,7 +680,7 @@ class Job:
         self.manifest_hash = hash_
         return self.status() == Status.Launched and self.balance() == 0
 
-    def setup(self, gas: int = GAS_LIMIT) -> bool:
+    def setup(self, gas: Optional[int] = None) -> bool:
         """Sets the escrow contract to be ready to receive answers from the Recording Oracle.
         The contract needs to be deployed and funded first.
 
@@ -396,22 +726,27 @@ class Job:
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("setup")
         }
-        handle_transaction(txn_func, *func_args, **txn_info)
+        txn_receipt = handle_transaction(txn_func, *func_args, **txn_info)
+        self._invalidate(txn_receipt)
 
         # Setup the escrow contract with manifest and IPFS data.
         txn_func = self.job_contract.functions.setup
         func_args = [
             reputation_oracle, recording_oracle, reputation_oracle_stake,
-            recording_oracle_stake, self.manifest_url, self.manifest_hash
+            recording_oracle_stake, self.manifest_url,
+            encode_hash(self.job_contract, self.manifest_hash)
         ]
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("setup")
         }
-        handle_transaction(txn_func, *func_args, **txn_info)
+        txn_receipt = handle_transaction(txn_func, *func_args, **txn_info)
+        self._invalidate(txn_receipt)
         return self.status() == Status.Pending and self.balance() == hmt_amount
 
     def bulk_payout(self,
@@ -466,22 +801,160 @@ class Job:
             bool: returns True if paying to ethereum addresses and oracles succeeds.
 
         """
-        (hash_, url) = upload(results, pub_key)
-        eth_addrs = [eth_addr for eth_addr, amount in payouts]
-        hmt_amounts = [int(amount * 10**18) for eth_addr, amount in payouts]
+        chunks = self.bulk_payout_chunks(payouts, results, pub_key, gas)
+        return all(chunk.success for chunk in chunks)
+
+    def bulk_payout_chunks(self,
+                           payouts: List[Tuple[str, Decimal]],
+                           results: Dict,
+                           pub_key: bytes,
+                           gas: int = GAS_LIMIT,
+                           tx_id: int = 1) -> List[PayoutChunk]:
+        """Performs a payout split into chunks which fit the gas limit of a
+        transaction and the recipient limit of HMToken.transferBulk. The chunk
+        size is derived from the estimated gas of a sample chunk. Chunks are
+        sent with consecutive _txIds, each once the previous one was paid, so
+        that a failure leaves the escrow paid up to the failed chunk.
 
-        txn_func = self.job_contract.functions.bulkPayOut
-        func_args = [eth_addrs, hmt_amounts, url, hash_, 1]
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
-        }
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> job.setup()
+        True
+        >>> payouts = [("0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809", Decimal('0.25'))] * 250
+        >>> chunks = job.bulk_payout_chunks(payouts, {}, rep_oracle_pub_key, tx_id=10)
+        >>> len(chunks) >= 3
+        True
+        >>> all(chunk.success for chunk in chunks)
+        True
+        >>> sum(len(chunk.payouts) for chunk in chunks)
+        250
+        >>> [chunk.tx_id for chunk in chunks][:3]
+        [10, 11, 12]
+        >>> job.balance()
+        37500000000000000000
 
-        handle_transaction(txn_func, *func_args, **txn_info)
-        return self._bulk_paid() == True
+        Nothing is sent after a failed chunk, here one exceeding the balance.
+        >>> payouts = [("0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809", Decimal('1'))] * 150
+        >>> chunks = job.bulk_payout_chunks(payouts, {}, rep_oracle_pub_key, tx_id=20)
+        >>> chunks[0].success
+        False
+        >>> any(chunk.sent for chunk in chunks[1:])
+        False
 
-    def abort(self, gas: int = GAS_LIMIT) -> bool:
+        Args:
+            payouts (List[Tuple[str, int]]): a list of tuples with ethereum addresses and amounts.
+            results (Dict): the final answer results stored by the Reputation Oracle.
+            pub_key (bytes): the public key of the Reputation Oracle.
+            gas (int): the gas limit of a single transaction.
+            tx_id (int): the _txId of the first chunk.
+
+        Returns:
+            List[PayoutChunk]: returns the outcome of every chunk, the ones
+            after the first failed chunk are not sent.
+
+        """
+        (hash_, url) = upload(results, pub_key)
+        hash_ = encode_hash(self.job_contract, hash_)
+        txn_func = self.job_contract.functions.bulkPayOut
+
+        def chunk_args(chunk, chunk_tx_id):
+            eth_addrs = [eth_addr for eth_addr, amount in chunk]
+            hmt_amounts = [int(amount * 10**18) for eth_addr, amount in chunk]
+            return [eth_addrs, hmt_amounts, url, hash_, chunk_tx_id]
+
+        # Estimate the gas of one recipient and of a full sample chunk, the
+        # difference gives the gas per recipient.
+        chunk_size = BULK_MAX_RECIPIENTS
+        base = per_recipient = 0.0
+        estimated = False
+        sample = payouts[:BULK_MAX_RECIPIENTS]
+        try:
+            single = txn_func(*chunk_args(sample[:1], tx_id)).estimateGas({
+                'from':
+                self.gas_payer
+            })
+            if len(sample) > 1:
+                full = txn_func(*chunk_args(sample, tx_id)).estimateGas({
+                    'from':
+                    self.gas_payer
+                })
+                per_recipient = (full - single) / (len(sample) - 1)
+            base = single - per_recipient
+            estimated = True
+        except ValueError as e:
+            # The payout would revert, send it as is to report the failure.
+            LOG.warning(
+                "Estimating the payout gas failed because of: {}".format(e))
+        if per_recipient:
+            chunk_size = int(
+                (gas / PAYOUT_GAS_HEADROOM - base) // per_recipient)
+            chunk_size = max(1, min(BULK_MAX_RECIPIENTS, chunk_size))
+
+        chunks = [
+            payouts[i:i + chunk_size]
+            for i in range(0, len(payouts), chunk_size)
+        ] or [[]]
+        token = get_w3().eth.contract(
+            abi=get_contract_interface('{}/HMToken.sol:HMToken'.format(
+                CONTRACT_FOLDER))['abi'])
+        report: List[PayoutChunk] = []
+        for i, chunk in enumerate(chunks):
+            chunk_tx_id = tx_id + i
+            if report and not report[-1].success:
+                report.append(
+                    PayoutChunk(chunk_tx_id, chunk, None, None, False, None,
+                                False))
+                continue
+
+            # Sent as is, the estimator never lowers a given gas.
+            chunk_gas = gas
+            if estimated:
+                chunk_gas = min(
+                    gas,
+                    int((base + per_recipient * len(chunk)) *
+                        PAYOUT_GAS_HEADROOM))
+            txn_info = {
+                "gas_payer": self.gas_payer,
+                "gas_payer_priv": self.gas_payer_priv,
+                "gas": chunk_gas,
+                "gas_price": self._gas_price("payout")
+            }
+            try:
+                pending_txn = submit_transaction(
+                    txn_func, *chunk_args(chunk, chunk_tx_id), **txn_info)
+            except Exception as e:
+                report.append(
+                    PayoutChunk(chunk_tx_id, chunk, None, None, False, e,
+                                False))
+                continue
+            txn_hash = pending_txn.txn_hash.hex()
+            try:
+                txn_receipt = pending_txn.result()
+            except Exception as e:
+                report.append(
+                    PayoutChunk(chunk_tx_id, chunk, txn_hash, None, False, e,
+                                True))
+                continue
+            self._invalidate(txn_receipt)
+            success = txn_receipt.status == 1 and any(
+                event.args._txId == chunk_tx_id
+                and event.args._bulkCount == len(chunk)
+                for event in token.events.BulkTransfer().processReceipt(
+                    txn_receipt))
+            # A replacement of a stuck chunk may have been mined instead.
+            report.append(
+                PayoutChunk(chunk_tx_id, chunk,
+                            Web3.toHex(txn_receipt.transactionHash),
+                            txn_receipt.gasUsed, success, None, True))
+        return report
+
+    def abort(self, gas: Optional[int] = None) -> bool:
         """Kills the contract and returns the HMT back to the gas payer.
         The contract cannot be aborted if the contract is in Partial, Paid or Complete state.
 
@@ -531,17 +1004,19 @@ class Job:
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("abort")
         }
 
-        handle_transaction(txn_func, *[], **txn_info)
+        txn_receipt = handle_transaction(txn_func, *[], **txn_info)
+        self._invalidate(txn_receipt)
 
         # After abort the contract should be destroyed
         w3 = get_w3()
         contract_code = w3.eth.getCode(self.job_contract.address)
         return contract_code == b"\x00"
 
-    def cancel(self, gas: int = GAS_LIMIT) -> bool:
+    def cancel(self, gas: Optional[int] = None) -> bool:
         """Returns the HMT back to the gas payer. It's the softer version of abort as the contract is not destroyed.
 
         >>> credentials = {
@@ -594,16 +1069,18 @@ class Job:
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("cancel")
         }
 
-        handle_transaction(txn_func, *[], **txn_info)
+        txn_receipt = handle_transaction(txn_func, *[], **txn_info)
+        self._invalidate(txn_receipt)
         return self.status() == Status.Cancelled
 
     def store_intermediate_results(self,
                                    results: Dict,
                                    pub_key: bytes,
-                                   gas: int = GAS_LIMIT) -> bool:
+                                   gas: Optional[int] = None) -> bool:
         """Recording Oracle stores intermediate results with Reputation Oracle's public key to IPFS
         and updates the contract's state.
 
@@ -636,17 +1113,19 @@ class Job:
         """
         (hash_, url) = upload(results, pub_key)
         txn_func = self.job_contract.functions.storeResults
-        func_args = [url, hash_]
+        func_args = [url, encode_hash(self.job_contract, hash_)]
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("results")
         }
 
-        handle_transaction(txn_func, *func_args, **txn_info)
+        txn_receipt = handle_transaction(txn_func, *func_args, **txn_info)
+        self._invalidate(txn_receipt)
         return True
 
-    def complete(self, gas: int = GAS_LIMIT) -> bool:
+    def complete(self, gas: Optional[int] = None) -> bool:
         """Completes the Job if it has been paid.
 
         >>> credentials = {
@@ -686,10 +1165,12 @@ class Job:
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("complete")
         }
 
-        handle_transaction(txn_func, *[], **txn_info)
+        txn_receipt = handle_transaction(txn_func, *[], **txn_info)
+        self._invalidate(txn_receipt)
         return self.status() == Status.Complete
 
     def status(self, gas: int = GAS_LIMIT) -> Enum:
@@ -712,7 +1193,7 @@ class Job:
             Enum: returns the status as an enumeration.
 
         """
-        return status(self.job_contract, self.gas_payer)
+        return Status(self._call("getStatus", gas) + 1)
 
     def balance(self, gas: int = GAS_LIMIT) -> int:
         """Retrieve the balance of a Job in HMT.
@@ -739,12 +1220,31 @@ class Job:
             int: returns the balance of the contract in HMT.
 
         """
-        return self.job_contract.functions.getBalance().call({
-            'from':
-            self.gas_payer,
-            'gas':
-            gas
-        })
+        return self._call("getBalance", gas)
+
+    def snapshot(self, gas: int = GAS_LIMIT) -> EscrowState:
+        """Reads the whole state of the Job's escrow contract in one round trip.
+
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> state = job.snapshot()
+        >>> (state.status, state.balance, state.bulk_paid)
+        (<Status.Launched: 1>, 0, False)
+
+        Args:
+            gas (int): maximum amount of gas the caller is ready to pay.
+
+        Returns:
+            EscrowState: returns the state of the escrow contract.
+
+        """
+        return snapshot(self.job_contract.address, self.gas_payer, gas)
 
     def manifest(self, priv_key: bytes) -> Dict:
         """Retrieves the initial manifest used to setup a Job.
@@ -805,8 +1305,7 @@ class Job:
             bool: returns True if IPFS download with the private key succeeds.
 
         """
-        intermediate_results_url = intermediate_url(self.job_contract,
-                                                    self.gas_payer)
+        intermediate_results_url = self._call("getIntermediateResultsUrl", gas)
         return download(intermediate_results_url, priv_key)
 
     def final_results(self, priv_key: bytes, gas: int = GAS_LIMIT) -> Dict:
@@ -838,11 +1337,7 @@ class Job:
             bool: returns True if IPFS download with the private key succeeds.
 
         """
-        final_results_url = self.job_contract.functions.getFinalResultsUrl(
-        ).call({
-            'from': self.gas_payer,
-            'gas': gas
-        })
+        final_results_url = self._call("getFinalResultsUrl", gas)
         return download(final_results_url, priv_key)
 
     def _access_job(self, factory_addr: str, escrow_addr: str, **credentials):
@@ -860,8 +1355,9 @@ class Job:
 
         self.factory_contract = get_factory(factory_addr)
         self.job_contract = get_escrow(escrow_addr)
-        self.manifest_url = manifest_url(self.job_contract, gas_payer)
-        self.manifest_hash = manifest_hash(self.job_contract, gas_payer)
+        state = snapshot(escrow_addr, gas_payer)
+        self.manifest_url = state.manifest_url
+        self.manifest_hash = state.manifest_hash
 
         manifest_dict = self.manifest(rep_oracle_priv_key)
         escrow_manifest = Manifest(manifest_dict)
@@ -994,7 +1490,10 @@ class Job:
         factory = None
 
         if not factory_addr_valid:
-            factory_addr = deploy_factory(GAS_LIMIT, **credentials)
+            factory_addr = deploy_factory(
+                GAS_LIMIT,
+                gas_payer=credentials["gas_payer"],
+                gas_payer_priv=credentials["gas_payer_priv"])
             factory = get_factory(factory_addr)
             if not factory_addr:
                 raise Exception("Unable to get address from factory")
@@ -1035,12 +1534,65 @@ class Job:
             returns True if the last bulk payout has succeeded.
 
         """
-        return self.job_contract.functions.getBulkPaid().call({
-            'from':
-            self.gas_payer,
-            'gas':
-            gas
-        })
+        return self._call("getBulkPaid", gas)
+
+    def _call(self, fn_name: str, gas: int = GAS_LIMIT) -> Any:
+        """Calls a getter of the Job's escrow contract, through the Job's cache
+        if it has one.
+
+        Args:
+            fn_name (str): the name of the escrow contract getter.
+            gas (int): maximum amount of gas the caller is ready to pay.
+
+        Returns:
+            Any: returns the value returned by the getter.
+
+        """
+        txn_func = getattr(self.job_contract.functions, fn_name)
+
+        def call(block_identifier='latest'):
+            return txn_func().call({
+                'from': self.gas_payer,
+                'gas': gas
+            }, block_identifier)
+
+        if not self.cache:
+            return call()
+        return self.cache.get(self.job_contract.address, fn_name, call)
+
+    def _gas_price(self, kind: str) -> int:
+        """Prices a transaction of the Job by its urgency.
+
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> from hmt_escrow.gas import FixedGasPrice
+        >>> job = Job(credentials, manifest, gas_prices=FixedGasPrice(10**9))
+        >>> job._gas_price("payout")
+        1000000000
+
+        Args:
+            kind (str): the kind of transaction, a key of URGENCIES.
+
+        Returns:
+            int: returns the gas price in wei.
+
+        """
+        gas_prices = self.gas_prices or GAS_PRICES
+        return gas_prices.price(self.urgencies.get(kind, Urgency.NORMAL))
+
+    def _invalidate(self, txn_receipt: Dict[str, Any]):
+        """Drops the cached reads of the Job's escrow contract after one of its
+        transactions has been mined.
+
+        Args:
+            txn_receipt (Dict[str, Any]): the receipt of the mined transaction.
+
+        """
+        if self.cache:
+            self.cache.invalidate(self.job_contract.address,
+                                  txn_receipt["blockNumber"])
 
     def _last_escrow_addr(self, gas: int = GAS_LIMIT) -> str:
         """Gets the last deployed escrow contract address of the initialized factory contract.
@@ -1071,7 +1623,7 @@ class Job:
             gas
         })
 
-    def _create_escrow(self, gas: int = GAS_LIMIT) -> bool:
+    def _create_escrow(self, gas: Optional[int] = None) -> str:
         """Launches a new escrow contract to the ethereum network.
 
         >>> credentials = {
@@ -1079,28 +1631,157 @@ class Job:
         ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
         ... }
         >>> job = Job(credentials, manifest)
-        >>> job._create_escrow()
+        >>> escrow_addr = job._create_escrow()
+        >>> job.factory_contract.functions.hasEscrow(escrow_addr).call()
         True
 
         Args:
-            gas (int): maximum amount of gas the caller is ready to pay.
+            gas (Optional[int]): the gas limit of the transaction, estimated
+            if None.
 
         Returns:
-            bool: returns True if a new job was successfully launched to the network.
+            str: returns the address of the new escrow contract.
 
         Raises:
             TimeoutError: if wait_on_transaction times out.
+            ValueError: if the factory didn't launch an escrow.
 
         """
         txn_func = self.factory_contract.functions.createEscrow
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
-            "gas": gas
+            "gas": gas,
+            "gas_price": self._gas_price("launch")
         }
 
-        handle_transaction(txn_func, *[], **txn_info)
-        return True
+        txn_receipt = handle_transaction(txn_func, *[], **txn_info)
+        return launched_escrow(self.factory_contract, txn_receipt)
+
+
+class LaunchResult(NamedTuple):
+    """The outcome of launching one Job with launch_many.
+
+    Attributes:
+        job (Optional[Job]): the Job, None if it couldn't be created.
+        error (Optional[Exception]): why launching failed, None on success.
+        A Job whose escrow was created but whose manifest upload or launch
+        check failed is returned together with the error.
+
+    """
+    job: Optional[Job]
+    error: Optional[Exception]
+
+
+def launch_many(credentials: Dict[str, str],
+                manifests: List[Manifest],
+                pub_key: bytes,
+                factory_addr: Optional[str] = None,
+                gas: int = GAS_LIMIT) -> List[LaunchResult]:
+    """Launches many Jobs at once. The escrows are deployed by as few
+    createEscrows transactions as the gas limit allows, sent back-to-back
+    without waiting for each other to be mined, the manifests are uploaded to
+    IPFS in parallel meanwhile, and the escrow addresses are taken from the
+    Launched events of the receipts.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> results = launch_many(credentials, [manifest] * 3, rep_oracle_pub_key)
+    >>> [result.error for result in results]
+    [None, None, None]
+    >>> len({result.job.job_contract.address for result in results})
+    3
+    >>> results[0].job.status()
+    <Status.Launched: 1>
+    >>> results[0].job.setup()
+    True
+
+    Args:
+        credentials (Dict[str, str]): an ethereum address and its private key.
+        manifests (List[Manifest]): the manifests of the Jobs.
+        pub_key (bytes): the public key of the Reputation Oracle.
+        factory_addr (Optional[str]): an ethereum address of the factory,
+        a new factory is deployed if not given.
+        gas (int): maximum amount of gas the caller is ready to pay per
+        transaction.
+
+    Returns:
+        List[LaunchResult]: returns the outcome of every Job in the order of
+        the manifests. Like Job.launch, a Job whose escrow isn't Launched and
+        empty is returned with an error.
+
+    """
+    if factory_addr:
+        factory_addr = Web3.toChecksumAddress(factory_addr)
+    else:
+        factory_addr = deploy_factory(
+            gas,
+            gas_payer=credentials["gas_payer"],
+            gas_payer_priv=credentials["gas_payer_priv"])
+
+    results: List[LaunchResult] = []
+    for escrow_manifest in manifests:
+        try:
+            results.append(
+                LaunchResult(
+                    Job(credentials, escrow_manifest, factory_addr), None))
+        except Exception as e:
+            results.append(LaunchResult(None, e))
+
+    jobs = {i: job for i, (job, error) in enumerate(results) if job}
+    indices = sorted(jobs)
+    if not indices:
+        return results
+    uploads = dict(
+        zip(
+            indices,
+            upload_many(
+                [(jobs[i].serialized_manifest, pub_key) for i in indices])))
+
+    factory_contract = get_factory(factory_addr)
+    try:
+        batches = _submit_escrow_batches(factory_contract, len(indices), gas,
+                                         **credentials)
+    except Exception as e:
+        batches = [(len(indices), e)]
+
+    start = 0
+    for size, pending in batches:
+        batch = indices[start:start + size]
+        start += size
+        try:
+            escrows = _batch_escrows(factory_contract, size, pending)
+        except Exception as e:
+            LOG.warning("Launching {} jobs failed because of: {}".format(
+                size, e))
+            for i in batch:
+                results[i] = LaunchResult(jobs[i], e)
+            continue
+
+        for i, job_addr in zip(batch, escrows):
+            job = jobs[i]
+            LOG.info("Job's escrow contract deployed to:{}".format(job_addr))
+            job.job_contract = get_escrow(job_addr)
+            try:
+                job.manifest_hash, job.manifest_url = uploads[i].result()
+            except Exception as e:
+                LOG.warning("Uploading the manifest of job {} failed because "
+                            "of: {}".format(i, e))
+                results[i] = LaunchResult(job, e)
+                continue
+            try:
+                if not (job.status() == Status.Launched
+                        and job.balance() == 0):
+                    raise ValueError(
+                        "Escrow {} is not launched and empty".format(job_addr))
+            except Exception as e:
+                LOG.warning("Launching job {} failed because of: {}".format(
+                    i, e))
+                results[i] = LaunchResult(job, e)
+    return results
 
 
 if __name__ == "__main__":
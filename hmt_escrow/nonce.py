@@ -0,0 +1,142 @@
+import logging
+import threading
+
+from typing import Dict
+from web3 import Web3
+
+LOG = logging.getLogger("hmt_escrow.nonce")
+
+# Substrings of node errors meaning the nonce of a transaction is already
+# taken or not the one the node expects.
+NONCE_ERRORS = ("nonce too low", "correct nonce", "replacement transaction",
+                "nonce is too low")
+
+# Substrings of node errors meaning the exact transaction is already known.
+KNOWN_TRANSACTION_ERRORS = ("known transaction", "already known")
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """Checks whether a node error was caused by a wrong nonce.
+
+    >>> is_nonce_error(ValueError({'code': -32000, 'message': 'nonce too low'}))
+    True
+    >>> is_nonce_error(ValueError({'code': -32000, 'message': 'out of gas'}))
+    False
+
+    Args:
+        error (Exception): the error raised when sending a transaction.
+
+    Returns:
+        bool: returns True if the error was caused by a wrong nonce.
+
+    """
+    message = str(error).lower()
+    return any(e in message for e in NONCE_ERRORS)
+
+
+def is_known_transaction(error: Exception) -> bool:
+    """Checks whether a node error means the transaction was already sent.
+
+    >>> is_known_transaction(ValueError({'code': -32000, 'message': 'known transaction: 0x00'}))
+    True
+
+    Args:
+        error (Exception): the error raised when sending a transaction.
+
+    Returns:
+        bool: returns True if the node already has the transaction.
+
+    """
+    message = str(error).lower()
+    return any(e in message for e in KNOWN_TRANSACTION_ERRORS)
+
+
+class NonceManager:
+    """Allocates transaction nonces locally for every gas payer, so that
+    transactions can be sent back-to-back without waiting for the previous
+    one to be mined. The nonce is read from the node only on first use and
+    after a resync, and allocation is serialized per address so threads
+    sharing a gas payer never get the same nonce.
+
+    >>> w3 = get_w3()
+    >>> nonces = NonceManager()
+    >>> gas_payer = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+    >>> nonce = nonces.allocate(w3, gas_payer)
+    >>> nonces.allocate(w3, gas_payer) == nonce + 1
+    True
+
+    A nonce which was never sent is handed out again.
+    >>> nonces.release(gas_payer, nonce + 1)
+    >>> nonces.allocate(w3, gas_payer) == nonce + 1
+    True
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._address_locks: Dict[str, threading.Lock] = {}
+        self._next_nonce: Dict[str, int] = {}
+
+    def _address_lock(self, address: str) -> threading.Lock:
+        with self._lock:
+            lock = self._address_locks.get(address)
+            if not lock:
+                lock = self._address_locks[address] = threading.Lock()
+            return lock
+
+    def allocate(self, w3: Web3, address: str) -> int:
+        """Allocates the next nonce of an address.
+
+        Args:
+            w3 (Web3): the web3 instance used to read the nonce from the node.
+            address (str): an ethereum address sending a transaction.
+
+        Returns:
+            int: returns a nonce no other caller has been given.
+
+        """
+        address = Web3.toChecksumAddress(address)
+        with self._address_lock(address):
+            nonce = self._next_nonce.get(address)
+            if nonce is None:
+                nonce = w3.eth.getTransactionCount(address, 'pending')
+            self._next_nonce[address] = nonce + 1
+            return nonce
+
+    def release(self, address: str, nonce: int):
+        """Gives back a nonce whose transaction was never sent. If later nonces
+        were handed out in the meantime the sequence now has a gap, and the
+        address is resynced from the node on its next allocation.
+
+        Args:
+            address (str): the ethereum address the nonce was allocated for.
+            nonce (int): the unused nonce.
+
+        """
+        address = Web3.toChecksumAddress(address)
+        with self._address_lock(address):
+            next_nonce = self._next_nonce.get(address)
+            if next_nonce == nonce + 1:
+                self._next_nonce[address] = nonce
+            elif next_nonce is not None:
+                LOG.info("Nonce gap at {} for {}, resyncing.".format(
+                    nonce, address))
+                del self._next_nonce[address]
+
+    def resync(self, address: str):
+        """Forgets the local nonce of an address so the next allocation reads
+        it from the node again.
+
+        Args:
+            address (str): the ethereum address to resync.
+
+        """
+        address = Web3.toChecksumAddress(address)
+        with self._address_lock(address):
+            self._next_nonce.pop(address, None)
+
+
+if __name__ == "__main__":
+    import doctest
+    from hmt_escrow.eth_bridge import get_w3
+    doctest.testmod()
@@ -0,0 +1,322 @@
+import logging
+import os
+import threading
+import time
+
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from web3 import Web3
+
+from hmt_escrow.eth_bridge import GAS_PRICES, NONCES, RECEIPTS, batch_request, get_w3, submit_transaction
+from hmt_escrow.gas import Urgency
+from hmt_escrow.receipts import RECEIPT_GRACE, PendingTransaction
+
+LOG = logging.getLogger("hmt_escrow.payers")
+
+# Lanes holding less ether than the minimum are topped up to the target by
+# the funder of the pool, and are only used when every lane is low.
+GAS_PAYER_MIN_BALANCE = Decimal(os.getenv("GAS_PAYER_MIN_BALANCE", "0.1"))
+GAS_PAYER_TARGET_BALANCE = Decimal(
+    os.getenv("GAS_PAYER_TARGET_BALANCE", "0.5"))
+
+# Seconds the balances of the lanes are trusted before reading them again.
+GAS_PAYER_BALANCE_TTL = float(os.getenv("GAS_PAYER_BALANCE_TTL", 30))
+
+# Gas of a plain ether transfer.
+TRANSFER_GAS = 21000
+
+
+class GasPayerLane:
+    """One funded account of a GasPayerPool. Its nonces are allocated by the
+    shared NonceManager, which keeps an independent sequence per address, so
+    the transactions of different lanes never wait for each other.
+
+    Attributes:
+        gas_payer (str): the ethereum address of the lane.
+        gas_payer_priv (str): the private key of the address.
+        in_flight (int): transactions submitted through the pool and not
+        mined yet.
+        jobs (int): jobs bound to the lane.
+        balance (Optional[int]): the last known balance in wei.
+
+    """
+
+    def __init__(self, gas_payer: str, gas_payer_priv: str):
+        self.gas_payer = Web3.toChecksumAddress(gas_payer)
+        self.gas_payer_priv = gas_payer_priv
+        self.in_flight = 0
+        self.jobs = 0
+        self.balance: Optional[int] = None
+
+    @property
+    def credentials(self) -> Dict[str, str]:
+        return {
+            "gas_payer": self.gas_payer,
+            "gas_payer_priv": self.gas_payer_priv
+        }
+
+    def __repr__(self):
+        return "<GasPayerLane {} in_flight={} jobs={}>".format(
+            self.gas_payer, self.in_flight, self.jobs)
+
+
+class GasPayerPool:
+    """Spreads transactions over many funded gas payers, so that throughput
+    grows with the number of accounts instead of being capped by the nonce
+    sequence of one. Transactions go to the least loaded lane, and a Job is
+    bound to a single lane for its whole life by creating it with the
+    credentials of assign().
+
+    When a funder is given, lanes running low on ether are topped up from it
+    in the background whenever the balances, refreshed every balance_ttl
+    seconds, show a lane below the minimum.
+
+    >>> from eth_account import Account
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> account = Account.create()
+    >>> lane = {"gas_payer": account.address, "gas_payer_priv": account.privateKey.hex()[2:]}
+    >>> pool = GasPayerPool([credentials, lane], funder=credentials)
+
+    The new lane has no ether and gets topped up.
+    >>> pool.rebalance()
+    1
+    >>> pool.balances()[account.address] == Web3.toWei(GAS_PAYER_TARGET_BALANCE, 'ether')
+    True
+
+    Jobs are spread over both lanes.
+    >>> [pool.assign()["gas_payer"] for _ in range(2)] == [credentials["gas_payer"], account.address]
+    True
+
+    >>> txn_func = get_hmtoken().functions.approve
+    >>> pool.submit(txn_func, account.address, 1, gas=100000).result().status
+    1
+
+    """
+
+    def __init__(self,
+                 credentials: List[Dict[str, str]],
+                 funder: Optional[Dict[str, str]] = None,
+                 min_balance: Decimal = GAS_PAYER_MIN_BALANCE,
+                 target_balance: Decimal = GAS_PAYER_TARGET_BALANCE,
+                 balance_ttl: float = GAS_PAYER_BALANCE_TTL):
+        if not credentials:
+            raise ValueError("A gas payer pool needs at least one gas payer")
+        self.lanes = [
+            GasPayerLane(c["gas_payer"], c["gas_payer_priv"])
+            for c in credentials
+        ]
+        self.funder = GasPayerLane(
+            funder["gas_payer"], funder["gas_payer_priv"]) if funder else None
+        self.min_balance = Web3.toWei(min_balance, 'ether')
+        self.target_balance = Web3.toWei(target_balance, 'ether')
+        self.balance_ttl = balance_ttl
+        self._lock = threading.Lock()
+        self._balances_read_at: Optional[float] = None
+        self._top_ups: Dict[str, PendingTransaction] = {}
+        self._rebalancing = False
+
+    def assign(self) -> Dict[str, str]:
+        """Binds a Job to the least loaded lane.
+
+        Returns:
+            Dict[str, str]: returns the credentials to create the Job with.
+
+        """
+        lane = self._least_loaded()
+        with self._lock:
+            lane.jobs += 1
+        return lane.credentials
+
+    def unassign(self, gas_payer: str):
+        """Releases a Job bound to a lane by assign() once it is done.
+
+        Args:
+            gas_payer (str): the gas payer the Job was created with.
+
+        """
+        gas_payer = Web3.toChecksumAddress(gas_payer)
+        with self._lock:
+            for lane in self.lanes:
+                if lane.gas_payer == gas_payer and lane.jobs:
+                    lane.jobs -= 1
+
+    def submit(self, txn_func, *args, **kwargs) -> PendingTransaction:
+        """Sends a transaction from the least loaded lane without waiting for
+        it to be mined, like submit_transaction.
+
+        Args:
+            txn_func: the transaction function to be handled.
+            *args: all the arguments the function takes.
+            **kwargs: the transaction data, without the gas payer.
+
+        Returns:
+            PendingTransaction: returns a handle resolving to the receipt.
+
+        """
+        lane = self._least_loaded()
+        with self._lock:
+            lane.in_flight += 1
+        try:
+            pending = submit_transaction(txn_func, *args,
+                                         **dict(kwargs, **lane.credentials))
+        except Exception as e:
+            self._done(lane)
+            raise e
+        pending.future.add_done_callback(lambda _: self._done(lane))
+        return pending
+
+    def balances(self, refresh: bool = True) -> Dict[str, int]:
+        """Reads the balances of all lanes in one batch request.
+
+        Args:
+            refresh (bool): read them even if they are younger than the TTL.
+
+        Returns:
+            Dict[str, int]: returns the balance in wei of every lane.
+
+        Raises:
+            ValueError: if the node fails reading a balance.
+
+        """
+        with self._lock:
+            fresh = (self._balances_read_at is not None
+                     and time.monotonic() - self._balances_read_at <
+                     self.balance_ttl)
+        if refresh or not fresh:
+            responses = batch_request([("eth_getBalance",
+                                        [lane.gas_payer, "pending"])
+                                       for lane in self.lanes])
+            with self._lock:
+                for lane, response in zip(self.lanes, responses):
+                    if "error" in response:
+                        raise ValueError(response["error"])
+                    lane.balance = int(response["result"], 16)
+                self._balances_read_at = time.monotonic()
+        return {
+            lane.gas_payer: lane.balance
+            for lane in self.lanes if lane.balance is not None
+        }
+
+    def rebalance(self) -> int:
+        """Tops up the lanes holding less than the minimum balance to the
+        target balance from the funder. A lane isn't topped up again while
+        its previous top-up is pending. The top-ups are sent together, one
+        which fails or is still pending after its deadline is logged.
+
+        Returns:
+            int: returns the number of top-ups sent.
+
+        """
+        funder = self.funder
+        if not funder:
+            return 0
+        self.balances()
+        top_ups = []
+        with self._lock:
+            for lane in self.lanes:
+                pending = self._top_ups.get(lane.gas_payer)
+                if pending and not pending.done():
+                    continue
+                if lane.gas_payer == funder.gas_payer:
+                    continue
+                if lane.balance is not None and lane.balance < self.min_balance:
+                    top_ups.append((lane, self.target_balance - lane.balance))
+
+        # All top-ups are sent before waiting, so a slow one doesn't hold
+        # back the other lanes.
+        sent = []
+        for lane, value in top_ups:
+            LOG.info("Topping up {} with {} wei".format(lane.gas_payer, value))
+            try:
+                pending = self._transfer_ether(funder, lane.gas_payer, value)
+            except Exception as e:
+                LOG.warning("Topping up {} failed: {}".format(
+                    lane.gas_payer, e))
+                continue
+            with self._lock:
+                self._top_ups[lane.gas_payer] = pending
+            sent.append((lane, pending))
+        for lane, pending in sent:
+            try:
+                pending.result(timeout=RECEIPT_GRACE)
+            except Exception as e:
+                LOG.warning("Topping up {} failed: {}".format(
+                    lane.gas_payer, e))
+        if sent:
+            self.balances()
+        return len(sent)
+
+    def _least_loaded(self) -> GasPayerLane:
+        with self._lock:
+            stale = (self._balances_read_at is None
+                     or time.monotonic() - self._balances_read_at >
+                     self.balance_ttl)
+        if stale:
+            try:
+                self.balances()
+            except Exception as e:
+                LOG.warning(
+                    "Refreshing gas payer balances failed: {}".format(e))
+            with self._lock:
+                low = any(lane.balance is not None
+                          and lane.balance < self.min_balance
+                          for lane in self.lanes)
+                start = self.funder and low and not self._rebalancing
+                if start:
+                    self._rebalancing = True
+            if start:
+                threading.Thread(
+                    target=self._rebalance_in_background, daemon=True).start()
+
+        with self._lock:
+            funded = [
+                lane for lane in self.lanes
+                if lane.balance is None or lane.balance >= self.min_balance
+            ]
+            return min(
+                funded or self.lanes,
+                key=lambda lane: (lane.in_flight, lane.jobs))
+
+    def _rebalance_in_background(self):
+        try:
+            self.rebalance()
+        except Exception as e:
+            LOG.warning("Rebalancing gas payers failed: {}".format(e))
+        finally:
+            with self._lock:
+                self._rebalancing = False
+
+    def _done(self, lane: GasPayerLane):
+        with self._lock:
+            lane.in_flight -= 1
+
+    def _transfer_ether(self, funder: GasPayerLane, to: str,
+                        value: int) -> PendingTransaction:
+        w3 = get_w3()
+        nonce = NONCES.allocate(w3, funder.gas_payer)
+        txn_dict: Dict[str, Any] = {
+            'to': to,
+            'value': value,
+            'gas': TRANSFER_GAS,
+            'gasPrice': GAS_PRICES.price(Urgency.NORMAL),
+            'nonce': nonce,
+            'chainId': int(w3.net.version),
+        }
+        try:
+            signed_txn = w3.eth.account.signTransaction(
+                txn_dict, private_key=funder.gas_payer_priv)
+            txn_hash = w3.eth.sendRawTransaction(signed_txn.rawTransaction)
+        except Exception as e:
+            NONCES.release(funder.gas_payer, nonce)
+            raise e
+        return RECEIPTS.watch(txn_hash)
+
+
+if __name__ == "__main__":
+    import doctest
+    from hmt_escrow.eth_bridge import get_hmtoken
+    doctest.testmod()
@@ -0,0 +1,271 @@
+import logging
+import os
+
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple, cast
+
+from web3 import Web3
+from web3.contract import Contract
+
+from hmt_escrow.eth_bridge import get_w3, get_contract_interface, handle_transaction, batch_request, encode_call, decode_call, CONTRACT_FOLDER
+from hmt_escrow.job import Status
+
+GAS_LIMIT = int(os.getenv("GAS_LIMIT", 4712388))
+
+# Nodes refuse eth_calls using more gas than their cap, e.g. geth's --rpc.gascap.
+# 0 caps the calls at the gas limit of the latest block, which every node
+# accepts.
+READER_GAS_CAP = int(os.getenv("READER_GAS_CAP", 0))
+
+# Escrows read per eth_call, 0 sizes the chunks from a gas estimate.
+READER_CHUNK_SIZE = int(os.getenv("READER_CHUNK_SIZE", 0))
+READER_SAMPLE_SIZE = int(os.getenv("READER_SAMPLE_SIZE", 10))
+
+# Share of the gas cap the estimated chunk size may use, as escrows with
+# longer urls cost more to read than the sampled ones.
+READER_GAS_HEADROOM = 0.8
+
+ESCROW_READER_ADDR = os.getenv("ESCROW_READER_ADDR")
+
+LOG = logging.getLogger("hmt_escrow.reader")
+
+
+class EscrowSummary(NamedTuple):
+    """The monitored state of an escrow contract as read by the EscrowReader.
+
+    Attributes:
+        address (str): the address of the escrow contract.
+        status (Optional[Enum]): the status of the escrow, None if the address
+        is not an escrow.
+        balance (int): the balance of the escrow in HMT.
+        bulk_paid (bool): whether the last bulk payout succeeded.
+        intermediate_url (str): the location of the intermediate results.
+        final_results_url (str): the location of the final results.
+
+    """
+    address: str
+    status: Optional[Enum]
+    balance: int
+    bulk_paid: bool
+    intermediate_url: str
+    final_results_url: str
+
+
+def deploy_reader(gas: int = GAS_LIMIT, **credentials) -> str:
+    """Deploy an EscrowReader solidity contract to the ethereum network.
+
+    Args:
+        gas (int): maximum amount of gas the caller is ready to pay.
+
+    Returns:
+        str: returns the contract address of the newly deployed reader.
+
+    """
+    gas_payer = credentials["gas_payer"]
+    gas_payer_priv = credentials["gas_payer_priv"]
+
+    w3 = get_w3()
+    contract_interface = get_contract_interface(
+        '{}/EscrowReader.sol:EscrowReader'.format(CONTRACT_FOLDER))
+    reader = w3.eth.contract(
+        abi=contract_interface['abi'], bytecode=contract_interface['bin'])
+
+    txn_info = {
+        "gas_payer": gas_payer,
+        "gas_payer_priv": gas_payer_priv,
+        "gas": gas
+    }
+    txn_receipt = handle_transaction(reader.constructor, **txn_info)
+    return txn_receipt['contractAddress']
+
+
+def get_reader(reader_addr: Optional[str] = None) -> Contract:
+    """Retrieve the EscrowReader contract from a given address.
+
+    Args:
+        reader_addr (Optional[str]): the ethereum address of the reader.
+        Defaults to the ESCROW_READER_ADDR environment variable.
+
+    Returns:
+        Contract: returns the EscrowReader solidity contract.
+
+    Raises:
+        ValueError: if no reader address is given or configured.
+
+    """
+    reader_addr = reader_addr or ESCROW_READER_ADDR
+    if not reader_addr:
+        raise ValueError(
+            "No EscrowReader address, deploy one with deploy_reader and set ESCROW_READER_ADDR"
+        )
+    w3 = get_w3()
+    contract_interface = get_contract_interface(
+        '{}/EscrowReader.sol:EscrowReader'.format(CONTRACT_FOLDER))
+    return w3.eth.contract(
+        address=Web3.toChecksumAddress(reader_addr),
+        abi=contract_interface['abi'])
+
+
+def estimate_chunk_size(reader: Contract,
+                        escrow_addrs: List[str],
+                        gas_cap: int = READER_GAS_CAP) -> int:
+    """Estimate how many escrows fit into a single reader call under the gas
+    cap of the node, from the gas used to read a sample of them.
+
+    Args:
+        reader (Contract): the EscrowReader contract.
+        escrow_addrs (List[str]): the escrow addresses to be read.
+        gas_cap (int): the maximum gas of an eth_call allowed by the node,
+        0 for the block gas limit.
+
+    Returns:
+        int: returns the number of escrows to read per call.
+
+    """
+    gas_cap = gas_cap or block_gas_limit()
+    sample = escrow_addrs[:READER_SAMPLE_SIZE]
+    if not sample:
+        return 1
+    gas = max(
+        reader.functions.getStates(sample).estimateGas({
+            'gas': gas_cap
+        }),
+        reader.functions.getResultsUrls(sample).estimateGas({
+            'gas': gas_cap
+        }))
+    chunk_size = int(gas_cap * READER_GAS_HEADROOM * len(sample) / gas)
+    LOG.debug("Reading {} escrows per call, {} gas for {} escrows.".format(
+        chunk_size, gas, len(sample)))
+    return max(1, chunk_size)
+
+
+def block_gas_limit() -> int:
+    """Returns the gas limit of the latest block, the most gas an eth_call
+    may use on a node without a cap of its own.
+
+    >>> block_gas_limit() > 0
+    True
+
+    Returns:
+        int: returns the gas limit of the latest block.
+
+    """
+    return get_w3().eth.getBlock('latest').gasLimit
+
+
+def _unpack(packed: bytes, lengths: List[int]) -> List[str]:
+    urls = []
+    offset = 0
+    for length in lengths:
+        urls.append(packed[offset:offset + length].decode('utf-8'))
+        offset += length
+    return urls
+
+
+def read_escrows(escrow_addrs: List[str],
+                 reader_addr: Optional[str] = None,
+                 gas_cap: int = READER_GAS_CAP,
+                 chunk_size: int = READER_CHUNK_SIZE) -> List[EscrowSummary]:
+    """Reads the status, balance, bulk paid flag and results urls of many
+    escrows through the EscrowReader contract. The escrows are split into
+    chunks read by a single eth_call each, and all chunks are sent to the node
+    in one JSON-RPC batch request. A chunk exceeding the gas cap of the node is
+    split in half and read again.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> reader_addr = deploy_reader(**credentials)
+    >>> job = Job(credentials, manifest)
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> job.setup()
+    True
+    >>> summaries = read_escrows([job.job_contract.address, credentials["gas_payer"]], reader_addr)
+    >>> summaries[0].status
+    <Status.Pending: 2>
+    >>> summaries[0].balance
+    100000000000000000000
+    >>> summaries[1].status is None
+    True
+
+    Chunks are sized to the gas cap.
+    >>> summaries = read_escrows([job.job_contract.address] * 5, reader_addr, chunk_size=2)
+    >>> [s.status for s in summaries] == [Status.Pending] * 5
+    True
+
+    Args:
+        escrow_addrs (List[str]): the escrow addresses to be read.
+        reader_addr (Optional[str]): the ethereum address of the reader.
+        gas_cap (int): the maximum gas of an eth_call allowed by the node,
+        0 for the block gas limit.
+        chunk_size (int): escrows read per call, 0 to estimate it.
+
+    Returns:
+        List[EscrowSummary]: returns the summaries in the order of the
+        addresses.
+
+    Raises:
+        ValueError: if the node fails reading a single escrow.
+
+    """
+    reader = get_reader(reader_addr)
+    escrow_addrs = [Web3.toChecksumAddress(addr) for addr in escrow_addrs]
+    gas_cap = gas_cap or block_gas_limit()
+    if not chunk_size:
+        chunk_size = estimate_chunk_size(reader, escrow_addrs, gas_cap)
+
+    summaries: List[Optional[EscrowSummary]] = [None] * len(escrow_addrs)
+    chunks = [(i, escrow_addrs[i:i + chunk_size])
+              for i in range(0, len(escrow_addrs), chunk_size)]
+    while chunks:
+        calls = []
+        for _, chunk in chunks:
+            for fn_name in ("getStates", "getResultsUrls"):
+                txn = encode_call(reader, fn_name, chunk)
+                txn['gas'] = hex(gas_cap)
+                calls.append(("eth_call", [txn, "latest"]))
+        responses = batch_request(calls)
+
+        retries: List[Tuple[int, List[str]]] = []
+        for n, (start, chunk) in enumerate(chunks):
+            states, urls = responses[2 * n], responses[2 * n + 1]
+            error = states.get("error") or urls.get("error")
+            if error:
+                if len(chunk) == 1:
+                    raise ValueError(error)
+                LOG.info("Reading {} escrows failed, splitting: {}".format(
+                    len(chunk), error))
+                half = len(chunk) // 2
+                retries += [(start, chunk[:half]), (start + half,
+                                                    chunk[half:])]
+                continue
+
+            exists, statuses, balances, bulk_paid = decode_call(
+                reader, "getStates", states["result"], chunk)
+            intermediate, intermediate_lengths, final, final_lengths = decode_call(
+                reader, "getResultsUrls", urls["result"], chunk)
+            intermediate_urls = _unpack(intermediate, intermediate_lengths)
+            final_urls = _unpack(final, final_lengths)
+            for i, addr in enumerate(chunk):
+                summaries[start + i] = EscrowSummary(
+                    address=addr,
+                    status=Status(statuses[i] + 1) if exists[i] else None,
+                    balance=balances[i],
+                    bulk_paid=bulk_paid[i],
+                    intermediate_url=intermediate_urls[i],
+                    final_results_url=final_urls[i])
+        chunks = retries
+    # Every chunk is either read or split until a single escrow fails, so
+    # all summaries are filled in here.
+    assert all(summary is not None for summary in summaries)
+    return cast(List[EscrowSummary], summaries)
+
+
+if __name__ == "__main__":
+    import doctest
+    from test_manifest import manifest
+    from job import Job
+    doctest.testmod()
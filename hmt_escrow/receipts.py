@@ -0,0 +1,373 @@
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from web3.middleware.pythonic import receipt_formatter
+
+from hmt_escrow.gas import GAS_PRICE_MAX_GWEI, GWEI
+
+LOG = logging.getLogger("hmt_escrow.receipts")
+
+RECEIPT_CONFIRMATIONS = int(os.getenv("RECEIPT_CONFIRMATIONS", 0))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", 240))
+RECEIPT_POLL_MIN = float(os.getenv("RECEIPT_POLL_MIN", 0.5))
+RECEIPT_POLL_MAX = float(os.getenv("RECEIPT_POLL_MAX", 8))
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", 100))
+
+# Seconds callers wait past the deadline of a transaction for the poller to
+# time it out, so that a stuck poller can't block them forever.
+RECEIPT_GRACE = float(os.getenv("RECEIPT_GRACE", 30))
+
+# Seconds a transaction may stay unmined before it is sent again with the same
+# nonce and a higher gas price, how much the price is raised every time and
+# how many replacements are sent at most. Nodes drop replacements bumping the
+# price by less than 10%.
+TX_REPLACE_AFTER = float(os.getenv("TX_REPLACE_AFTER", 90))
+TX_REPLACE_BUMP = float(os.getenv("TX_REPLACE_BUMP", 1.125))
+TX_REPLACE_MAX = int(os.getenv("TX_REPLACE_MAX", 3))
+
+BatchRequest = Callable[[List[Tuple[str, List[Any]]]], List[Dict[str, Any]]]
+
+# Signs and sends a transaction again with a new gas price, returns its hash.
+Replace = Callable[[int], bytes]
+
+
+def bump_gas_price(gas_price: int, bump: float = TX_REPLACE_BUMP) -> int:
+    """Raises the gas price of a transaction to be replaced.
+
+    >>> bump_gas_price(20 * 10**9)
+    22500000000
+    >>> bump_gas_price(1)
+    2
+
+    Args:
+        gas_price (int): the gas price of the last broadcast in wei.
+        bump (float): the factor the price is raised by.
+
+    Returns:
+        int: returns the gas price of the replacement.
+
+    """
+    return max(int(gas_price * bump), gas_price + 1)
+
+
+class PendingTransaction:
+    """A handle of a sent transaction whose receipt is collected by the
+    ReceiptPoller.
+
+    Attributes:
+        txn_hash (HexBytes): the hash of the sent transaction.
+        confirmations (int): blocks required on top of the mined block.
+        deadline (float): monotonic time after which waiting times out.
+        future (Future): resolves to the transaction receipt.
+        gas_price (Optional[int]): the gas price of the last broadcast.
+        replace (Optional[Replace]): sends the transaction again with a new
+        gas price, None if it can't be replaced.
+        hashes (List[HexBytes]): the hashes of the transaction and of all its
+        replacements.
+        sent_at (float): monotonic time of the last broadcast.
+        mined_hash (Optional[HexBytes]): the hash which was mined, which is
+        the hash of a replacement if one of them won.
+
+    """
+
+    def __init__(self,
+                 txn_hash: bytes,
+                 confirmations: int,
+                 timeout: float,
+                 gas_price: Optional[int] = None,
+                 replace: Optional[Replace] = None):
+        self.txn_hash = HexBytes(txn_hash)
+        self.confirmations = confirmations
+        self.deadline = time.monotonic() + timeout
+        self.future: Future = Future()
+        self.gas_price = gas_price
+        self.replace = replace
+        self.hashes: List[HexBytes] = [self.txn_hash]
+        self.sent_at = time.monotonic()
+        self.mined_hash: Optional[HexBytes] = None
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> AttributeDict:
+        """Blocks until the transaction is mined and confirmed.
+
+        Args:
+            timeout (Optional[float]): seconds to wait on top of the deadline
+            the transaction was submitted with, None to wait until the
+            poller resolves it.
+
+        Returns:
+            AttributeDict: returns the transaction receipt.
+
+        Raises:
+            TimeoutError: if the receipt didn't arrive before the deadline.
+
+        """
+        if timeout is not None:
+            timeout += max(0.0, self.deadline - time.monotonic())
+        try:
+            return self.future.result(timeout)
+        except FutureTimeoutError:
+            raise TimeoutError("Transaction {} is not in the chain".format(
+                self.txn_hash.hex()))
+
+    def __repr__(self):
+        return "<PendingTransaction {}>".format(self.txn_hash.hex())
+
+
+class ReceiptPoller:
+    """Resolves the receipts of many pending transactions from a single
+    background thread. Every polling round asks the node for the current
+    block and up to batch_size receipts in one JSON-RPC batch request.
+    The poll interval starts at min_interval, doubles up to max_interval
+    while nothing changes, and resets when a block arrives or a transaction
+    is submitted.
+
+    The poller also watches for stuck transactions. A transaction submitted
+    with a way to replace it, which has not been mined after replace_after
+    seconds, is sent again with the same nonce and a bumped gas price. The
+    first of the broadcasts to be mined resolves the PendingTransaction.
+
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> txn_info = dict(credentials, gas=4712388)
+    >>> txn_func = get_hmtoken().functions.transfer
+    >>> pending = [submit_transaction(txn_func, credentials["gas_payer"], 1, **txn_info) for _ in range(5)]
+    >>> [p.result().status for p in pending]
+    [1, 1, 1, 1, 1]
+
+    A transaction which isn't mined in time is replaced with a higher price.
+    >>> no_receipts = lambda calls: [{"result": "0x10"}] + [{"result": None}] * (len(calls) - 1)
+    >>> poller = ReceiptPoller(no_receipts, replace_after=0)
+    >>> sent = []
+    >>> stuck = PendingTransaction(b"\x01" * 32, 0, 60, 10**9, lambda gas_price: sent.append(gas_price) or b"\x02" * 32)
+    >>> poller._pending[stuck.txn_hash] = stuck
+    >>> poller.poll()
+    True
+    >>> (sent, len(stuck.hashes))
+    ([1125000000], 2)
+
+    Transactions time out even while polling fails.
+    >>> poller = ReceiptPoller(lambda calls: [{"error": "unavailable"}])
+    >>> overdue = PendingTransaction(b"\x03" * 32, 0, 0, None, None)
+    >>> poller._pending[overdue.txn_hash] = overdue
+    >>> poller.poll()
+    False
+    >>> overdue.result(0)
+    Traceback (most recent call last):
+    ...
+    TimeoutError: Transaction 0x0303030303030303030303030303030303030303030303030303030303030303 is not in the chain
+
+    """
+
+    def __init__(self,
+                 batch_request: BatchRequest,
+                 confirmations: int = RECEIPT_CONFIRMATIONS,
+                 min_interval: float = RECEIPT_POLL_MIN,
+                 max_interval: float = RECEIPT_POLL_MAX,
+                 batch_size: int = RECEIPT_BATCH_SIZE,
+                 replace_after: float = TX_REPLACE_AFTER,
+                 max_replacements: int = TX_REPLACE_MAX,
+                 max_gas_price: int = int(GAS_PRICE_MAX_GWEI * GWEI)):
+        self.batch_request = batch_request
+        self.confirmations = confirmations
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.replace_after = replace_after
+        self.max_replacements = max_replacements
+        self.max_gas_price = max_gas_price
+        self._pending: Dict[HexBytes, PendingTransaction] = {}
+        self._wakeup = threading.Condition()
+        self._submitted = False
+        self._last_block: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self,
+              txn_hash: bytes,
+              confirmations: Optional[int] = None,
+              timeout: float = RECEIPT_TIMEOUT,
+              gas_price: Optional[int] = None,
+              replace: Optional[Replace] = None) -> PendingTransaction:
+        """Starts collecting the receipt of a sent transaction.
+
+        Args:
+            txn_hash (bytes): the hash of the sent transaction.
+            confirmations (Optional[int]): blocks required on top of the block
+            the transaction was mined in. Defaults to the poller's setting.
+            timeout (float): seconds to wait for the receipt.
+            gas_price (Optional[int]): the gas price the transaction was sent
+            with.
+            replace (Optional[Replace]): sends the transaction again with a
+            new gas price if it gets stuck.
+
+        Returns:
+            PendingTransaction: returns a handle resolving to the receipt.
+
+        """
+        if confirmations is None:
+            confirmations = self.confirmations
+        pending = PendingTransaction(txn_hash, confirmations, timeout,
+                                     gas_price, replace)
+        with self._wakeup:
+            existing = self._pending.get(pending.txn_hash)
+            if existing:
+                return existing
+            self._pending[pending.txn_hash] = pending
+            self._submitted = True
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="hmt-receipt-poller", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+        return pending
+
+    def pending(self) -> List[PendingTransaction]:
+        with self._wakeup:
+            return list(self._pending.values())
+
+    def _resolve(self, pending: PendingTransaction,
+                 receipt: Optional[AttributeDict], error: Optional[Exception]):
+        with self._wakeup:
+            self._pending.pop(pending.txn_hash, None)
+        if error or receipt is None:
+            pending.future.set_exception(
+                error or ValueError("No receipt for {}".format(
+                    pending.txn_hash.hex())))
+        else:
+            pending.mined_hash = HexBytes(receipt.transactionHash)
+            if pending.mined_hash != pending.txn_hash:
+                LOG.info(
+                    "Transaction {} was mined as its replacement {}".format(
+                        pending.txn_hash.hex(), pending.mined_hash.hex()))
+            pending.future.set_result(receipt)
+
+    def _replace(self, pending: PendingTransaction, now: float):
+        if (not pending.replace or pending.gas_price is None
+                or now - pending.sent_at < self.replace_after
+                or len(pending.hashes) > self.max_replacements):
+            return
+        gas_price = bump_gas_price(pending.gas_price)
+        if gas_price > self.max_gas_price:
+            return
+
+        # Wait another replace_after whether or not the node takes it.
+        pending.sent_at = now
+        try:
+            txn_hash = HexBytes(pending.replace(gas_price))
+        except Exception as e:
+            LOG.warning("Replacing {} failed because of: {}".format(
+                pending.txn_hash.hex(), e))
+            return
+        pending.hashes.append(txn_hash)
+        pending.gas_price = gas_price
+        LOG.info("Transaction {} is stuck, sent {} with gas price {}".format(
+            pending.txn_hash.hex(), txn_hash.hex(), gas_price))
+
+    def poll(self) -> bool:
+        """Runs one polling round over all pending transactions.
+
+        Returns:
+            bool: returns True if a new block arrived or a receipt resolved.
+
+        """
+        progressed = False
+        pending = self.pending()
+        for i in range(0, len(pending), self.batch_size):
+            chunk = pending[i:i + self.batch_size]
+            # Replacements are polled along with the transaction they replace.
+            hashes = [(p, txn_hash) for p in chunk for txn_hash in p.hashes]
+            calls: List[Tuple[str, List[Any]]] = [("eth_blockNumber", [])]
+            calls += [("eth_getTransactionReceipt", [txn_hash.hex()])
+                      for _, txn_hash in hashes]
+            try:
+                responses = self.batch_request(calls)
+                block_number = int(responses[0]["result"], 16)
+            except Exception as e:
+                # Transactions still time out while the node is unreachable.
+                LOG.warning("Polling receipts failed because of: {}".format(e))
+                self._expire(pending[i:], time.monotonic())
+                return progressed
+
+            if block_number != self._last_block:
+                self._last_block = block_number
+                progressed = True
+
+            receipts: Dict[HexBytes, AttributeDict] = {}
+            for (p, txn_hash), response in zip(hashes, responses[1:]):
+                raw_receipt = response.get("result")
+                if "error" in response:
+                    LOG.warning("Receipt of {} failed because of: {}".format(
+                        txn_hash.hex(), response["error"]))
+                elif raw_receipt and raw_receipt.get("blockNumber"):
+                    receipts.setdefault(
+                        p.txn_hash,
+                        AttributeDict.recursive(
+                            receipt_formatter(raw_receipt)))
+
+            now = time.monotonic()
+            for p in chunk:
+                receipt = receipts.get(p.txn_hash)
+                if receipt and block_number - receipt.blockNumber >= p.confirmations:
+                    self._resolve(p, receipt, None)
+                    progressed = True
+                elif now > p.deadline:
+                    self._expire([p], now)
+                elif not receipt:
+                    self._replace(p, now)
+        return progressed
+
+    def _expire(self, pending: List[PendingTransaction], now: float):
+        for p in pending:
+            if now > p.deadline:
+                self._resolve(
+                    p, None,
+                    TimeoutError("Transaction {} is not in the chain".format(
+                        p.txn_hash.hex())))
+
+    def _run(self):
+        interval = self.min_interval
+        last_poll = 0.0
+        while True:
+            with self._wakeup:
+                while not self._pending:
+                    self._wakeup.wait()
+                next_poll = last_poll + interval
+                while True:
+                    if self._submitted:
+                        self._submitted = False
+                        interval = self.min_interval
+                        next_poll = min(next_poll,
+                                        last_poll + self.min_interval)
+                    remaining = next_poll - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+
+            last_poll = time.monotonic()
+            try:
+                progressed = self.poll()
+            except Exception as e:
+                LOG.exception(
+                    "Polling receipts failed because of: {}".format(e))
+                progressed = False
+            if progressed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+
+
+if __name__ == "__main__":
+    import doctest
+    from hmt_escrow.eth_bridge import get_hmtoken, submit_transaction
+    doctest.testmod()
@@ -1,15 +1,35 @@
 import os
+import io
 import logging
 import codecs
 import hashlib
 import json
-import ipfsapi
-import timeout_decorator
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+import requests
 
-from typing import Dict, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from typing import (Any, BinaryIO, Dict, Iterator, List, Optional, Tuple,
+                    Union, cast)
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from eth_keys import keys
 from p2p import ecies
-from ipfsapi import Client
+from p2p.exceptions import DecryptionError
+from requests.adapters import HTTPAdapter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from hmt_escrow.blobs import BlobCache, PayloadCache, key_fingerprint
 
 SHARED_MAC_DATA = os.getenv(
     "SHARED_MAC",
@@ -18,25 +38,319 @@ SHARED_MAC_DATA = os.getenv(
 LOG = logging.getLogger("hmt_escrow.storage")
 IPFS_HOST = os.getenv("IPFS_HOST", "localhost")
 IPFS_PORT = int(os.getenv("IPFS_PORT", 5001))
+IPFS_POOL_SIZE = int(os.getenv("IPFS_POOL_SIZE", 10))
+IPFS_TIMEOUT = float(os.getenv("IPFS_TIMEOUT", 20))
+IPFS_CONNECT_TIMEOUT = float(os.getenv("IPFS_CONNECT_TIMEOUT", 5))
+
+# Seconds a whole upload or download may take, across all of its requests.
+IPFS_DEADLINE = float(os.getenv("IPFS_DEADLINE", 20))
+IPFS_HEALTHCHECK_INTERVAL = float(os.getenv("IPFS_HEALTHCHECK_INTERVAL", 30))
+IPFS_RECONNECT_BACKOFF = float(os.getenv("IPFS_RECONNECT_BACKOFF", 1))
+IPFS_RECONNECT_BACKOFF_MAX = float(os.getenv("IPFS_RECONNECT_BACKOFF_MAX", 30))
+IPFS_UPLOAD_WORKERS = int(os.getenv("IPFS_UPLOAD_WORKERS", IPFS_POOL_SIZE))
+
+# Payloads bigger than this are spooled to a temporary file instead of
+# being held in memory while they are uploaded or downloaded.
+IPFS_SPOOL_SIZE = int(os.getenv("IPFS_SPOOL_SIZE", 8 * 1024 * 1024))
+
+# Payloads are encrypted into an envelope: a random AES-256 key wrapped with
+# ECIES for every recipient, followed by the body encrypted once with
+# AES-GCM in chunks of ENVELOPE_CHUNK_SIZE bytes. The header is
+# magic | version | flags | chunk size | nonce prefix | key slot count,
+# followed by one key slot per recipient made of
+# public key fingerprint | wrapped key length | wrapped key,
+# and is authenticated by every chunk. The flags hold the compression the
+# body went through before encryption. Version 1 envelopes had a single
+# key slot, without a fingerprint, in place of the key slot count.
+ENVELOPE_MAGIC = b"HMTE"
+ENVELOPE_VERSION = 2
+ENVELOPE_CHUNK_SIZE = int(os.getenv("ENVELOPE_CHUNK_SIZE", 1024 * 1024))
+ENVELOPE_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+_ENVELOPE_HEADER = struct.Struct(">4sBBI8sH")
+_KEY_SLOT = struct.Struct(">8sH")
+_TAG_SIZE = 16
+
+# Compression applied before encryption: "none", "zlib" or "zstd". zstd
+# needs the zstandard package and falls back to zlib without it. Payloads are
+# left uncompressed unless enabled, every compression is read regardless.
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSIONS = {
+    "none": COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD
+}
+ENVELOPE_COMPRESSION = os.getenv("ENVELOPE_COMPRESSION", "none")
+ENVELOPE_COMPRESSION_LEVEL = os.getenv("ENVELOPE_COMPRESSION_LEVEL")
+_COMPRESSION_MASK = 0x0f
+
+# zstd decompression has no output limit, but a block expands to at most
+# 128 KiB and takes at least 4 bytes, so feeding it this many bytes at a time
+# bounds its output to about 8 MiB per call.
+_ZSTD_INPUT_SIZE = 256
+
+# A public key, or the public keys of every recipient of a payload.
+PublicKeys = Union[bytes, List[bytes]]
+
+# Payloads written before the envelope format are a single ECIES
+# ciphertext, which starts with the uncompressed point prefix.
+_LEGACY_PREFIX = b"\x04"
+
+
+class Deadline:
+    """The time left to a storage call, shared by all of its requests. Every
+    request waits at most the time left, and streams check it between
+    chunks. Unlike a signal based timeout, it works in any thread.
+
+    >>> deadline = Deadline(0.01)
+    >>> deadline.timeouts()[1] <= 0.01
+    True
+    >>> time.sleep(0.02)
+    >>> deadline.check()
+    Traceback (most recent call last):
+    TimeoutError: IPFS deadline of 0.01s exceeded
+
+    """
+
+    def __init__(self, timeout: Optional[float] = IPFS_DEADLINE):
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic(
+        ) + timeout
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def check(self):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError("IPFS deadline of {}s exceeded".format(
+                self.timeout))
+
+    def timeouts(self) -> Tuple[float, float]:
+        """Returns the connect and read timeouts of the next request.
+
+        Raises:
+            TimeoutError: if the deadline has passed.
+
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return IPFS_CONNECT_TIMEOUT, IPFS_TIMEOUT
+        return min(IPFS_CONNECT_TIMEOUT, remaining), min(
+            IPFS_TIMEOUT, remaining)
+
+
+class Client:
+    """A minimal client of the IPFS HTTP API. Requests are sent through one
+    requests session holding a pool of keep-alive connections, so concurrent
+    uploads and downloads don't open a new TCP connection each.
+
+    Attributes:
+        base_url (str): the url of the IPFS HTTP API.
+        session (requests.Session): the session shared by all requests.
+        last_ok (float): monotonic time of the last successful request.
+
+    """
+
+    def __init__(self, host: str, port: int, pool_size: int = IPFS_POOL_SIZE):
+        self.base_url = "http://{}:{}/api/v0".format(host, port)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_ok = 0.0
+
+    def _request(self,
+                 path: str,
+                 deadline: Optional[Deadline] = None,
+                 **kwargs) -> requests.Response:
+        kwargs["timeout"] = (deadline or Deadline(None)).timeouts()
+        try:
+            response = self.session.post(self.base_url + path, **kwargs)
+        except requests.exceptions.ReadTimeout as e:
+            if deadline:
+                deadline.check()
+            raise e
+        response.raise_for_status()
+        self.last_ok = time.monotonic()
+        return response
+
+    def version(self) -> Dict[str, Any]:
+        return self._request("/version").json()
+
+    def cat(self, key: str, deadline: Optional[Deadline] = None) -> bytes:
+        return self._request("/cat", deadline, params={"arg": key}).content
+
+    def cat_stream(self,
+                   key: str,
+                   deadline: Optional[Deadline] = None,
+                   chunk_size: int = ENVELOPE_CHUNK_SIZE) -> Iterator[bytes]:
+        with closing(
+                self._request(
+                    "/cat", deadline, params={"arg": key},
+                    stream=True)) as response:
+            for chunk in response.iter_content(chunk_size):
+                if deadline:
+                    deadline.check()
+                yield chunk
+
+    def add_bytes(self, data: bytes,
+                  deadline: Optional[Deadline] = None) -> str:
+        response = self._request(
+            "/add",
+            deadline,
+            files={"file": ("bytes", data, "application/octet-stream")})
+        return response.json()["Hash"]
+
+    def add_stream(self, src: BinaryIO,
+                   deadline: Optional[Deadline] = None) -> str:
+        boundary = uuid.uuid4().hex
+        response = self._request(
+            "/add",
+            deadline,
+            data=_multipart(src, boundary, deadline),
+            headers={
+                "Content-Type":
+                "multipart/form-data; boundary={}".format(boundary)
+            })
+        return response.json()["Hash"]
+
+    def close(self):
+        self.session.close()
+
+
+def _multipart(src: BinaryIO,
+               boundary: str,
+               deadline: Optional[Deadline] = None) -> Iterator[bytes]:
+    """Encodes a file as the single part of a multipart form, reading it
+    chunk by chunk so that it's sent with a chunked transfer encoding."""
+    yield (
+        "--{}\r\n"
+        "Content-Disposition: form-data; name=\"file\"; filename=\"bytes\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).format(boundary).encode('utf-8')
+    for chunk in iter(lambda: src.read(ENVELOPE_CHUNK_SIZE), b""):
+        if deadline:
+            deadline.check()
+        yield chunk
+    yield "\r\n--{}--\r\n".format(boundary).encode('utf-8')
 
 
-@timeout_decorator.timeout(20)
 def _connect(host: str, port: int) -> Client:
     try:
-        IPFS_CLIENT = ipfsapi.connect(host, port)
-        return IPFS_CLIENT
+        client = Client(host, port)
+        client.version()
+        return client
     except Exception as e:
         LOG.error("Connection with IPFS failed because of: {}".format(e))
         raise e
 
 
-IPFS_CLIENT = _connect(IPFS_HOST, IPFS_PORT)
+BLOBS = BlobCache()
+PAYLOADS = PayloadCache()
+
+_IPFS_CLIENT: Optional[Client] = None
+_IPFS_LOCK = threading.Lock()
+# Serializes reconnects, without blocking the callers of a connected client.
+_IPFS_CONNECT_LOCK = threading.Lock()
+_IPFS_RETRY_AT = 0.0
+_IPFS_BACKOFF = 0.0
+_UPLOAD_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _reset_client(client: Client):
+    """Drop a client that failed a request so that the next caller reconnects.
+
+    Args:
+        client (Client): the client which failed.
+
+    """
+    global _IPFS_CLIENT
+    with _IPFS_LOCK:
+        if _IPFS_CLIENT is client:
+            _IPFS_CLIENT = None
+            client.close()
 
 
-@timeout_decorator.timeout(20)
-def download(key: str, private_key: bytes) -> Dict:
+def _ipfs_client() -> Client:
+    """Return the shared IPFS client, connecting lazily on first use.
+
+    An idle client is health-checked before it's handed out and replaced
+    when the check fails. The check runs outside of the client lock, by a
+    single caller while the others keep using the client. Reconnects are
+    serialized and backed off exponentially, so callers fail fast while the
+    IPFS daemon is down instead of all hammering it at once.
+
+    Returns:
+        Client: returns a connected IPFS client.
+
+    Raises:
+        ConnectionError: if IPFS is unreachable.
+
+    """
+    with _IPFS_LOCK:
+        client = _IPFS_CLIENT
+        idle = time.monotonic() - client.last_ok if client else 0.0
+        stale = idle > IPFS_HEALTHCHECK_INTERVAL
+        if client and stale:
+            # Claim the check, so that concurrent callers don't repeat it.
+            client.last_ok = time.monotonic()
+
+    if client and stale:
+        try:
+            client.version()
+        except Exception as e:
+            LOG.warning("IPFS health check failed: {}".format(e))
+            _reset_client(client)
+            client = None
+    return client or _reconnect()
+
+
+def _reconnect() -> Client:
+    global _IPFS_CLIENT, _IPFS_RETRY_AT, _IPFS_BACKOFF
+    with _IPFS_CONNECT_LOCK:
+        with _IPFS_LOCK:
+            # Another caller may have connected while this one waited.
+            if _IPFS_CLIENT:
+                return _IPFS_CLIENT
+            now = time.monotonic()
+            if now < _IPFS_RETRY_AT:
+                raise ConnectionError(
+                    "IPFS at {}:{} unreachable, retrying in {:.1f}s".format(
+                        IPFS_HOST, IPFS_PORT, _IPFS_RETRY_AT - now))
+        try:
+            client = _connect(IPFS_HOST, IPFS_PORT)
+        except Exception as e:
+            with _IPFS_LOCK:
+                _IPFS_BACKOFF = min(
+                    max(_IPFS_BACKOFF * 2, IPFS_RECONNECT_BACKOFF),
+                    IPFS_RECONNECT_BACKOFF_MAX)
+                _IPFS_RETRY_AT = time.monotonic() + _IPFS_BACKOFF
+            raise ConnectionError("Unable to connect to IPFS at {}:{}".format(
+                IPFS_HOST, IPFS_PORT)) from e
+        with _IPFS_LOCK:
+            _IPFS_BACKOFF = 0.0
+            _IPFS_CLIENT = client
+        return client
+
+
+def download(key: str,
+             private_key: bytes,
+             timeout: Optional[float] = IPFS_DEADLINE) -> Dict:
     """Download a key, decrypt it, and output it as a binary string.
 
+    IPFS keys are content hashes, so the ciphertext is cached on disk in
+    BLOBS and repeated downloads of a key never touch the network. When
+    IPFS_PAYLOAD_CACHE_SIZE is set, the decrypted payload is also kept in
+    memory for the private key it was decrypted with.
+
+    The download is bounded by a deadline of timeout seconds instead of a
+    signal, so it can be called from any thread.
+
     >>> credentials = {
     ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
     ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
@@ -48,34 +362,123 @@ def download(key: str, private_key: bytes) -> Dict:
     >>> manifest_dict == job.serialized_manifest
     True
 
+    The upload already cached the ciphertext, so downloads read it from disk.
+    >>> hits = BLOBS.hits
+    >>> download(manifest_url, job.gas_payer_priv) == manifest_dict
+    True
+    >>> BLOBS.hits == hits + 1
+    True
+
     Args:
         key (str): This is the hash code returned when uploading.
         private_key (str): The private_key to decrypt this string with.
+        timeout (Optional[float]): the seconds the whole download may take,
+        or None for no limit.
 
     Returns:
         Dict: returns the contents of the filename which was previously uploaded.
     
     Raises:
+        TimeoutError: if the download takes longer than the timeout.
         Exception: if reading from IPFS fails.
 
     """
+    fingerprint = key_fingerprint(private_key)
+    msg = PAYLOADS.get(key, fingerprint)
+    if msg is None:
+        with _spool() as plaintext:
+            download_stream(key, private_key, plaintext, timeout)
+            plaintext.seek(0)
+            msg = plaintext.read().decode('utf-8')
+        PAYLOADS.put(key, fingerprint, msg)
+    return json.loads(msg)
+
+
+def download_stream(key: str,
+                    private_key: bytes,
+                    dst: BinaryIO,
+                    timeout: Optional[float] = None) -> int:
+    """Download a key and decrypt it into a file-like object chunk by chunk,
+    so that neither the ciphertext nor the plaintext is held in memory. The
+    ciphertext is cached like by download.
+
+    >>> pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> priv_key = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    >>> results = os.urandom(3 * ENVELOPE_CHUNK_SIZE + 1)
+    >>> (hash_, url) = upload_stream(io.BytesIO(results), pub_key)
+    >>> hash_ == hashlib.sha1(results).hexdigest()
+    True
+    >>> output = io.BytesIO()
+    >>> download_stream(url, priv_key, output) == len(results)
+    True
+    >>> output.getvalue() == results
+    True
+
+    Args:
+        key (str): This is the hash code returned when uploading.
+        private_key (str): The private_key to decrypt it with.
+        dst (BinaryIO): the file-like object to write the plaintext to. It
+        is incomplete if decryption fails.
+        timeout (Optional[float]): the seconds reading from IPFS may take.
+        By default only every request is bounded by IPFS_TIMEOUT, as large
+        payloads take long.
+
+    Returns:
+        int: returns the number of bytes written.
+
+    Raises:
+        DecryptionError: if the key doesn't match or the data was altered.
+        TimeoutError: if reading takes longer than the timeout.
+        Exception: if reading from IPFS fails.
+
+    """
+    deadline = Deadline(timeout)
+    cached = BLOBS.open(key)
+    if cached:
+        with cached:
+            return decrypt_stream(cached, dst, private_key)
+    with _cat_stream(key, private_key, deadline) as src:
+        return decrypt_stream(src, dst, private_key)
+
+
+def _cat_stream(key: str, private_key: bytes, deadline: Deadline) -> BinaryIO:
+    """Reads a key from IPFS into the cache and a temporary file.
+
+    Returns:
+        BinaryIO: returns the temporary file, at its start.
+
+    """
+    client = _ipfs_client()
+    spool = _spool()
     try:
         LOG.debug("Downloading key: {}".format(key))
-        ciphertext = IPFS_CLIENT.cat(key)
+        with BLOBS.writer(key) as cached:
+            for chunk in client.cat_stream(key, deadline):
+                spool.write(chunk)
+                if cached:
+                    cached.write(chunk)
+    except requests.ConnectionError as e:
+        spool.close()
+        _reset_client(client)
+        raise e
     except Exception as e:
+        spool.close()
         LOG.warning(
             "Reading the key {} with private key {} with IPFS failed because of: {}"
             .format(key, private_key, e))
         raise e
-    msg = _decrypt(private_key, ciphertext)
-    return json.loads(msg)
+    spool.seek(0)
+    return spool
 
 
-@timeout_decorator.timeout(20)
-def upload(msg: Dict, public_key: bytes) -> Tuple[str, str]:
+def upload(msg: Dict,
+           public_key: PublicKeys,
+           timeout: Optional[float] = IPFS_DEADLINE) -> Tuple[str, str]:
     """Upload and encrypt a string for later retrieval.
     This can be manifest files, results, or anything that's been already
-    encrypted.
+    encrypted. Given several public keys, the message is encrypted and
+    uploaded once, and every key can download it. The upload is bounded by
+    a deadline of timeout seconds, which works in any thread.
 
     >>> credentials = {
     ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
@@ -88,30 +491,544 @@ def upload(msg: Dict, public_key: bytes) -> Tuple[str, str]:
     >>> manifest_dict == job.serialized_manifest
     True
 
+    Results can be shared with an auditor in the same upload.
+    >>> auditor_priv_key = b"486a0621e595dd7fcbe5608cbbeec8f5a8b5cabe7637f11eccfc7acd408c3a0e"
+    >>> auditor_pub_key = public_key_of(auditor_priv_key)
+    >>> (hash_, url) = upload({"results": True}, [pub_key, auditor_pub_key])
+    >>> download(url, job.gas_payer_priv) == download(url, auditor_priv_key) == {"results": True}
+    True
+
     Args:
         msg (Dict): The message to upload and encrypt.
-        public_key (bytes): The public_key to encrypt the file for.
+        public_key (PublicKeys): The public_key to encrypt the file for, or
+        a list of the public keys of every recipient.
+        timeout (Optional[float]): the seconds the whole upload may take, or
+        None for no limit.
 
     Returns:
         Tuple[str, str]: returns the contents of the filename which was previously uploaded.
     
     Raises:
+        TimeoutError: if the upload takes longer than the timeout.
         Exception: if adding bytes with IPFS fails.
 
     """
+    return upload_stream(
+        io.BytesIO(_serialize(msg)), public_key, timeout=timeout)
+
+
+def upload_many(msgs: List[Tuple[Dict, PublicKeys]]) -> List[Future]:
+    """Encrypt and upload many messages concurrently through the pooled IPFS
+    client. Every upload is bounded by the IPFS_DEADLINE of upload.
+
+    >>> pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> priv_key = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    >>> futures = upload_many([({"results": i}, pub_key) for i in range(3)])
+    >>> [download(f.result()[1], priv_key) for f in futures]
+    [{'results': 0}, {'results': 1}, {'results': 2}]
+
+    Args:
+        msgs (List[Tuple[Dict, PublicKeys]]): the messages to upload and the
+        public keys to encrypt them for.
+
+    Returns:
+        List[Future]: returns futures resolving to the hash and key of every
+        upload, in the order of the messages.
+
+    """
+    global _UPLOAD_EXECUTOR
+    with _IPFS_LOCK:
+        if not _UPLOAD_EXECUTOR:
+            _UPLOAD_EXECUTOR = ThreadPoolExecutor(
+                max_workers=IPFS_UPLOAD_WORKERS,
+                thread_name_prefix="hmt-ipfs-upload")
+    return [
+        _UPLOAD_EXECUTOR.submit(upload, msg, public_key)
+        for msg, public_key in msgs
+    ]
+
+
+def upload_stream(src: BinaryIO,
+                  public_key: PublicKeys,
+                  compression: str = ENVELOPE_COMPRESSION,
+                  timeout: Optional[float] = None) -> Tuple[str, str]:
+    """Compress and encrypt a file-like object chunk by chunk and upload it.
+    The ciphertext is spooled to a temporary file past IPFS_SPOOL_SIZE
+    bytes, and cached, as the uploader usually reads it back.
+
+    Args:
+        src (BinaryIO): the file-like object to upload.
+        public_key (PublicKeys): The public keys to encrypt it for.
+        compression (str): "zlib", "zstd" or "none". Already compressed
+        data such as images is better uploaded with "none".
+        timeout (Optional[float]): the seconds encrypting and uploading may
+        take. By default only every request is bounded by IPFS_TIMEOUT, as
+        large payloads take long.
+
+    Returns:
+        Tuple[str, str]: returns the SHA-1 hash of the plaintext and its IPFS
+        key.
+
+    Raises:
+        TimeoutError: if uploading takes longer than the timeout.
+        Exception: if adding the ciphertext with IPFS fails.
+
+    """
+    deadline = Deadline(timeout)
+    with _spool() as ciphertext:
+        hash_ = encrypt_stream(
+            src, ciphertext, public_key, compression=compression)
+        ciphertext.seek(0)
+        client = _ipfs_client()
+        try:
+            key = client.add_stream(ciphertext, deadline)
+        except requests.ConnectionError as e:
+            _reset_client(client)
+            raise e
+        except Exception as e:
+            LOG.warning(
+                "Adding bytes with IPFS failed because of: {}".format(e))
+            raise e
+        ciphertext.seek(0)
+        with BLOBS.writer(key) as cached:
+            if cached:
+                shutil.copyfileobj(ciphertext, cached)
+    return hash_, key
+
+
+def _serialize(msg: Dict) -> bytes:
     try:
         manifest_ = json.dumps(msg, sort_keys=True)
     except Exception as e:
         LOG.error("Can't extract the json from the dict")
         raise e
+    return manifest_.encode('utf-8')
 
-    hash_ = hashlib.sha1(manifest_.encode('utf-8')).hexdigest()
-    try:
-        key = IPFS_CLIENT.add_bytes(_encrypt(public_key, manifest_))
-    except Exception as e:
-        LOG.warning("Adding bytes with IPFS failed because of: {}".format(e))
-        raise e
-    return hash_, key
+
+def encrypt_msg(msg: Dict, public_key: PublicKeys) -> Tuple[str, bytes]:
+    """Serialize a message to JSON and encrypt it for one or more public
+    keys.
+
+    >>> priv_key = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    >>> pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> (hash_, ciphertext) = encrypt_msg({"results": True}, pub_key)
+    >>> decrypt_msg(ciphertext, priv_key)
+    {'results': True}
+
+    Args:
+        msg (Dict): The message to encrypt.
+        public_key (PublicKeys): The public keys to encrypt the message for.
+
+    Returns:
+        Tuple[str, bytes]: returns the SHA-1 hash of the serialized message
+        and its ciphertext.
+
+    """
+    ciphertext = io.BytesIO()
+    hash_ = encrypt_stream(io.BytesIO(_serialize(msg)), ciphertext, public_key)
+    return hash_, ciphertext.getvalue()
+
+
+def decrypt_msg(ciphertext: bytes, private_key: bytes) -> Dict:
+    """Decrypt a message produced by encrypt_msg and parse its JSON.
+
+    Messages encrypted before the envelope format are still read.
+    >>> priv_key = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    >>> pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> decrypt_msg(_encrypt(pub_key, '{"results": true}'), priv_key)
+    {'results': True}
+
+    Args:
+        ciphertext (bytes): The encrypted message.
+        private_key (bytes): The private_key to decrypt the message with.
+
+    Returns:
+        Dict: returns the decrypted message.
+
+    """
+    return json.loads(_decrypt_payload(private_key, ciphertext))
+
+
+def _decrypt_payload(private_key: bytes, ciphertext: bytes) -> str:
+    plaintext = io.BytesIO()
+    decrypt_stream(io.BytesIO(ciphertext), plaintext, private_key)
+    return plaintext.getvalue().decode('utf-8')
+
+
+def encrypt_stream(src: BinaryIO,
+                   dst: BinaryIO,
+                   public_key: PublicKeys,
+                   chunk_size: int = ENVELOPE_CHUNK_SIZE,
+                   compression: str = ENVELOPE_COMPRESSION) -> str:
+    """Compress and encrypt a file-like object into an envelope for one or
+    more public keys. The body is encrypted once, and only its key is
+    wrapped for every recipient. Only two chunks are held in memory at a
+    time. Every chunk is authenticated with its index and whether it is the
+    last one, so chunks can't be reordered, dropped or truncated.
+
+    >>> priv_key = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    >>> pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> plaintext = os.urandom(2500)
+    >>> ciphertext = io.BytesIO()
+    >>> hash_ = encrypt_stream(io.BytesIO(plaintext), ciphertext, pub_key, chunk_size=1000, compression="none")
+    >>> ciphertext.getvalue()[:4]
+    b'HMTE'
+    >>> output = io.BytesIO()
+    >>> decrypt_stream(io.BytesIO(ciphertext.getvalue()), output, priv_key)
+    2500
+    >>> output.getvalue() == plaintext
+    True
+
+    Dropping the last chunk is detected.
+    >>> truncated = ciphertext.getvalue()[:-(500 + 16)]
+    >>> decrypt_stream(io.BytesIO(truncated), io.BytesIO(), priv_key)
+    Traceback (most recent call last):
+    p2p.exceptions.DecryptionError: Failed to verify chunk 1
+
+    JSON compresses well, and is decompressed transparently.
+    >>> results = json.dumps({"results": ["https://example.com/{}.jpg".format(i) for i in range(1000)]}).encode()
+    >>> ciphertext = io.BytesIO()
+    >>> encrypt_stream(io.BytesIO(results), ciphertext, pub_key, compression="zlib") == hashlib.sha1(results).hexdigest()
+    True
+    >>> len(ciphertext.getvalue()) < len(results) // 4
+    True
+    >>> output = io.BytesIO()
+    >>> decrypt_stream(io.BytesIO(ciphertext.getvalue()), output, priv_key) == len(results)
+    True
+    >>> output.getvalue() == results
+    True
+
+    Every recipient finds its own key slot, and other keys fail.
+    >>> auditor_priv_key = "486a0621e595dd7fcbe5608cbbeec8f5a8b5cabe7637f11eccfc7acd408c3a0e"
+    >>> ciphertext = io.BytesIO()
+    >>> _ = encrypt_stream(io.BytesIO(b"results"), ciphertext, [pub_key, public_key_of(auditor_priv_key)])
+    >>> outputs = [io.BytesIO(), io.BytesIO()]
+    >>> [decrypt_stream(io.BytesIO(ciphertext.getvalue()), output, key) for output, key in zip(outputs, [priv_key, auditor_priv_key])]
+    [7, 7]
+    >>> [output.getvalue() for output in outputs]
+    [b'results', b'results']
+    >>> false_priv_key = "657b6497a355a3982928d5515d48a84870f057c4d16923eb1d104c0afada9aa8"
+    >>> decrypt_stream(io.BytesIO(ciphertext.getvalue()), io.BytesIO(), false_priv_key)
+    Traceback (most recent call last):
+    p2p.exceptions.DecryptionError: Failed to verify tag
+
+    Args:
+        src (BinaryIO): the file-like object to encrypt.
+        dst (BinaryIO): the file-like object to write the envelope to.
+        public_key (PublicKeys): The public keys to encrypt it for.
+        chunk_size (int): the number of bytes per chunk.
+        compression (str): "zlib", "zstd" or "none".
+
+    Returns:
+        str: returns the SHA-1 hash of the plaintext.
+
+    Raises:
+        ValueError: if the compression is unknown or there is no public key.
+
+    """
+    flags = _compression_flag(compression)
+    public_keys = [public_key] if isinstance(public_key,
+                                             (bytes, str)) else public_key
+    if not public_keys:
+        raise ValueError("A payload needs at least one recipient")
+    key = AESGCM.generate_key(bit_length=256)
+    key_slots: Dict[bytes, bytes] = {}
+    for pub_key in public_keys:
+        fingerprint = _fingerprint(cast(bytes, codecs.decode(pub_key, 'hex')))
+        if fingerprint not in key_slots:
+            wrapped_key = _wrap_key(pub_key, key)
+            key_slots[fingerprint] = _KEY_SLOT.pack(
+                fingerprint, len(wrapped_key)) + wrapped_key
+    nonce_prefix = os.urandom(8)
+    header = _ENVELOPE_HEADER.pack(
+        ENVELOPE_MAGIC, ENVELOPE_VERSION, flags, chunk_size, nonce_prefix,
+        len(key_slots)) + b"".join(key_slots.values())
+    dst.write(header)
+
+    aead = AESGCM(key)
+    reader = _PlaintextReader(src, flags & _COMPRESSION_MASK)
+    chunk = _read_exact(reader, chunk_size)
+    index = 0
+    while True:
+        following = _read_exact(reader, chunk_size)
+        last = not following
+        dst.write(
+            aead.encrypt(
+                _chunk_nonce(nonce_prefix, index), chunk,
+                _chunk_data(header, last)))
+        if last:
+            return reader.digest.hexdigest()
+        chunk = following
+        index += 1
+
+
+def decrypt_stream(src: BinaryIO, dst: BinaryIO, private_key: bytes) -> int:
+    """Decrypt and decompress an envelope, or a legacy single ECIES
+    ciphertext, into a file-like object.
+
+    Args:
+        src (BinaryIO): the file-like object to decrypt.
+        dst (BinaryIO): the file-like object to write the plaintext to. It
+        is incomplete if decryption fails.
+        private_key (bytes): The private_key to decrypt it with.
+
+    Returns:
+        int: returns the number of bytes written.
+
+    Raises:
+        DecryptionError: if the key doesn't match or the data was altered.
+        ImportError: if the payload is compressed with zstd and zstandard
+        isn't installed.
+
+    """
+    start = _read_exact(src, _ENVELOPE_HEADER.size)
+    if start[:1] == _LEGACY_PREFIX:
+        priv_key = keys.PrivateKey(codecs.decode(private_key, 'hex'))
+        plaintext = ecies.decrypt(
+            start + src.read(), priv_key, shared_mac_data=SHARED_MAC_DATA)
+        dst.write(plaintext)
+        return len(plaintext)
+
+    if len(start) < _ENVELOPE_HEADER.size:
+        raise DecryptionError("Truncated envelope header")
+    (magic, version, flags, chunk_size, nonce_prefix,
+     slot_count) = _ENVELOPE_HEADER.unpack(start)
+    if magic != ENVELOPE_MAGIC:
+        raise DecryptionError("Unknown payload format")
+    if version not in (1, ENVELOPE_VERSION):
+        raise DecryptionError(
+            "Unsupported envelope version {}".format(version))
+    compression = flags & _COMPRESSION_MASK
+    if (flags & ~_COMPRESSION_MASK or compression not in COMPRESSIONS.values()
+            or not 0 < chunk_size <= ENVELOPE_MAX_CHUNK_SIZE):
+        raise DecryptionError("Invalid envelope header")
+    if version == 1:
+        wrapped_key = _read_exact(src, slot_count)
+        header = start + wrapped_key
+        aead = AESGCM(_unwrap_key(private_key, wrapped_key))
+    else:
+        header, wrapped_keys = _read_key_slots(src, start, slot_count,
+                                               private_key)
+        aead = AESGCM(_unwrap_any(private_key, wrapped_keys))
+
+    writer = _PlaintextWriter(dst, compression)
+    chunk = _read_exact(src, chunk_size + _TAG_SIZE)
+    index = 0
+    while True:
+        following = _read_exact(src, chunk_size + _TAG_SIZE)
+        last = not following
+        try:
+            plaintext = aead.decrypt(
+                _chunk_nonce(nonce_prefix, index), chunk,
+                _chunk_data(header, last))
+        except InvalidTag:
+            raise DecryptionError("Failed to verify chunk {}".format(index))
+        writer.write(plaintext)
+        if last:
+            writer.flush()
+            return writer.written
+        chunk = following
+        index += 1
+
+
+def _read_key_slots(src: BinaryIO, start: bytes, slot_count: int,
+                    private_key: bytes) -> Tuple[bytes, List[bytes]]:
+    """Reads the key slots of an envelope.
+
+    Returns:
+        Tuple[bytes, List[bytes]]: returns the whole header and the wrapped
+        keys of the slots whose fingerprint matches the private key.
+
+    """
+    priv_key = keys.PrivateKey(codecs.decode(private_key, 'hex'))
+    own_fingerprint = _fingerprint(priv_key.public_key.to_bytes())
+    header = [start]
+    wrapped_keys = []
+    for _ in range(slot_count):
+        slot = _read_exact(src, _KEY_SLOT.size)
+        if len(slot) < _KEY_SLOT.size:
+            raise DecryptionError("Truncated envelope header")
+        fingerprint, length = _KEY_SLOT.unpack(slot)
+        wrapped_key = _read_exact(src, length)
+        header += [slot, wrapped_key]
+        if fingerprint == own_fingerprint:
+            wrapped_keys.append(wrapped_key)
+    return b"".join(header), wrapped_keys
+
+
+def _unwrap_any(private_key: bytes, wrapped_keys: List[bytes]) -> bytes:
+    # Without a slot for the key, fail like ECIES does for a wrong key.
+    error = DecryptionError("Failed to verify tag")
+    for wrapped_key in wrapped_keys:
+        try:
+            return _unwrap_key(private_key, wrapped_key)
+        except DecryptionError as e:
+            error = e
+    raise error
+
+
+def _fingerprint(public_key: bytes) -> bytes:
+    return hashlib.sha256(public_key).digest()[:_KEY_SLOT.size - 2]
+
+
+def public_key_of(private_key: bytes) -> bytes:
+    """Derives the public key payloads are encrypted for from a private key.
+
+    >>> public_key_of("28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5")
+    b'2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d'
+
+    Args:
+        private_key (bytes): the hex private key.
+
+    Returns:
+        bytes: returns the hex public key.
+
+    """
+    priv_key = keys.PrivateKey(codecs.decode(private_key, 'hex'))
+    return codecs.encode(priv_key.public_key.to_bytes(), 'hex')
+
+
+def _compression_flag(compression: str) -> int:
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression {}".format(compression))
+    if COMPRESSIONS[compression] == COMPRESSION_ZSTD and zstandard is None:
+        LOG.debug("zstandard isn't installed, compressing with zlib")
+        return COMPRESSION_ZLIB
+    return COMPRESSIONS[compression]
+
+
+class _PlaintextReader:
+    """Reads a file-like object through a compressor, hashing what it reads
+    before it is compressed."""
+
+    def __init__(self, src: BinaryIO, compression: int):
+        self.src = src
+        self.digest = hashlib.sha1()
+        self._buffer = bytearray()
+        self._eof = False
+        self._compressor: Any = None
+        if compression == COMPRESSION_ZLIB:
+            level = int(ENVELOPE_COMPRESSION_LEVEL
+                        or zlib.Z_DEFAULT_COMPRESSION)
+            self._compressor = zlib.compressobj(level)
+        elif compression == COMPRESSION_ZSTD:
+            level = int(ENVELOPE_COMPRESSION_LEVEL or 3)
+            self._compressor = zstandard.ZstdCompressor(
+                level=level).compressobj()
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size and not self._eof:
+            data = self.src.read(size)
+            if data:
+                self.digest.update(data)
+                self._buffer += self._compressor.compress(
+                    data) if self._compressor else data
+            else:
+                self._eof = True
+                if self._compressor:
+                    self._buffer += self._compressor.flush()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class _PlaintextWriter:
+    """Writes to a file-like object through a decompressor. The output is
+    produced in bounded pieces, so a small chunk can't expand in memory.
+
+    >>> class Sizes(io.BytesIO):
+    ...     largest = 0
+    ...     def write(self, data):
+    ...         self.largest = max(self.largest, len(data))
+    ...         return super().write(data)
+    >>> compress = zstandard.ZstdCompressor().compress if zstandard else zlib.compress
+    >>> bomb = compress(bytes(256 * 1024 * 1024))
+    >>> dst = Sizes()
+    >>> writer = _PlaintextWriter(dst, COMPRESSION_ZSTD if zstandard else COMPRESSION_ZLIB)
+    >>> writer.write(bomb)
+    >>> writer.flush()
+    >>> writer.written == 256 * 1024 * 1024 and dst.largest <= 8 * 1024 * 1024
+    True
+
+    """
+
+    def __init__(self, dst: BinaryIO, compression: int):
+        self.dst = dst
+        self.written = 0
+        self._compression = compression
+        self._decompressor: Any = None
+        if compression == COMPRESSION_ZLIB:
+            self._decompressor = zlib.decompressobj()
+        elif compression == COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise ImportError(
+                    "zstandard is required to read this payload: pip install hmt-escrow[zstd]"
+                )
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def write(self, data: bytes):
+        if self._compression == COMPRESSION_ZLIB:
+            self._write(
+                self._decompressor.decompress(data, ENVELOPE_CHUNK_SIZE))
+            while self._decompressor.unconsumed_tail:
+                self._write(
+                    self._decompressor.decompress(
+                        self._decompressor.unconsumed_tail,
+                        ENVELOPE_CHUNK_SIZE))
+        elif self._decompressor:
+            for i in range(0, len(data), _ZSTD_INPUT_SIZE):
+                self._write(
+                    self._decompressor.decompress(
+                        data[i:i + _ZSTD_INPUT_SIZE]))
+        else:
+            self._write(data)
+
+    def flush(self):
+        if self._compression == COMPRESSION_ZLIB:
+            self._write(self._decompressor.flush())
+            if not self._decompressor.eof:
+                raise DecryptionError("Truncated compressed payload")
+
+    def _write(self, data: bytes):
+        if data:
+            self.dst.write(data)
+            self.written += len(data)
+
+
+def _spool() -> BinaryIO:
+    """Opens a temporary file kept in memory up to IPFS_SPOOL_SIZE."""
+    return cast(BinaryIO,
+                tempfile.SpooledTemporaryFile(max_size=IPFS_SPOOL_SIZE))
+
+
+def _read_exact(src: Union[BinaryIO, _PlaintextReader], size: int) -> bytes:
+    """Reads size bytes, or less only at the end of the file."""
+    data = src.read(size)
+    while data and len(data) < size:
+        more = src.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def _chunk_nonce(nonce_prefix: bytes, index: int) -> bytes:
+    return nonce_prefix + struct.pack(">I", index)
+
+
+def _chunk_data(header: bytes, last: bool) -> bytes:
+    return header + (b"\x01" if last else b"\x00")
+
+
+def _wrap_key(public_key: bytes, key: bytes) -> bytes:
+    pub_key = keys.PublicKey(codecs.decode(public_key, 'hex'))
+    return ecies.encrypt(key, pub_key, shared_mac_data=SHARED_MAC_DATA)
+
+
+def _unwrap_key(private_key: bytes, wrapped_key: bytes) -> bytes:
+    priv_key = keys.PrivateKey(codecs.decode(private_key, 'hex'))
+    return ecies.decrypt(
+        wrapped_key, priv_key, shared_mac_data=SHARED_MAC_DATA)
 
 
 def _decrypt(private_key: bytes, msg: bytes) -> str:
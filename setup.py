@@ -1,5 +1,21 @@
 import setuptools
 
+from setuptools.command.build_py import build_py
+
+
+class BuildPyCommand(build_py):
+    """Compiles the contract artifacts shipped as hmt_escrow/artifacts before
+    building the package, so that installs don't need solc."""
+
+    def run(self):
+        try:
+            from hmt_escrow.eth_bridge import get_contracts
+            get_contracts()
+        except Exception as e:
+            self.warn("Unable to build the contract artifacts: {}".format(e))
+        super().run()
+
+
 setuptools.setup(
     name="hmt-escrow",
     version="0.5.15",
@@ -14,8 +30,14 @@ setuptools.setup(
         "Operating System :: OS Independent", "Programming Language :: Python"
     ],
     packages=setuptools.find_packages(),
+    package_data={"hmt_escrow": ["artifacts/*.json"]},
+    cmdclass={"build_py": BuildPyCommand},
     install_requires=[
-        "ipfsapi==0.4.3", "py-evm==0.2.0a37", "py-solc==3.2.0", "web3==4.8.3",
-        "yapf==0.25.0", "mypy==0.670", "timeout-decorator==0.4.1",
+        "requests>=2.20", "py-evm==0.2.0a37", "py-solc==3.2.0", "web3==4.8.3",
+        "cryptography==2.6.1", "yapf==0.25.0", "mypy==0.670",
         "hmt-basemodels>=0.0.1"
-    ])
+    ],
+    extras_require={
+        "async": ["aiohttp>=3.5"],
+        "zstd": ["zstandard>=0.11"]
+    })
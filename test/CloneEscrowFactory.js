@@ -0,0 +1,85 @@
+const CloneEscrowFactoryAbstraction = artifacts.require('CloneEscrowFactory');
+const EscrowAbstraction = artifacts.require('Escrow');
+const HMTokenAbstraction = artifacts.require('HMToken');
+
+let CloneEscrowFactory;
+let Implementation;
+let HMT;
+const url = 'http://google.com/fake';
+const hash = 'fakehash';
+const zeroAddress = '0x0000000000000000000000000000000000000000';
+
+const launchedEscrow = tx => tx.logs.find(log => log.event === 'Launched').args.escrow;
+
+contract('CloneEscrowFactory', (accounts) => {
+  beforeEach(async () => {
+    HMT = await HMTokenAbstraction.new('100', 'Human Token', 4, 'HMT', { from: accounts[0] });
+    Implementation = await EscrowAbstraction.new(HMT.address, zeroAddress, 0, { from: accounts[0] });
+    CloneEscrowFactory = await CloneEscrowFactoryAbstraction.new(HMT.address, Implementation.address, { from: accounts[0] });
+  });
+
+  it('sets the implementation given to constructor', async () => {
+    const implementation = await CloneEscrowFactory.getImplementation.call();
+    assert.equal(implementation, Implementation.address);
+  });
+
+  describe('calling createEscrow', () => {
+    it('creates an initialized escrow clone', async () => {
+      const tx = await CloneEscrowFactory.createEscrow({ from: accounts[0] });
+      const escrow = await EscrowAbstraction.at(launchedEscrow(tx));
+
+      const status = await escrow.getStatus.call();
+      assert.equal(status, 0);
+      const tokenAddress = await escrow.getTokenAddress.call();
+      assert.equal(tokenAddress, HMT.address);
+      const launcher = await escrow.getLauncher.call();
+      assert.equal(launcher, CloneEscrowFactory.address);
+
+      const hasEscrow = await CloneEscrowFactory.hasEscrow(escrow.address);
+      assert.equal(hasEscrow, true);
+    });
+
+    it('creates clones which can not be initialized again', async () => {
+      const tx = await CloneEscrowFactory.createEscrow({ from: accounts[0] });
+      const escrow = await EscrowAbstraction.at(launchedEscrow(tx));
+      try {
+        await escrow.initialize(HMT.address, accounts[1], 8640000, { from: accounts[1] });
+        assert(false);
+      } catch (ex) {
+        assert(ex.message.includes('revert'));
+      }
+    });
+
+    it('creates clones which are paid out like an escrow', async () => {
+      const tx = await CloneEscrowFactory.createEscrow({ from: accounts[0] });
+      const escrow = await EscrowAbstraction.at(launchedEscrow(tx));
+      await HMT.transfer(escrow.address, 100, { from: accounts[0] });
+      await escrow.setup(accounts[1], accounts[2], 10, 10, url, hash, { from: accounts[0] });
+      await escrow.bulkPayOut([accounts[3]], [100], url, hash, '000', { from: accounts[1] });
+
+      const status = await escrow.getStatus.call();
+      assert.equal(status, 3);
+      const balance = await HMT.balanceOf.call(accounts[3]);
+      assert.equal(balance.toNumber(), 80);
+    });
+  });
+
+  describe('calling createEscrows', () => {
+    it('creates the given number of escrow clones', async () => {
+      const tx = await CloneEscrowFactory.createEscrows(5, { from: accounts[0] });
+      const launched = tx.logs.filter(log => log.event === 'Launched');
+      assert.equal(launched.length, 5);
+      const counter = await CloneEscrowFactory.getCounter();
+      assert.equal(counter.toNumber(), 5);
+    });
+  });
+
+  it('doesn\'t let the implementation be initialized', async () => {
+    try {
+      await Implementation.initialize(HMT.address, accounts[1], 8640000, { from: accounts[1] });
+      assert(false);
+    } catch (ex) {
+      assert(ex.message.includes('revert'));
+    }
+  });
+});
@@ -0,0 +1,118 @@
+const EscrowCompactAbstraction = artifacts.require('EscrowCompact');
+const CloneEscrowFactoryAbstraction = artifacts.require('CloneEscrowFactory');
+const HMTokenAbstraction = artifacts.require('HMToken');
+
+let Escrow;
+let HMT;
+let reputationOracle;
+let recordingOracle;
+const url = 'http://google.com/fake';
+const hash = '0x2fd4e1c67a2d28fced849ee1bb76e7391b93eb12';
+const zeroHash = '0x0000000000000000000000000000000000000000';
+
+const txShouldFail = e => assert('tx' in e && e.tx !== undefined, JSON.stringify(e));
+const launchedEscrow = tx => tx.logs.find(log => log.event === 'Launched').args.escrow;
+
+contract('EscrowCompact', (accounts) => {
+  beforeEach(async () => {
+    HMT = await HMTokenAbstraction.new('100', 'Human Token', 4, 'HMT', { from: accounts[0] });
+    reputationOracle = accounts[1];
+    recordingOracle = accounts[2];
+
+    Escrow = await EscrowCompactAbstraction.new(HMT.address, accounts[0], 5, { from: accounts[0] });
+  });
+
+  describe('initial', () => {
+    it('reports the compact layout', async () => {
+      const layout = await Escrow.getLayoutVersion.call();
+      assert.equal(layout.toNumber(), 2);
+    });
+
+    it('status is launched and hashes are empty', async () => {
+      const status = await Escrow.getStatus.call();
+      assert.equal(status, 0);
+      const manifestHash = await Escrow.getManifestHash.call();
+      assert.equal(manifestHash, zeroHash);
+    });
+  });
+
+  describe('calling setup', () => {
+    it('fails if reputation oracle or recording oracle stake is too high', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 500, 500, url, hash, { from: accounts[0] }).catch(txShouldFail);
+    });
+
+    it('sets parameters correctly', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      const tx = await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+
+      assert.equal(await Escrow.getReputationOracle.call(), reputationOracle);
+      assert.equal(await Escrow.getRecordingOracle.call(), recordingOracle);
+      assert.equal(await Escrow.getManifestUrl.call(), url);
+      assert.equal(await Escrow.getManifestHash.call(), hash);
+      assert.equal(await Escrow.getStatus.call(), 1);
+      assert.equal(tx.logs[0].args.hash, hash);
+    });
+  });
+
+  describe('calling storeResults', () => {
+    it('stores the results hash', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      await Escrow.storeResults(url, hash, { from: recordingOracle });
+
+      assert.equal(await Escrow.getIntermediateResultsUrl.call(), url);
+      assert.equal(await Escrow.getIntermediateResultsHash.call(), hash);
+    });
+  });
+
+  describe('calling bulkPayOut', () => {
+    it('pays the recipients and the oracle fees', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 20, url, hash, { from: accounts[0] });
+      await Escrow.bulkPayOut([accounts[3], accounts[4]], [50, 50], url, hash, '000', { from: reputationOracle });
+
+      assert.equal((await HMT.balanceOf.call(accounts[3])).toNumber(), 35);
+      assert.equal((await HMT.balanceOf.call(accounts[4])).toNumber(), 35);
+      assert.equal((await HMT.balanceOf.call(reputationOracle)).toNumber(), 10);
+      assert.equal((await HMT.balanceOf.call(recordingOracle)).toNumber(), 20);
+      assert.equal(await Escrow.getFinalResultsHash.call(), hash);
+      assert.equal(await Escrow.getBulkPaid.call(), true);
+      assert.equal(await Escrow.getStatus.call(), 3);
+    });
+
+    it('moves to partial after paying a part of the balance', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      await Escrow.bulkPayOut([accounts[3]], [50], url, hash, '000', { from: reputationOracle });
+
+      assert.equal(await Escrow.getBulkPaid.call(), true);
+      assert.equal(await Escrow.getStatus.call(), 2);
+    });
+
+    it('does not pay more than the balance', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      await Escrow.bulkPayOut([accounts[3]], [150], url, hash, '000', { from: reputationOracle });
+
+      assert.equal(await Escrow.getBulkPaid.call(), false);
+      assert.equal(await Escrow.getStatus.call(), 1);
+      assert.equal((await Escrow.getBalance.call()).toNumber(), 100);
+    });
+  });
+
+  describe('cloning', () => {
+    it('works as the implementation of a CloneEscrowFactory', async () => {
+      const Implementation = await EscrowCompactAbstraction.new(HMT.address, zeroHash, 0, { from: accounts[0] });
+      const Factory = await CloneEscrowFactoryAbstraction.new(HMT.address, Implementation.address, { from: accounts[0] });
+      const tx = await Factory.createEscrow({ from: accounts[0] });
+      const escrow = await EscrowCompactAbstraction.at(launchedEscrow(tx));
+
+      assert.equal((await escrow.getLayoutVersion.call()).toNumber(), 2);
+      assert.equal(await escrow.getLauncher.call(), Factory.address);
+      await HMT.transfer(escrow.address, 100, { from: accounts[0] });
+      await escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      assert.equal(await escrow.getManifestHash.call(), hash);
+    });
+  });
+});
@@ -61,4 +61,32 @@ contract('EscrowFactory', (accounts) => {
       }
     });
   });
+
+  describe('calling createEscrows', () => {
+    it('creates the given number of escrows', async () => {
+      const tx = await EscrowFactory.createEscrows(3, { from: accounts[0] });
+      const launched = tx.logs.filter(log => log.event === 'Launched');
+      assert.equal(launched.length, 3);
+
+      const counter = await EscrowFactory.getCounter();
+      assert.equal(counter.toNumber(), 3);
+
+      const addresses = launched.map(log => log.args.escrow);
+      assert.equal(new Set(addresses).size, 3);
+      const hasEscrows = await Promise.all(addresses.map(address => EscrowFactory.hasEscrow(address)));
+      assert.deepEqual(hasEscrows, [true, true, true]);
+
+      const lastEscrow = await EscrowFactory.getLastEscrow();
+      assert.equal(lastEscrow, addresses[2]);
+    });
+
+    it('fails to create zero escrows', async () => {
+      try {
+        await EscrowFactory.createEscrows(0, { from: accounts[0] });
+        assert(false);
+      } catch (ex) {
+        assert(ex.message.includes('revert'));
+      }
+    });
+  });
 });
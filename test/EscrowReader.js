@@ -0,0 +1,85 @@
+const EscrowAbstraction = artifacts.require('Escrow');
+const EscrowReaderAbstraction = artifacts.require('EscrowReader');
+const HMTokenAbstraction = artifacts.require('HMToken');
+
+let Escrow;
+let OtherEscrow;
+let EscrowReader;
+let HMT;
+let reputationOracle;
+let recordingOracle;
+const url = 'http://google.com/fake';
+const hash = 'fakehash';
+const finalUrl = 'http://google.com/final';
+
+const unpack = (packed, lengths) => {
+  const data = Buffer.from(packed.slice(2), 'hex');
+  let offset = 0;
+  return lengths.map((length) => {
+    const part = data.slice(offset, offset + length.toNumber()).toString();
+    offset += length.toNumber();
+    return part;
+  });
+};
+
+contract('EscrowReader', (accounts) => {
+  beforeEach(async () => {
+    HMT = await HMTokenAbstraction.new('100', 'Human Token', 4, 'HMT', { from: accounts[0] });
+    reputationOracle = accounts[1];
+    recordingOracle = accounts[2];
+
+    Escrow = await EscrowAbstraction.new(HMT.address, accounts[0], 5, { from: accounts[0] });
+    OtherEscrow = await EscrowAbstraction.new(HMT.address, accounts[0], 5, { from: accounts[0] });
+    EscrowReader = await EscrowReaderAbstraction.new({ from: accounts[0] });
+  });
+
+  describe('calling getStates', () => {
+    it('returns the state of every escrow', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+
+      const {
+        exists, statuses, balances, bulkPaid,
+      } = await EscrowReader.getStates.call([Escrow.address, OtherEscrow.address]);
+      assert.deepEqual(exists, [true, true]);
+      assert.equal(statuses[0].toNumber(), 1);
+      assert.equal(statuses[1].toNumber(), 0);
+      assert.equal(balances[0].toNumber(), 100);
+      assert.equal(balances[1].toNumber(), 0);
+      assert.deepEqual(bulkPaid, [false, false]);
+    });
+
+    it('reports the bulk paid flag', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      await Escrow.bulkPayOut([accounts[3]], [100], url, hash, '000', { from: reputationOracle });
+
+      const { statuses, balances, bulkPaid } = await EscrowReader.getStates.call([Escrow.address]);
+      assert.equal(statuses[0].toNumber(), 3);
+      assert.equal(balances[0].toNumber(), 0);
+      assert.deepEqual(bulkPaid, [true]);
+    });
+
+    it('skips addresses which are not escrows', async () => {
+      const { exists, statuses } = await EscrowReader.getStates.call([accounts[5], HMT.address, Escrow.address]);
+      assert.deepEqual(exists, [false, false, true]);
+      assert.equal(statuses[0].toNumber(), 0);
+    });
+  });
+
+  describe('calling getResultsUrls', () => {
+    it('returns the packed results urls of every escrow', async () => {
+      await HMT.transfer(Escrow.address, 100, { from: accounts[0] });
+      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      await Escrow.storeResults(url, hash, { from: recordingOracle });
+      await Escrow.bulkPayOut([accounts[3]], [100], finalUrl, hash, '000', { from: reputationOracle });
+
+      const addresses = [Escrow.address, accounts[5], HMT.address, OtherEscrow.address];
+      const {
+        intermediateUrls, intermediateLengths, finalUrls, finalLengths,
+      } = await EscrowReader.getResultsUrls.call(addresses);
+      assert.deepEqual(unpack(intermediateUrls, intermediateLengths), [url, '', '', '']);
+      assert.deepEqual(unpack(finalUrls, finalLengths), [finalUrl, '', '', '']);
+    });
+  });
+});
@@ -1,4 +1,8 @@
 const EscrowAbstraction = artifacts.require('Escrow');
+const EscrowBaselineAbstraction = artifacts.require('EscrowBaseline');
+const EscrowCompactAbstraction = artifacts.require('EscrowCompact');
+const EscrowFactoryAbstraction = artifacts.require('EscrowFactory');
+const CloneEscrowFactoryAbstraction = artifacts.require('CloneEscrowFactory');
 const HMTokenAbstraction = artifacts.require('HMToken');
 
 let Escrow;
@@ -7,6 +11,8 @@ let reputationOracle;
 let recordingOracle;
 const url = 'http://google.com/fake';
 const hash = 'fakehash';
+const sha1Hash = '2fd4e1c67a2d28fced849ee1bb76e7391b93eb12';
+const zeroAddress = '0x0000000000000000000000000000000000000000';
 
 const gasReport = [];
 
@@ -20,15 +26,83 @@ contract('Escrow', (accounts) => {
   });
 
   describe('calling bulkPayOut', () => {
-    it('pays each recipient their corresponding amount', async () => {
-      await HMT.transfer(Escrow.address, 1000, { from: accounts[0] });
-      await Escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
-      const recipients = Array(100).fill(accounts[3]);
-      const amounts = Array(100).fill(1);
-      const tx = await Escrow.bulkPayOut(recipients, amounts, url, hash, '000', { from: reputationOracle });
-      gasReport.push(['BulkPayout 100 recipients:', tx.receipt.gasUsed]);
+    // HMToken.transferBulk takes less than 100 recipients, larger payouts are
+    // split into chunks the way Job.bulk_payout_chunks does.
+    const BULK_MAX_RECIPIENTS = 99;
+
+    const payOut = async (Abstraction, count) => {
+      const escrow = await Abstraction.new(HMT.address, accounts[0], 8640000, { from: accounts[0] });
+      await HMT.transfer(escrow.address, count * 2, { from: accounts[0] });
+      await escrow.setup(reputationOracle, recordingOracle, 10, 10, url, hash, { from: accounts[0] });
+      const recipients = Array.from({ length: count }, () => web3.utils.toChecksumAddress(web3.utils.randomHex(20)));
+
+      let gasUsed = 0;
+      for (let i = 0; i < count; i += BULK_MAX_RECIPIENTS) {
+        const chunk = recipients.slice(i, i + BULK_MAX_RECIPIENTS);
+        // eslint-disable-next-line no-await-in-loop
+        const tx = await escrow.bulkPayOut(chunk, Array(chunk.length).fill(1), url, hash, i, { from: reputationOracle });
+        gasUsed += tx.receipt.gasUsed;
+      }
+      return gasUsed;
+    };
+
+    // EscrowBaseline is Escrow before the net amounts were kept in memory.
+    [100, 500, 1000].forEach((count) => {
+      it(`pays ${count} recipients`, async () => {
+        const baselineGasUsed = await payOut(EscrowBaselineAbstraction, count);
+        const gasUsed = await payOut(EscrowAbstraction, count);
+        gasReport.push([`BulkPayout ${count} recipients baseline:`, baselineGasUsed]);
+        gasReport.push([`BulkPayout ${count} recipients:`, gasUsed]);
+        assert(gasUsed < baselineGasUsed);
+      });
+    });
+  });
+
+  describe('storing results', () => {
+    // A SHA-1 hash as the hex string of an Escrow and as the bytes20 of an
+    // EscrowCompact.
+    const storeResults = async (Abstraction, resultsHash) => {
+      const escrow = await Abstraction.new(HMT.address, accounts[0], 8640000, { from: accounts[0] });
+      await HMT.transfer(escrow.address, 100, { from: accounts[0] });
+      const setupTx = await escrow.setup(reputationOracle, recordingOracle, 10, 10, url, resultsHash, { from: accounts[0] });
+      const storeTx = await escrow.storeResults(url, resultsHash, { from: recordingOracle });
+      const payTx = await escrow.bulkPayOut([accounts[3]], [100], url, resultsHash, 1, { from: reputationOracle });
+      return [setupTx.receipt.gasUsed, storeTx.receipt.gasUsed, payTx.receipt.gasUsed];
+    };
+
+    it('uses less gas with the compact layout', async () => {
+      const [setup, store, pay] = await storeResults(EscrowAbstraction, sha1Hash);
+      const [compactSetup, compactStore, compactPay] = await storeResults(EscrowCompactAbstraction, `0x${sha1Hash}`);
+      gasReport.push(['setup:', setup], ['setup compact:', compactSetup]);
+      gasReport.push(['storeResults:', store], ['storeResults compact:', compactStore]);
+      gasReport.push(['bulkPayOut 1 recipient:', pay], ['bulkPayOut 1 recipient compact:', compactPay]);
+      assert(compactSetup < setup);
+      assert(compactStore < store);
+      assert(compactPay < pay);
     });
   });
+
+  describe('creating escrows', () => {
+    it('deploys full escrows with EscrowFactory', async () => {
+      const EscrowFactory = await EscrowFactoryAbstraction.new(HMT.address, { from: accounts[0] });
+      const tx = await EscrowFactory.createEscrow({ from: accounts[0] });
+      gasReport.push(['createEscrow:', tx.receipt.gasUsed]);
+      const batchTx = await EscrowFactory.createEscrows(2, { from: accounts[0] });
+      gasReport.push(['createEscrows 2 escrows:', batchTx.receipt.gasUsed]);
+    });
+
+    it('deploys escrow clones with CloneEscrowFactory', async () => {
+      const Implementation = await EscrowAbstraction.new(HMT.address, zeroAddress, 0, { from: accounts[0] });
+      const CloneEscrowFactory = await CloneEscrowFactoryAbstraction.new(HMT.address, Implementation.address, { from: accounts[0] });
+      const tx = await CloneEscrowFactory.createEscrow({ from: accounts[0] });
+      gasReport.push(['createEscrow clone:', tx.receipt.gasUsed]);
+      const batchTx = await CloneEscrowFactory.createEscrows(2, { from: accounts[0] });
+      gasReport.push(['createEscrows 2 clones:', batchTx.receipt.gasUsed]);
+      const largeBatchTx = await CloneEscrowFactory.createEscrows(20, { from: accounts[0] });
+      gasReport.push(['createEscrows 20 clones:', largeBatchTx.receipt.gasUsed]);
+    });
+  });
+
   describe('Gas Report', () => {
     it ('', async () => {
       const reportFn = s => console.log('> ', s[0], s[1]);